@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class App01Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app01'
+
+    def ready(self):
+        from .stats import connect_signals
+
+        connect_signals()
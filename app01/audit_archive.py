@@ -0,0 +1,99 @@
+"""
+审计日志冷热分层：把超过保留期的日志行按 (归属对象, 月份) 压缩写入 AuditArchiveSegment 并从热表删除
+历史查询通过 load_history 同时读取热表与归档，调用方无需关心数据所在位置
+"""
+import json
+import zlib
+
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import (
+    AuditArchiveSegment,
+    DataProcessingLog,
+    FillOperation,
+    ReagentOperation,
+    TaskStatusLog,
+)
+
+# 来源表 -> (模型, 时间字段, 归属对象字段)
+ARCHIVE_SOURCES = {
+    "task_status_log": (TaskStatusLog, "changed_at", "task_id"),
+    "reagent_operation": (ReagentOperation, "operated_at", "reagent_id"),
+    "fill_operation": (FillOperation, "operated_at", "preparation_list_id"),
+    "data_processing_log": (DataProcessingLog, "created_at", "data_file_id"),
+}
+
+
+def _row_fields(model):
+    return [f.attname for f in model._meta.concrete_fields]
+
+
+def _to_plain(rows):
+    """统一为 JSON 可表示的值（时间/小数转字符串），热表与归档结果格式一致"""
+    return json.loads(json.dumps(rows, cls=DjangoJSONEncoder))
+
+
+def archive_cold_rows(source, before, batch_size=5000):
+    """
+    归档 before 之前的行，每批在一个事务内完成“写归档段 + 删除热表行”
+    返回归档的行数
+    """
+    model, time_field, key_field = ARCHIVE_SOURCES[source]
+    fields = _row_fields(model)
+    total = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                model.objects.select_for_update()
+                .filter(**{f"{time_field}__lt": before})
+                .order_by("id")
+                .values(*fields)[:batch_size]
+            )
+            if not rows:
+                break
+            groups = {}
+            for row in rows:
+                period = row[time_field].strftime("%Y-%m")
+                groups.setdefault((row[key_field], period), []).append(row)
+            AuditArchiveSegment.objects.bulk_create(
+                [
+                    AuditArchiveSegment(
+                        source=source,
+                        owner_key=str(owner_key),
+                        period=period,
+                        row_count=len(group),
+                        first_at=min(r[time_field] for r in group),
+                        last_at=max(r[time_field] for r in group),
+                        payload=zlib.compress(
+                            json.dumps(group, cls=DjangoJSONEncoder, ensure_ascii=False).encode("utf-8")
+                        ),
+                    )
+                    for (owner_key, period), group in groups.items()
+                ]
+            )
+            model.objects.filter(id__in=[r["id"] for r in rows]).delete()
+            total += len(rows)
+    return total
+
+
+def load_history(source, owner_key):
+    """读取某对象的完整日志（热表 + 归档），按时间倒序返回字典列表"""
+    model, time_field, key_field = ARCHIVE_SOURCES[source]
+    rows = _to_plain(list(model.objects.filter(**{key_field: owner_key}).values(*_row_fields(model))))
+    segments = AuditArchiveSegment.objects.filter(source=source, owner_key=str(owner_key)).values_list(
+        "payload", flat=True
+    )
+    for payload in segments:
+        rows.extend(json.loads(zlib.decompress(bytes(payload)).decode("utf-8")))
+    rows.sort(key=lambda r: (r[time_field], r["id"]), reverse=True)
+    return rows
+
+
+def usernames_for(rows, field):
+    """只查询日志行中出现的用户，返回 {用户ID: 用户名}"""
+    ids = {row[field] for row in rows if row[field] is not None}
+    if not ids:
+        return {}
+    return dict(get_user_model().objects.filter(id__in=ids).values_list("id", "username"))
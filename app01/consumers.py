@@ -1,8 +1,11 @@
 import json
+from datetime import timedelta
 from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async
+from django.db.models import Q
 from django.utils import timezone
 from .models import AIModelConfig, AIChatSession, AIChatMessage
+from .models import TaskChangeEvent, TASK_FEED_ALL_GROUP, task_feed_user_group
 import requests
 import asyncio
 
@@ -335,4 +338,128 @@ class HplcConsumer(AsyncWebsocketConsumer):
         )
 
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps(event['message']))
\ No newline at end of file
+        await self.send(text_data=json.dumps(event['message']))
+
+
+# 单次补发的事件上限，超过则分批发送
+TASK_FEED_BATCH_SIZE = 200
+# 订阅全部任务时，不同提交人的事件可能不按ID顺序提交：游标跳过的ID记为空洞，在该时间内持续回查
+TASK_FEED_GAP_SECONDS = 60
+# 任务写入发生在 uwsgi 的多个 WSGI 进程中，其通道层通知到不了运行消费者的 ASGI 进程：按此间隔轮询事件表
+TASK_FEED_POLL_SECONDS = 2
+
+
+class TaskFeedConsumer(AsyncWebsocketConsumer):
+    """
+    任务变更推送：管理员/备料员订阅全部任务，普通用户只订阅自己的任务
+    连接时带 ?last_event_id=N 或发送 {"command": "resume", "last_event_id": N} 可从断点续传
+    组内只广播“有变更”通知，消费者按自己的游标从事件表读取；通知只在同一进程内送达，
+    因此另按 TASK_FEED_POLL_SECONDS 轮询游标之后的事件，其他进程写入的事件同样实时送达；
+    订阅全部任务时，游标跳过的ID（尚未提交的事务）记为空洞并在一段时间内回查，晚提交的事件补发一次
+    """
+
+    async def connect(self):
+        user = self.scope["user"]
+        if not user.is_authenticated:
+            await self.close()
+            return
+        self.user = user
+        sees_all = user.is_admin() or user.is_preparator()
+        self.group_name = TASK_FEED_ALL_GROUP if sees_all else task_feed_user_group(user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        from urllib.parse import parse_qs
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        last_event_id = (query.get("last_event_id") or [None])[0]
+        self.send_lock = asyncio.Lock()
+        await self.resume(last_event_id)
+        self.poller = asyncio.ensure_future(self.poll())
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "poller"):
+            self.poller.cancel()
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def poll(self):
+        """定时按游标读取新事件，不依赖跨进程的组通知"""
+        while True:
+            await asyncio.sleep(TASK_FEED_POLL_SECONDS)
+            await self.send_pending()
+
+    async def receive(self, text_data):
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            await self.send(text_data=json.dumps({'type': 'error', 'message': '无效的JSON格式。'}))
+            return
+        if data.get('command') == 'resume':
+            await self.resume(data.get('last_event_id'))
+
+    async def resume(self, last_event_id):
+        """从指定事件之后续传；未指定时从当前最新事件开始"""
+        try:
+            self.last_event_id = int(last_event_id)
+            ready = False
+        except (TypeError, ValueError):
+            latest = await sync_to_async(
+                lambda: TaskChangeEvent.visible_to(self.user).order_by('-id').values_list('id', flat=True).first()
+            )()
+            self.last_event_id = latest or 0
+            ready = True
+        await sync_to_async(self.seed_gaps)()
+        if ready:
+            await self.send(text_data=json.dumps({'type': 'ready', 'last_event_id': self.last_event_id}))
+            return
+        await self.send_pending()
+
+    async def task_changed(self, event):
+        """组通知：读取并推送游标之后的新事件"""
+        await self.send_pending()
+
+    def seed_gaps(self):
+        """
+        事件ID空洞 {事件ID: 记录时间}；只在订阅全部任务时维护（同一提交人的事件按提交顺序分配ID，见 TaskChangeEvent）
+        续传时把游标之前最近一批ID中缺失的记为空洞
+        """
+        self.gaps = {}
+        if self.group_name != TASK_FEED_ALL_GROUP or not self.last_event_id:
+            return
+        low = max(self.last_event_id - TASK_FEED_BATCH_SIZE, 0)
+        existing = set(
+            TaskChangeEvent.objects.filter(id__gt=low, id__lte=self.last_event_id).values_list('id', flat=True)
+        )
+        now = timezone.now()
+        self.gaps = {eid: now for eid in range(low + 1, self.last_event_id + 1) if eid not in existing}
+
+    def pending_events(self):
+        """游标之后的一批事件，以及此前空洞中新提交的事件；同时更新游标与空洞"""
+        now = timezone.now()
+        cutoff = now - timedelta(seconds=TASK_FEED_GAP_SECONDS)
+        self.gaps = {eid: at for eid, at in self.gaps.items() if at >= cutoff}
+        condition = Q(id__gt=self.last_event_id)
+        if self.gaps:
+            condition |= Q(id__in=list(self.gaps))
+        events = list(TaskChangeEvent.visible_to(self.user).filter(condition).order_by('id')[:TASK_FEED_BATCH_SIZE])
+        fresh = [e.id for e in events if e.id > self.last_event_id]
+        for event in events:
+            self.gaps.pop(event.id, None)
+        if fresh and self.group_name == TASK_FEED_ALL_GROUP:
+            seen = set(fresh)
+            for eid in range(self.last_event_id + 1, fresh[-1]):
+                if eid not in seen:
+                    self.gaps[eid] = now
+        if fresh:
+            self.last_event_id = fresh[-1]
+        return events
+
+    async def send_pending(self):
+        # 轮询与组通知可能同时触发，串行读取与发送以保持事件顺序
+        async with self.send_lock:
+            while True:
+                events = await sync_to_async(self.pending_events)()
+                for event in events:
+                    await self.send(text_data=json.dumps({'type': 'task_event', **event.to_dict()}))
+                if len(events) < TASK_FEED_BATCH_SIZE:
+                    break
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app01.audit_archive import ARCHIVE_SOURCES, archive_cold_rows
+
+
+class Command(BaseCommand):
+    help = "将超过保留期的审计日志（任务状态/试剂操作/装填/数据处理）压缩归档并移出热表"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=180, help="热表保留天数")
+        parser.add_argument(
+            "--source",
+            action="append",
+            choices=sorted(ARCHIVE_SOURCES),
+            help="只归档指定来源表，可多次指定；默认全部",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000, help="每批归档行数")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options["days"])
+        for source in options["source"] or sorted(ARCHIVE_SOURCES):
+            count = archive_cold_rows(source, before, options["batch_size"])
+            self.stdout.write(f"{source}: 归档 {count} 行")
+        self.stdout.write(self.style.SUCCESS(f"完成：已归档 {before:%Y-%m-%d %H:%M} 之前的日志"))
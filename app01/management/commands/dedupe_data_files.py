@@ -0,0 +1,50 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from app01.models import DataBlob, DataFile
+from app01.views import store_data_blob
+
+
+class Command(BaseCommand):
+    help = "将已有数据文件迁移到按内容哈希的存储，合并重复文件并重算引用计数（幂等）"
+
+    def handle(self, *args, **options):
+        migrated = 0
+        freed_bytes = 0
+
+        for data_file in DataFile.objects.filter(blob__isnull=True).order_by('id'):
+            old_path = data_file.file_path
+            if not os.path.exists(old_path):
+                self.stdout.write(self.style.WARNING(f'跳过（文件不存在）: #{data_file.id} {old_path}'))
+                continue
+
+            with open(old_path, 'rb') as fh:
+                blob, created = store_data_blob(iter(lambda: fh.read(1024 * 1024), b''))
+
+            data_file.blob = blob
+            data_file.file_path = blob.file_path
+            data_file.save(update_fields=['blob', 'file_path', 'updated_at'])
+            migrated += 1
+
+            # 原文件已无其它记录引用时删除
+            if old_path != blob.file_path and not DataFile.objects.filter(file_path=old_path).exists():
+                if not created:
+                    freed_bytes += os.path.getsize(old_path)
+                os.remove(old_path)
+            self.stdout.write(
+                f'#{data_file.id} {data_file.original_filename} -> {blob.sha256[:12]}' + ('' if created else '（重复内容）')
+            )
+
+        # 以实际引用数校正引用计数，清理无引用的实体
+        for blob in DataBlob.objects.annotate(refs=Count('data_files')):
+            if blob.refs == 0:
+                if os.path.exists(blob.file_path):
+                    freed_bytes += os.path.getsize(blob.file_path)
+                    os.remove(blob.file_path)
+                blob.delete()
+            elif blob.ref_count != blob.refs:
+                DataBlob.objects.filter(pk=blob.pk).update(ref_count=blob.refs)
+
+        self.stdout.write(self.style.SUCCESS(f'完成：迁移 {migrated} 个文件，释放 {freed_bytes} 字节'))
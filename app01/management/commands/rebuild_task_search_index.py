@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from app01.models import Task, TaskSearchToken
+
+
+class Command(BaseCommand):
+    help = "重建任务全文检索索引（名称/备注/工站/试剂词元）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="每批处理的任务数")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        total = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Task.objects.filter(id__gt=last_id)
+                .only("id", "name", "remark", "stations")
+                .order_by("id")[:batch_size]
+            )
+            if not batch:
+                break
+            TaskSearchToken.rebuild_for(batch)
+            total += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"已索引 {total} 个任务")
+
+        self.stdout.write(self.style.SUCCESS(f"完成：共索引 {total} 个任务"))
@@ -0,0 +1,367 @@
+"""
+物料需求分析：按工站规则把 Task.stations 换算为物料与耗材需求
+TaskStationRequirement 索引按这套规则展开需求行，备料计算在数据库中汇总索引
+"""
+from .station_schema import UNIT_ALIASES
+
+# 按试剂合并用量的物料类型，以及按数量累加的耗材类型
+REAGENT_MATERIAL_TYPES = ("laiyu_powder", "jingtai_powder", "reagent_bottle_150")
+COUNTED_MATERIAL_TYPES = (
+    "tip_1",
+    "tip_5",
+    "tip_10",
+    "sample_tube",
+    "mixture_tube",
+    "sample_filter",
+    "sample_cylinder",
+    "filtration_filter",
+    "chromatographic_cylinder",
+)
+
+_UNIT_LOOKUP = {k.lower(): v for k, v in UNIT_ALIASES.items()}
+
+
+def make_materials_counter():
+    """物料计数字典模板"""
+    return {
+        "test_tube_15": 0,
+        "laiyu_powder": 0,
+        "jingtai_powder": 0,
+        "reagent_bottle_150": 0,
+        "tip_1": 0,
+        "tip_5": 0,
+        "tip_10": 0,
+        "sample_filter": 0,
+        "filtration_filter": 0,
+        "mixture_tube": 0,
+        "sample_tube": 0,
+        "sample_cylinder": 0,
+        "chromatographic_cylinder": 0,
+    }
+
+
+def normalize_unit(unit):
+    """单位规范化（mL/毫升 -> ml），无法识别的单位去除首尾空白后原样返回"""
+    text = str(unit or "").strip()
+    return _UNIT_LOOKUP.get(text.lower(), text)
+
+
+def make_station_materials():
+    """单个工站的物料需求模板"""
+    return {
+        "test_tube_15": [],
+        "laiyu_powder": [],
+        "jingtai_powder": [],
+        "reagent_bottle_150": [],
+        "tip_1": 0,
+        "tip_5": 0,
+        "tip_10": 0,
+        "sample_tube": 0,
+        "mixture_tube": 0,
+        "sample_filter": 0,
+        "sample_cylinder": 0,
+        "filtration_filter": 0,
+        "chromatographic_cylinder": 0,
+    }
+
+
+def process_solid_liquid_station(station_data):
+    """处理固液配料工站"""
+    reagents = station_data.get("reagents") or []
+
+    # 初始化物料需求
+    station_materials = {
+        "test_tube_15": [],
+        "laiyu_powder": [],
+        "jingtai_powder": [],
+        "reagent_bottle_150": [],
+        "tip_1": 0,
+        "tip_5": 0,
+        "tip_10": 0,
+        "sample_tube": 0,
+        "mixture_tube": 0,
+        "sample_filter": 0,
+        "sample_cylinder": 0,
+        "filtration_filter": 0,
+        "chromatographic_cylinder": 0,
+    }
+
+    # 添加1个空试管（1任务 = 1试管）
+    station_materials["test_tube_15"].append(
+        {"reagent_name": "", "unit": "", "amount": 0}
+    )
+
+    # 处理试剂（stations 已由 normalize_stations 规范：用量为数字，单位与类型为规范取值）
+    for reagent in reagents:
+        item = {"reagent_name": reagent["name"], "unit": reagent["unit"], "amount": reagent["amount"]}
+
+        if reagent["type"] == "solid":
+            # 固体试剂使用铼羽粉筒
+            station_materials["laiyu_powder"].append(item)
+        elif reagent["type"] == "liquid":
+            # 液体试剂使用150mL试剂瓶
+            station_materials["reagent_bottle_150"].append(item)
+            # 液体试剂需要1mL枪头
+            station_materials["tip_1"] += 1
+
+    return station_materials
+
+
+def process_reaction_station(station_data):
+    """处理反应工站"""
+    # 反应监测物料需求
+    monitoring_count = station_data.get("monitoringCount") or 0
+    if monitoring_count == 0:
+        params = station_data.get("params") or {}
+        duration_min = params.get("duration") or 0
+        interval_min = params.get("samplingInterval") or 0
+        if duration_min > 0 and interval_min > 0:
+            monitoring_count = duration_min // interval_min
+
+    # 初始化物料需求
+    station_materials = {
+        "test_tube_15": [],
+        "laiyu_powder": [],
+        "jingtai_powder": [],
+        "reagent_bottle_150": [],
+        "tip_1": monitoring_count * 2,  # 1次反应监测需要2根1mL枪头
+        "tip_5": 0,
+        "tip_10": 0,
+        "sample_tube": monitoring_count,  # 1次反应监测需要1个采样瓶
+        "mixture_tube": monitoring_count,  # 1次反应监测需要1个混合瓶
+        "sample_filter": monitoring_count,  # 1次反应监测需要1个小滤头
+        "sample_cylinder": 0,
+        "filtration_filter": 0,
+        "chromatographic_cylinder": 0,
+    }
+
+    return station_materials
+
+
+def process_glovebox_station(station_data):
+    """处理手套箱工站"""
+    # 配料规则同固液配料
+    result = process_solid_liquid_station(station_data)
+
+    # 反应监测规则同反应工站
+    reaction = station_data.get("reaction") or {}
+    if reaction.get("enabled"):
+        reaction_result = process_reaction_station(reaction)
+        # 累加耗材数量
+        for key, value in reaction_result.items():
+            if isinstance(value, int):
+                result[key] += value
+
+    return result
+
+
+def process_evaporation_station(station_data):
+    """处理旋蒸工站"""
+    return {
+        "test_tube_15": [],
+        "laiyu_powder": [],
+        "jingtai_powder": [],
+        "reagent_bottle_150": [],
+        "tip_1": 0,
+        "tip_5": 1,  # 1次旋蒸 = 1根5mL枪头
+        "tip_10": 0,
+        "sample_tube": 0,
+        "mixture_tube": 0,
+        "sample_filter": 0,
+        "sample_cylinder": 0,
+        "filtration_filter": 0,
+        "chromatographic_cylinder": 0,
+    }
+
+
+def process_filtration_station(station_data):
+    """处理过滤分液工站"""
+    return {
+        "test_tube_15": [],
+        "laiyu_powder": [],
+        "jingtai_powder": [],
+        "reagent_bottle_150": [],
+        "tip_1": 0,
+        "tip_5": 0,
+        "tip_10": 0,
+        "sample_tube": 0,
+        "mixture_tube": 0,
+        "sample_filter": 0,
+        "sample_cylinder": 0,
+        "filtration_filter": 0,
+        "chromatographic_cylinder": 0,
+    }
+
+
+def process_column_station(station_data):
+    """处理过柱工站"""
+    return {
+        "test_tube_15": [],
+        "laiyu_powder": [],
+        "jingtai_powder": [],
+        "reagent_bottle_150": [],
+        "tip_1": 0,
+        "tip_5": 0,
+        "tip_10": 0,
+        "sample_tube": 0,
+        "mixture_tube": 0,
+        "sample_filter": 0,
+        "sample_cylinder": 0,
+        "filtration_filter": 0,
+        "chromatographic_cylinder": 0,
+    }
+
+
+def process_tlc_station(station_data):
+    """处理点板工站"""
+    return {
+        "test_tube_15": [],
+        "laiyu_powder": [],
+        "jingtai_powder": [],
+        "reagent_bottle_150": [],
+        "tip_1": 0,
+        "tip_5": 0,
+        "tip_10": 0,
+        "sample_tube": 0,
+        "mixture_tube": 0,
+        "sample_filter": 0,
+        "sample_cylinder": 0,
+        "filtration_filter": 0,
+        "chromatographic_cylinder": 0,
+    }
+
+
+def process_gcms_station(station_data):
+    """处理GCMS工站"""
+    return {
+        "test_tube_15": [],
+        "laiyu_powder": [],
+        "jingtai_powder": [],
+        "reagent_bottle_150": [],
+        "tip_1": 0,
+        "tip_5": 0,
+        "tip_10": 0,
+        "sample_tube": 0,
+        "mixture_tube": 0,
+        "sample_filter": 0,
+        "sample_cylinder": 0,
+        "filtration_filter": 0,
+        "chromatographic_cylinder": 0,
+    }
+
+
+def process_hplc_station(station_data):
+    """处理HPLC工站"""
+    return {
+        "test_tube_15": [],
+        "laiyu_powder": [],
+        "jingtai_powder": [],
+        "reagent_bottle_150": [],
+        "tip_1": 0,
+        "tip_5": 0,
+        "tip_10": 0,
+        "sample_tube": 0,
+        "mixture_tube": 0,
+        "sample_filter": 0,
+        "sample_cylinder": 0,
+        "filtration_filter": 0,
+        "chromatographic_cylinder": 0,
+    }
+
+
+# 工站处理映射
+STATION_PROCESSORS = {
+    "solidLiquid": process_solid_liquid_station,
+    "reaction": process_reaction_station,
+    "glovebox": process_glovebox_station,
+    "evaporation": process_evaporation_station,
+    "filtration": process_filtration_station,
+    "column": process_column_station,
+    "tlc": process_tlc_station,
+    "gcms": process_gcms_station,
+    "hplc": process_hplc_station,
+}
+
+
+def analyze_material_requirements_for_task(task):
+    """
+    分析实验任务的物料需求（按工站维度统计）
+    返回按工站分组的物料需求，按照物料统计.md文档的数据模型
+    """
+    stations = task.stations or {}
+    station_materials = {}
+
+    # 处理各个工站
+    for station_key, station_data in stations.items():
+        if not station_data.get("enabled"):
+            continue
+        processor = STATION_PROCESSORS.get(station_key)
+        if processor:
+            station_materials[station_key] = processor(station_data)
+
+    return station_materials
+
+
+def expand_station_requirements(stations):
+    """
+    将 Task.stations 展开为扁平的需求行，供 TaskStationRequirement 建索引：
+    每个启用的工站一行 material_type="station"；带试剂的物料每项一行；耗材按数量一行
+    stations 须为规范形式（见 station_schema.normalize_stations，迁移 0048 已规范历史数据）
+    """
+    rows = []
+    for station_key, station_data in (stations or {}).items():
+        if not station_data.get("enabled"):
+            continue
+        rows.append({"station_key": station_key, "material_type": "station", "count": 1})
+        processor = STATION_PROCESSORS.get(station_key)
+        materials = processor(station_data) if processor else {}
+        for material_type, value in materials.items():
+            if isinstance(value, list):
+                for item in value:
+                    rows.append(
+                        {
+                            "station_key": station_key,
+                            "material_type": material_type,
+                            "reagent_name": item["reagent_name"],
+                            "amount": item["amount"],
+                            "unit": item["unit"],
+                            "count": 1,
+                        }
+                    )
+            elif value:
+                rows.append({"station_key": station_key, "material_type": material_type, "count": int(value)})
+    return rows
+
+
+def build_station_materials(rows):
+    """
+    由 TaskStationRequirement 的分组汇总行还原 (station_materials, totals)，各工站结构与 analyze_material_requirements_for_task 一致
+    rows 需包含 station_key、material_type、reagent_name、unit 及组内合计 total_amount、total_count；
+    material_type="station" 的工站行只建立工站键，使不需要物料的已启用工站同样出现在结果中
+    """
+    station_materials = {}
+    totals = make_materials_counter()
+    for row in rows:
+        material_type = row["material_type"]
+        if material_type != "station" and material_type not in totals:
+            continue
+        agg = station_materials.get(row["station_key"])
+        if agg is None:
+            agg = station_materials[row["station_key"]] = make_station_materials()
+        if material_type == "station":
+            continue
+        count = row["total_count"] or 0
+        if material_type == "test_tube_15":
+            agg["test_tube_15"].extend({"reagent_name": "", "unit": "", "amount": 0} for _ in range(count))
+            totals["test_tube_15"] += count
+        elif material_type in REAGENT_MATERIAL_TYPES:
+            if not row["reagent_name"]:
+                continue
+            agg[material_type].append(
+                {"reagent_name": row["reagent_name"], "unit": row["unit"], "amount": row["total_amount"] or 0}
+            )
+            totals[material_type] += 1
+        else:
+            agg[material_type] += count
+            totals[material_type] += count
+    return station_materials, totals
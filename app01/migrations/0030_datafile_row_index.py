@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0029_aichatsession_aichatmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datafile',
+            name='row_index',
+            field=models.JSONField(blank=True, null=True, verbose_name='行偏移索引'),
+        ),
+    ]
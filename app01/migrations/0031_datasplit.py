@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0030_datafile_row_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mltask',
+            name='split_fold',
+            field=models.IntegerField(blank=True, null=True, verbose_name='测试折编号(K折)'),
+        ),
+        migrations.CreateModel(
+            name='DataSplit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='划分名称')),
+                ('method', models.CharField(choices=[('random', '随机划分'), ('stratified', '分层划分'), ('group', '分组划分'), ('time', '时间顺序划分'), ('kfold', 'K折交叉')], default='random', max_length=20, verbose_name='划分方式')),
+                ('parameters', models.JSONField(default=dict, verbose_name='划分参数')),
+                ('n_folds', models.IntegerField(default=0, verbose_name='折数(K折)')),
+                ('source_rows', models.IntegerField(verbose_name='源数据行数')),
+                ('source_file_size', models.BigIntegerField(verbose_name='源文件大小(字节)')),
+                ('assignments', models.BinaryField(verbose_name='行分区标签')),
+                ('summary', models.JSONField(default=dict, verbose_name='各分区行数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('data_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='splits', to='app01.datafile', verbose_name='数据文件')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '数据集划分',
+                'verbose_name_plural': '数据集划分',
+                'db_table': 'data_split',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='mltask',
+            name='data_split',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ml_tasks', to='app01.datasplit', verbose_name='数据集划分'),
+        ),
+    ]
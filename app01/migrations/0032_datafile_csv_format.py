@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0031_datasplit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datafile',
+            name='csv_format',
+            field=models.JSONField(blank=True, null=True, verbose_name='CSV格式'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0032_datafile_csv_format'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True, verbose_name='内容SHA256')),
+                ('file_path', models.CharField(max_length=500, verbose_name='文件路径')),
+                ('file_size', models.BigIntegerField(verbose_name='文件大小(字节)')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='引用计数')),
+                ('profile', models.JSONField(blank=True, null=True, verbose_name='数据画像缓存')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '数据文件实体',
+                'verbose_name_plural': '数据文件实体',
+                'db_table': 'data_blob',
+            },
+        ),
+        migrations.AddField(
+            model_name='datafile',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='data_files', to='app01.datablob', verbose_name='内容实体'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0033_datablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datafile',
+            name='outlier_cache',
+            field=models.JSONField(blank=True, null=True, verbose_name='异常检测缓存'),
+        ),
+    ]
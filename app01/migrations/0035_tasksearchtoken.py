@@ -0,0 +1,100 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:03
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# 以下为本迁移编写时的检索分词规则快照（app01.models.tokenize_search_text / TaskSearchToken.build_tokens），
+# 冻结在迁移内，避免日后修改应用代码改变历史迁移的行为
+SEARCH_STATION_NAMES = {
+    'solidLiquid': '固液配料',
+    'reaction': '反应',
+    'glovebox': '手套箱固液配料与反应',
+    'filtration': '过滤分液',
+    'evaporation': '旋蒸',
+    'column': '过柱',
+    'tlc': '点板',
+    'gcms': 'GCMS',
+    'hplc': 'HPLC',
+}
+FIELD_WEIGHTS = {'name': 4, 'reagent': 2, 'station': 2, 'remark': 1}
+SEARCH_TERM_RE = re.compile(r'[\u4e00-\u9fff]+|[0-9a-z]+')
+
+
+def _ngrams(term, sizes):
+    return [term[i:i + n] for n in sizes for i in range(len(term) - n + 1)]
+
+
+def tokenize(text):
+    tokens = []
+    for term in SEARCH_TERM_RE.findall((text or '').lower()):
+        if '\u4e00' <= term[0] <= '\u9fff':
+            tokens.extend(_ngrams(term, (1, 2)))
+        else:
+            tokens.extend(_ngrams(term, (1, 2, 3)))
+    return tokens
+
+
+def build_tokens(name, remark, stations):
+    terms = [('name', name), ('remark', remark)]
+    for key, data in (stations if isinstance(stations, dict) else {}).items():
+        if not isinstance(data, dict) or not data.get('enabled'):
+            continue
+        terms.append(('station', f"{key} {SEARCH_STATION_NAMES.get(key, '')}"))
+        for reagent in data.get('reagents') or []:
+            if isinstance(reagent, dict) and reagent.get('name'):
+                terms.append(('reagent', str(reagent['name'])))
+    weights = {}
+    for field, text in terms:
+        for token in set(tokenize(text)):
+            weights[token] = weights.get(token, 0) + FIELD_WEIGHTS[field]
+    return weights
+
+
+def populate_search_tokens(apps, schema_editor):
+    """
+    为现有任务生成检索词元
+    """
+    Task = apps.get_model('app01', 'Task')
+    TaskSearchToken = apps.get_model('app01', 'TaskSearchToken')
+    rows = []
+    for task_id, name, remark, stations in Task.objects.values_list('id', 'name', 'remark', 'stations').iterator():
+        rows.extend(
+            TaskSearchToken(task_id=task_id, token=token, weight=min(weight, 32767))
+            for token, weight in build_tokens(name, remark, stations).items()
+        )
+        if len(rows) >= 5000:
+            TaskSearchToken.objects.bulk_create(rows)
+            rows = []
+    TaskSearchToken.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0034_datafile_outlier_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=32, verbose_name='词元')),
+                ('weight', models.PositiveSmallIntegerField(default=1, verbose_name='权重')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='app01.task', verbose_name='任务')),
+            ],
+            options={
+                'verbose_name': '任务检索词元',
+                'verbose_name_plural': '任务检索词元',
+                'db_table': 'task_search_token',
+                'indexes': [models.Index(fields=['token', 'task'], name='task_search_token_ce71fd_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='tasksearchtoken',
+            constraint=models.UniqueConstraint(fields=('task', 'token'), name='uniq_task_search_token'),
+        ),
+        migrations.RunPython(populate_search_tokens, migrations.RunPython.noop),
+    ]
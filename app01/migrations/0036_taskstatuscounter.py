@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_task_status_counters(apps, schema_editor):
+    """
+    按现有任务初始化 (用户, 状态) 计数
+    """
+    Task = apps.get_model('app01', 'Task')
+    TaskStatusCounter = apps.get_model('app01', 'TaskStatusCounter')
+    TaskStatusCounter.objects.bulk_create([
+        TaskStatusCounter(user_id=row['created_by'], status=row['status'], count=row['total'])
+        for row in Task.objects.values('created_by', 'status').annotate(total=models.Count('id'))
+    ])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0035_tasksearchtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStatusCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('draft', '草稿'), ('pending', '待审核'), ('approved', '已通过'), ('scheduled', '已排程'), ('in_progress', '进行中'), ('completed', '已完成'), ('rejected', '已驳回'), ('cancelled', '已取消')], max_length=20, verbose_name='状态')),
+                ('count', models.IntegerField(default=0, verbose_name='数量')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_status_counters', to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '任务状态计数',
+                'verbose_name_plural': '任务状态计数',
+                'db_table': 'task_status_counter',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='taskstatuscounter',
+            constraint=models.UniqueConstraint(fields=('user', 'status'), name='uniq_user_status_counter'),
+        ),
+        migrations.RunPython(populate_task_status_counters, migrations.RunPython.noop),
+    ]
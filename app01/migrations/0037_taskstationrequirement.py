@@ -0,0 +1,133 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# 以下为本迁移编写时的备料规则快照（app01.material_requirements），
+# 冻结在迁移内，避免日后修改或重命名应用代码改变历史迁移的行为
+STATION_KEYS = ('solidLiquid', 'reaction', 'glovebox', 'evaporation', 'filtration', 'column', 'tlc', 'gcms', 'hplc')
+COUNTED_TYPES = (
+    'tip_1', 'tip_5', 'tip_10', 'sample_tube', 'mixture_tube',
+    'sample_filter', 'sample_cylinder', 'filtration_filter', 'chromatographic_cylinder',
+)
+
+
+def _reaction_counts(station_data):
+    monitoring_count = station_data.get('monitoringCount', 0)
+    if monitoring_count == 0:
+        params = station_data.get('params') or {}
+        duration_min = int(params.get('duration') or 0)
+        interval_min = int(params.get('samplingInterval') or 0)
+        if duration_min > 0 and interval_min > 0:
+            monitoring_count = duration_min // interval_min
+    return {
+        'tip_1': monitoring_count * 2,
+        'sample_tube': monitoring_count,
+        'mixture_tube': monitoring_count,
+        'sample_filter': monitoring_count,
+    }
+
+
+def _station_materials(station_key, station_data):
+    lists = {'test_tube_15': [], 'laiyu_powder': [], 'jingtai_powder': [], 'reagent_bottle_150': []}
+    counts = dict.fromkeys(COUNTED_TYPES, 0)
+    if station_key in ('solidLiquid', 'glovebox'):
+        lists['test_tube_15'].append({'reagent_name': '', 'unit': '', 'amount': 0})
+        for reagent in station_data.get('reagents') or []:
+            amount = reagent.get('amount', '')
+            item = {
+                'reagent_name': reagent.get('name', ''),
+                'unit': reagent.get('unit', ''),
+                'amount': float(amount) if amount else 0,
+            }
+            if reagent.get('type', '') == 'solid':
+                lists['laiyu_powder'].append(item)
+            elif reagent.get('type', '') == 'liquid':
+                lists['reagent_bottle_150'].append(item)
+                counts['tip_1'] += 1
+    if station_key == 'reaction':
+        counts.update(_reaction_counts(station_data))
+    elif station_key == 'glovebox':
+        reaction = station_data.get('reaction', {})
+        if reaction.get('enabled'):
+            for key, value in _reaction_counts(reaction).items():
+                if isinstance(value, int):
+                    counts[key] += value
+    elif station_key == 'evaporation':
+        counts['tip_5'] = 1
+    return {**lists, **counts}
+
+
+def expand_station_requirements(stations):
+    """每个启用的工站一行 material_type="station"；带试剂的物料每项一行；耗材按数量一行"""
+    rows = []
+    if not isinstance(stations, dict):
+        return rows
+    for station_key, station_data in stations.items():
+        if not isinstance(station_data, dict) or not station_data.get('enabled'):
+            continue
+        rows.append({'station_key': station_key, 'material_type': 'station', 'count': 1})
+        if station_key not in STATION_KEYS:
+            continue
+        try:
+            materials = _station_materials(station_key, station_data)
+        except (TypeError, ValueError, AttributeError):
+            continue
+        for material_type, value in materials.items():
+            if isinstance(value, list):
+                for item in value:
+                    rows.append({
+                        'station_key': station_key,
+                        'material_type': material_type,
+                        'reagent_name': item.get('reagent_name') or '',
+                        'amount': item.get('amount') or 0,
+                        'unit': item.get('unit') or '',
+                        'count': 1,
+                    })
+            elif value:
+                rows.append({'station_key': station_key, 'material_type': material_type, 'count': int(value)})
+    return rows
+
+
+def populate_station_requirements(apps, schema_editor):
+    """
+    按现有任务的工站参数生成需求索引
+    """
+    Task = apps.get_model('app01', 'Task')
+    TaskStationRequirement = apps.get_model('app01', 'TaskStationRequirement')
+    rows = []
+    for task_id, stations in Task.objects.values_list('id', 'stations').iterator():
+        rows.extend(TaskStationRequirement(task_id=task_id, **row) for row in expand_station_requirements(stations))
+        if len(rows) >= 1000:
+            TaskStationRequirement.objects.bulk_create(rows)
+            rows = []
+    TaskStationRequirement.objects.bulk_create(rows)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0036_taskstatuscounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStationRequirement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('station_key', models.CharField(max_length=32, verbose_name='工站')),
+                ('material_type', models.CharField(max_length=32, verbose_name='物料类型')),
+                ('reagent_name', models.CharField(blank=True, default='', max_length=255, verbose_name='试剂名称')),
+                ('amount', models.FloatField(default=0, verbose_name='用量')),
+                ('unit', models.CharField(blank=True, default='', max_length=32, verbose_name='单位')),
+                ('count', models.PositiveIntegerField(default=1, verbose_name='数量')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='station_requirements', to='app01.task', verbose_name='任务')),
+            ],
+            options={
+                'verbose_name': '任务工站需求',
+                'verbose_name_plural': '任务工站需求',
+                'db_table': 'task_station_requirement',
+                'indexes': [models.Index(fields=['station_key', 'material_type'], name='task_statio_station_208594_idx'), models.Index(fields=['reagent_name'], name='task_statio_reagent_4ca9a9_idx'), models.Index(fields=['material_type', 'reagent_name'], name='task_statio_materia_3cac1d_idx')],
+            },
+        ),
+        migrations.RunPython(populate_station_requirements, migrations.RunPython.noop),
+    ]
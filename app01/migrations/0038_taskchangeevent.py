@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0037_taskstationrequirement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskChangeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.BigIntegerField(verbose_name='任务ID')),
+                ('event_type', models.CharField(choices=[('created', '创建'), ('updated', '修改'), ('transition', '状态变更'), ('deleted', '删除')], max_length=20, verbose_name='事件类型')),
+                ('from_status', models.CharField(blank=True, default='', max_length=20, verbose_name='原状态')),
+                ('to_status', models.CharField(blank=True, default='', max_length=20, verbose_name='新状态')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='发生时间')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_change_events', to=settings.AUTH_USER_MODEL, verbose_name='任务提交人')),
+            ],
+            options={
+                'verbose_name': '任务变更事件',
+                'verbose_name_plural': '任务变更事件',
+                'db_table': 'task_change_event',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['owner', 'id'], name='task_change_owner_i_8d4b64_idx'), models.Index(fields=['task_id', 'id'], name='task_change_task_id_208695_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0038_taskchangeevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('task_status_log', '任务状态日志'), ('reagent_operation', '试剂操作日志'), ('fill_operation', '装填操作'), ('data_processing_log', '数据处理日志')], max_length=32, verbose_name='来源表')),
+                ('owner_key', models.BigIntegerField(verbose_name='归属对象ID')),
+                ('period', models.CharField(max_length=7, verbose_name='月份')),
+                ('row_count', models.PositiveIntegerField(verbose_name='行数')),
+                ('first_at', models.DateTimeField(verbose_name='最早时间')),
+                ('last_at', models.DateTimeField(verbose_name='最晚时间')),
+                ('payload', models.BinaryField(verbose_name='压缩数据')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='归档时间')),
+            ],
+            options={
+                'verbose_name': '审计日志归档',
+                'verbose_name_plural': '审计日志归档',
+                'db_table': 'audit_archive_segment',
+                'indexes': [models.Index(fields=['source', 'owner_key', 'period'], name='audit_archi_source_57806f_idx'), models.Index(fields=['source', 'period'], name='audit_archi_source_561f57_idx')],
+            },
+        ),
+    ]
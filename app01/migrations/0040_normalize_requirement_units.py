@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:18
+
+from django.db import migrations
+
+# 本迁移编写时的单位别名快照（app01.station_schema.UNIT_ALIASES），冻结在迁移内
+UNIT_ALIASES = {
+    'g': 'g', '克': 'g',
+    'mg': 'mg', '毫克': 'mg',
+    'kg': 'kg', '千克': 'kg',
+    'ml': 'ml', '毫升': 'ml',
+    'l': 'L', '升': 'L',
+    'mol': 'mol', '摩尔': 'mol',
+    'mmol': 'mmol', '毫摩尔': 'mmol',
+}
+
+
+def normalize_unit(unit):
+    text = str(unit or '').strip()
+    return UNIT_ALIASES.get(text.lower(), text)
+
+
+def normalize_requirement_units(apps, schema_editor):
+    """
+    将已有工站需求行的单位统一为规范写法，使备料汇总可直接按单位分组
+    """
+    TaskStationRequirement = apps.get_model('app01', 'TaskStationRequirement')
+    for unit in TaskStationRequirement.objects.values_list('unit', flat=True).distinct():
+        normalized = normalize_unit(unit)
+        if normalized != unit:
+            TaskStationRequirement.objects.filter(unit=unit).update(unit=normalized)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0039_auditarchivesegment'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_requirement_units, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from django.utils.dateparse import parse_datetime
+
+
+def copy_fill_bindings(apps, schema_editor):
+    """
+    将备料清单中嵌套 JSON 的绑定关系逐条迁入绑定表，无法解析的索引跳过
+    """
+    PreparationList = apps.get_model('app01', 'PreparationList')
+    MaterialFillBinding = apps.get_model('app01', 'MaterialFillBinding')
+    Container = apps.get_model('app01', 'Container')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    container_ids = dict(Container.objects.values_list('name', 'id'))
+    user_ids = set(User.objects.values_list('id', flat=True))
+    rows = []
+    for prep_id, bindings in PreparationList.objects.values_list('id', 'material_fill_bindings').iterator():
+        for station_key, by_type in (bindings or {}).items():
+            for material_type, by_index in (by_type or {}).items():
+                for index, info in (by_index or {}).items():
+                    if not str(index).isdigit() or not isinstance(info, dict):
+                        continue
+                    slot = str(info.get('slot_position') or '')
+                    filled_at = parse_datetime(info.get('filled_at') or '') or django.utils.timezone.now()
+                    rows.append(MaterialFillBinding(
+                        preparation_list_id=prep_id,
+                        station_key=station_key,
+                        material_type=material_type,
+                        material_index=int(index),
+                        material_name=(info.get('material_name') or '')[:128],
+                        material_kind=info.get('material_type') or material_type,
+                        container_id=container_ids.get(info.get('container_name')),
+                        container_name=info.get('container_name') or '',
+                        slot_index=int(slot) if slot.isdigit() else None,
+                        slots=info.get('slots'),
+                        filled_at=filled_at,
+                        filled_by_id=info.get('filled_by') if info.get('filled_by') in user_ids else None,
+                    ))
+    MaterialFillBinding.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0040_normalize_requirement_units'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaterialFillBinding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('station_key', models.CharField(max_length=32, verbose_name='工站')),
+                ('material_type', models.CharField(max_length=64, verbose_name='需求物料类型')),
+                ('material_index', models.PositiveIntegerField(verbose_name='需求索引')),
+                ('material_name', models.CharField(max_length=128, verbose_name='装填物料名称')),
+                ('material_kind', models.CharField(max_length=64, verbose_name='装填物料类型')),
+                ('container_name', models.CharField(blank=True, default='', max_length=128, verbose_name='转移仓名称')),
+                ('slot_index', models.PositiveIntegerField(blank=True, null=True, verbose_name='槽位索引')),
+                ('slots', models.JSONField(blank=True, null=True, verbose_name='占用槽位列表')),
+                ('filled_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='装填时间')),
+                ('container', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app01.container', verbose_name='转移仓')),
+                ('filled_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='装填人')),
+                ('preparation_list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fill_bindings', to='app01.preparationlist', verbose_name='备料清单')),
+            ],
+            options={
+                'verbose_name': '物料装填绑定',
+                'verbose_name_plural': '物料装填绑定',
+                'db_table': 'material_fill_binding',
+                'indexes': [models.Index(fields=['container', 'slot_index'], name='material_fi_contain_7393f2_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='materialfillbinding',
+            constraint=models.UniqueConstraint(fields=('preparation_list', 'station_key', 'material_type', 'material_index'), name='uniq_prep_material_binding'),
+        ),
+        migrations.RunPython(copy_fill_bindings, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='preparationlist',
+            name='material_fill_bindings',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0041_materialfillbinding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReagentReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=3, max_digits=16, verbose_name='预留量')),
+                ('status', models.CharField(choices=[('active', '预留中'), ('consumed', '已消耗'), ('released', '已释放')], default='active', max_length=16, verbose_name='状态')),
+                ('task_ids', models.JSONField(blank=True, default=list, verbose_name='关联任务ID列表')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reagent_reservations', to=settings.AUTH_USER_MODEL, verbose_name='预留人')),
+                ('reagent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='app01.reagent', verbose_name='试剂')),
+            ],
+            options={
+                'verbose_name': '试剂预留',
+                'verbose_name_plural': '试剂预留',
+                'db_table': 'reagent_reservation',
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['reagent', 'status'], name='reagent_res_reagent_ee6abb_idx'), models.Index(fields=['created_by', 'status'], name='reagent_res_created_57d47d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0042_reagentreservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jingtaipowder',
+            index=models.Index(fields=['created_at', 'id'], name='jingtai_pow_created_82f925_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jingtaipowder',
+            index=models.Index(fields=['state', 'created_at'], name='jingtai_pow_state_5a10ec_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jingtaipowder',
+            index=models.Index(fields=['current_container', 'state'], name='jingtai_pow_current_6ca5ee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='laiyupowder',
+            index=models.Index(fields=['created_at', 'id'], name='laiyu_powde_created_c9c050_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='laiyupowder',
+            index=models.Index(fields=['state', 'created_at'], name='laiyu_powde_state_5c7f64_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='laiyupowder',
+            index=models.Index(fields=['current_container', 'state'], name='laiyu_powde_current_f30c97_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reagentbottle150',
+            index=models.Index(fields=['created_at', 'id'], name='reagent_bot_created_aabfd0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reagentbottle150',
+            index=models.Index(fields=['state', 'created_at'], name='reagent_bot_state_3caed3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reagentbottle150',
+            index=models.Index(fields=['current_container', 'state'], name='reagent_bot_current_40a56b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testtube15',
+            index=models.Index(fields=['created_at', 'id'], name='test_tube_1_created_b77a0f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testtube15',
+            index=models.Index(fields=['state', 'created_at'], name='test_tube_1_state_48f7a2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testtube15',
+            index=models.Index(fields=['current_container', 'state'], name='test_tube_1_current_ebbf7d_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:35
+
+from django.db import migrations, models
+
+
+MATERIAL_KINDS = (
+    ('test_tube_15', 'TestTube15'),
+    ('laiyu_powder', 'LaiyuPowder'),
+    ('jingtai_powder', 'JingtaiPowder'),
+    ('reagent_bottle_150', 'ReagentBottle150'),
+)
+
+
+def check_cross_kind_duplicates(apps, schema_editor):
+    """
+    名称即打印的条码，迁移不改写；存在跨类型重名时中止迁移并列出全部重名，
+    由操作人员在物料管理中改名（并重新打印条码）后再执行迁移
+    在建表之前执行，中止后可直接重新迁移
+    """
+    owners = {}
+    for kind, model_name in MATERIAL_KINDS:
+        for material_id, name in apps.get_model('app01', model_name).objects.values_list('id', 'name').iterator():
+            owners.setdefault(name, []).append(f"{kind}#{material_id}")
+    duplicates = {name: found for name, found in owners.items() if len(found) > 1}
+    if duplicates:
+        lines = "\n".join(f"  {name}: {', '.join(found)}" for name, found in sorted(duplicates.items()))
+        raise RuntimeError(f"物料名称跨类型重复 {len(duplicates)} 个，请先改名后再迁移：\n{lines}")
+
+
+def backfill_material_names(apps, schema_editor):
+    """
+    为已有的四类物料登记名称（跨类型重名已由 check_cross_kind_duplicates 排除）
+    """
+    MaterialName = apps.get_model('app01', 'MaterialName')
+    for kind, model_name in MATERIAL_KINDS:
+        model = apps.get_model('app01', model_name)
+        MaterialName.objects.bulk_create(
+            [
+                MaterialName(name=name, kind=kind, material_id=material_id)
+                for material_id, name in model.objects.values_list('id', 'name').iterator()
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0043_material_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_cross_kind_duplicates, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='MaterialName',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=128, unique=True, verbose_name='唯一名')),
+                ('kind', models.CharField(choices=[('test_tube_15', '15mL试管'), ('laiyu_powder', '铼羽粉筒'), ('jingtai_powder', '晶泰粉筒'), ('reagent_bottle_150', '150mL试剂瓶'), ('tip_1', '1mL枪头'), ('tip_5', '5mL枪头'), ('tip_10', '10mL枪头'), ('sample_filter', '采样滤头'), ('filtration_filter', '过滤滤头'), ('mixture_tube', '混合瓶'), ('sample_tube', '采样瓶'), ('sample_cylinder', '进样柱'), ('chromatographic_cylinder', '色谱柱')], max_length=32, verbose_name='物料类型')),
+                ('material_id', models.BigIntegerField(verbose_name='物料ID')),
+            ],
+            options={
+                'verbose_name': '物料名称登记',
+                'verbose_name_plural': '物料名称登记',
+                'db_table': 'material_name_registry',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='materialname',
+            constraint=models.UniqueConstraint(fields=('kind', 'material_id'), name='uniq_material_name_entity'),
+        ),
+        migrations.RunPython(backfill_material_names, migrations.RunPython.noop),
+    ]
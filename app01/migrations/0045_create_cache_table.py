@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 21:02
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    """
+    创建 settings.CACHES 使用的数据库缓存表（已存在时跳过）
+    """
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0044_materialname'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0045_create_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasplit',
+            name='source_file_mtime_ns',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='源文件修改时间(ns)'),
+        ),
+        migrations.AddField(
+            model_name='datasplit',
+            name='source_file_path',
+            field=models.CharField(blank=True, default='', max_length=500, verbose_name='源文件路径'),
+        ),
+    ]
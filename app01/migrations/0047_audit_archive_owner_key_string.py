@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0046_data_split_source_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditarchivesegment',
+            name='owner_key',
+            field=models.CharField(max_length=64, verbose_name='归属对象ID'),
+        ),
+    ]
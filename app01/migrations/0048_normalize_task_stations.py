@@ -0,0 +1,237 @@
+# Generated by Django 4.2.7 on 2026-10-19 20:12
+
+from django.db import migrations
+
+# 以下为本迁移编写时的工站参数规范化与备料规则快照（app01.station_schema / app01.material_requirements），
+# 冻结在迁移内，避免日后修改或重命名应用代码改变历史迁移的行为
+UNIT_ALIASES = {
+    'g': 'g', '克': 'g',
+    'mg': 'mg', '毫克': 'mg',
+    'kg': 'kg', '千克': 'kg',
+    'ml': 'ml', '毫升': 'ml',
+    'l': 'L', '升': 'L',
+    'mol': 'mol', '摩尔': 'mol',
+    'mmol': 'mmol', '毫摩尔': 'mmol',
+}
+REAGENT_TYPE_ALIASES = {
+    'solid': 'solid', '固体': 'solid',
+    'liquid': 'liquid', '液体': 'liquid',
+}
+COUNTED_TYPES = (
+    'tip_1', 'tip_5', 'tip_10', 'sample_tube', 'mixture_tube',
+    'sample_filter', 'sample_cylinder', 'filtration_filter', 'chromatographic_cylinder',
+)
+
+
+def _enabled(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def _number(value, path, errors, integer=False, empty=None, minimum=0):
+    if value is None or value == '':
+        return empty
+    try:
+        number = None if isinstance(value, bool) else float(value)
+    except (TypeError, ValueError):
+        number = None
+    if number is None or number != number or number in (float('inf'), float('-inf')):
+        errors.append(path)
+        return value
+    if minimum is not None and number < minimum:
+        errors.append(path)
+        return value
+    if integer:
+        if number != int(number):
+            errors.append(path)
+            return value
+        return int(number)
+    return number
+
+
+def _choice(aliases, value):
+    text = str(value or '').strip()
+    return aliases.get(text.lower(), text)
+
+
+def _reagents(value, path, errors):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        errors.append(path)
+        return value
+    result = []
+    for i, reagent in enumerate(value):
+        if not isinstance(reagent, dict):
+            errors.append(f'{path}[{i}]')
+            result.append(reagent)
+            continue
+        result.append({
+            **reagent,
+            'name': str(reagent.get('name') or '').strip(),
+            # 旧数据的空用量在备料计算中一直按 0 处理
+            'amount': _number(reagent.get('amount'), f'{path}[{i}].amount', errors, empty=0.0),
+            'unit': _choice(UNIT_ALIASES, reagent.get('unit')),
+            'type': _choice(REAGENT_TYPE_ALIASES, reagent.get('type')),
+            'order': _number(reagent.get('order'), f'{path}[{i}].order', errors, integer=True, minimum=None),
+        })
+    return result
+
+
+def _reaction(value, path, errors):
+    if value is None:
+        return None
+    if not isinstance(value, dict):
+        errors.append(path)
+        return value
+    result = {**value, 'enabled': _enabled(value.get('enabled'))}
+    if 'monitoringCount' in value:
+        result['monitoringCount'] = _number(value['monitoringCount'], f'{path}.monitoringCount', errors, integer=True)
+    params = value.get('params')
+    if params is not None:
+        if not isinstance(params, dict):
+            errors.append(f'{path}.params')
+        else:
+            result['params'] = {**params}
+            for key in ('duration', 'samplingInterval'):
+                if key in params:
+                    result['params'][key] = _number(params[key], f'{path}.params.{key}', errors, integer=True)
+    return result
+
+
+def normalize_stations(stations, errors):
+    """
+    把工站参数规范为备料计算读取的形式：enabled 为布尔，试剂的名称/用量/单位/类型齐全且为规范取值，
+    反应监测次数与时长、采样间隔为整数；无法换算的字段路径追加到 errors
+    未启用的工站只规范 enabled 字段，其余内容原样保留
+    """
+    if not stations:
+        return stations
+    if not isinstance(stations, dict):
+        errors.append('stations')
+        return stations
+    result = {}
+    for key, data in stations.items():
+        if not isinstance(data, dict):
+            errors.append(key)
+            result[key] = data
+            continue
+        data = {**data, 'enabled': _enabled(data.get('enabled'))}
+        if data['enabled']:
+            if key in ('solidLiquid', 'glovebox') and 'reagents' in data:
+                data['reagents'] = _reagents(data['reagents'], f'{key}.reagents', errors)
+            if key == 'reaction':
+                data = _reaction(data, key, errors)
+            elif key == 'glovebox' and 'reaction' in data:
+                data['reaction'] = _reaction(data['reaction'], f'{key}.reaction', errors)
+        result[key] = data
+    return result
+
+
+def _monitoring_count(reaction):
+    count = reaction.get('monitoringCount') or 0
+    if count == 0:
+        params = reaction.get('params') or {}
+        duration, interval = params.get('duration') or 0, params.get('samplingInterval') or 0
+        if duration > 0 and interval > 0:
+            count = duration // interval
+    return count
+
+
+def expand_station_requirements(stations):
+    """规范形式的工站参数展开为需求索引行（规则同 app01.material_requirements）"""
+    rows = []
+    for station_key, station_data in (stations or {}).items():
+        if not station_data.get('enabled'):
+            continue
+        rows.append({'station_key': station_key, 'material_type': 'station', 'count': 1})
+        counts = dict.fromkeys(COUNTED_TYPES, 0)
+        if station_key in ('solidLiquid', 'glovebox'):
+            rows.append({'station_key': station_key, 'material_type': 'test_tube_15', 'count': 1})
+            for reagent in station_data.get('reagents') or []:
+                material_type = {'solid': 'laiyu_powder', 'liquid': 'reagent_bottle_150'}.get(reagent['type'])
+                if material_type is None:
+                    continue
+                rows.append({
+                    'station_key': station_key, 'material_type': material_type, 'reagent_name': reagent['name'],
+                    'amount': reagent['amount'], 'unit': reagent['unit'], 'count': 1,
+                })
+                if material_type == 'reagent_bottle_150':
+                    counts['tip_1'] += 1
+        reaction = station_data if station_key == 'reaction' else None
+        if station_key == 'glovebox' and (station_data.get('reaction') or {}).get('enabled'):
+            reaction = station_data['reaction']
+        if reaction is not None:
+            monitoring_count = _monitoring_count(reaction)
+            counts['tip_1'] += monitoring_count * 2
+            for key in ('sample_tube', 'mixture_tube', 'sample_filter'):
+                counts[key] += monitoring_count
+        if station_key == 'evaporation':
+            counts['tip_5'] = 1
+        rows.extend(
+            {'station_key': station_key, 'material_type': material_type, 'count': count}
+            for material_type, count in counts.items()
+            if count
+        )
+    return rows
+
+
+def check_unnormalizable_stations(apps, schema_editor):
+    """
+    工站参数中存在无法换算的值（非数字用量、结构错误等）时中止迁移并列出全部位置，
+    由操作人员在任务编辑页修正后再执行迁移；本操作不写数据，中止后可直接重新迁移
+    """
+    Task = apps.get_model('app01', 'Task')
+    problems = []
+    for task_id, stations in Task.objects.values_list('id', 'stations').iterator():
+        errors = []
+        normalize_stations(stations, errors)
+        problems.extend(f'  task#{task_id}: {path}' for path in errors)
+    if problems:
+        lines = '\n'.join(problems)
+        raise RuntimeError(f'工站参数无法规范化 {len(problems)} 处，请先修正后再迁移：\n{lines}')
+
+
+def normalize_task_stations(apps, schema_editor):
+    """
+    将已有任务的工站参数改写为规范形式，使备料计算可直接读取；
+    内容有变化的任务同时重建工站需求索引
+    """
+    Task = apps.get_model('app01', 'Task')
+    TaskStationRequirement = apps.get_model('app01', 'TaskStationRequirement')
+    changed = []
+
+    def flush():
+        Task.objects.bulk_update(changed, ['stations'])
+        TaskStationRequirement.objects.filter(task__in=[task.id for task in changed]).delete()
+        TaskStationRequirement.objects.bulk_create(
+            [
+                TaskStationRequirement(task_id=task.id, **row)
+                for task in changed
+                for row in expand_station_requirements(task.stations)
+            ],
+            batch_size=1000,
+        )
+        changed.clear()
+
+    for task in Task.objects.only('id', 'stations').iterator():
+        stations = normalize_stations(task.stations, [])
+        if stations != task.stations:
+            task.stations = stations
+            changed.append(task)
+        if len(changed) >= 500:
+            flush()
+    flush()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0047_audit_archive_owner_key_string'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_unnormalizable_stations, migrations.RunPython.noop),
+        migrations.RunPython(normalize_task_stations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 20:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+# 本迁移编写时的预留保留时长（app01.models.ReagentReservation.HOLD_DURATION），冻结在迁移内
+HOLD_DURATION = timezone.timedelta(hours=24)
+
+
+def expire_existing_reservations(apps, schema_editor):
+    """
+    已有的有效预留都未关联备料清单，从迁移时起按保留时长过期，避免长期占用库存
+    """
+    ReagentReservation = apps.get_model('app01', 'ReagentReservation')
+    ReagentReservation.objects.filter(status='active', expires_at__isnull=True).update(
+        expires_at=timezone.now() + HOLD_DURATION
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0048_normalize_task_stations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reagentreservation',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='过期时间'),
+        ),
+        migrations.AddField(
+            model_name='reagentreservation',
+            name='preparation_list',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservations', to='app01.preparationlist', verbose_name='备料清单'),
+        ),
+        migrations.RunPython(expire_existing_reservations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 20:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app01', '0049_reservation_lifecycle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskEventSequence',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='task_event_sequence', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='任务提交人')),
+            ],
+            options={
+                'verbose_name': '任务事件序列',
+                'verbose_name_plural': '任务事件序列',
+                'db_table': 'task_event_sequence',
+            },
+        ),
+    ]
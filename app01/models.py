@@ -1,5 +1,9 @@
 # region 导入与基础依赖
-from django.db import models
+import re
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.signals import post_delete
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from django.core.exceptions import ValidationError
@@ -255,6 +259,42 @@ class Task(models.Model):
     def __str__(self):
         return f"{self.name} - {self.get_status_display()}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录加载时的状态，保存时据此调整状态计数
+        instance._counted_status = instance.__dict__.get("status")
+        return instance
+
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        with transaction.atomic():
+            previous_status = None if created else getattr(self, "_counted_status", None)
+            super().save(*args, **kwargs)
+            TaskStatusCounter.record_saved([self], created=created)
+            TaskChangeEvent.record([TaskChangeEvent.for_saved(self, created, previous_status)])
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or set(update_fields) & set(TaskSearchToken.INDEXED_FIELDS):
+            TaskSearchToken.rebuild_for([self])
+        if update_fields is None or "stations" in update_fields:
+            TaskStationRequirement.rebuild_for([self])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            user_id, status = self.created_by_id, getattr(self, "_counted_status", None) or self.status
+            task_id = self.pk
+            result = super().delete(*args, **kwargs)
+            TaskStatusCounter.adjust({(user_id, status): -1})
+            TaskChangeEvent.record([
+                TaskChangeEvent(
+                    task_id=task_id,
+                    owner_id=user_id,
+                    event_type=TaskChangeEvent.DELETED,
+                    from_status=status,
+                )
+            ])
+        return result
+
     def can_transition_to(self, new_status):
         """
         检查是否可以转换到指定状态
@@ -273,7 +313,10 @@ class Task(models.Model):
         old_status = self.status
         self.status = new_status
         self.updated_at = timezone.now()
-        self.save()
+        self.save(update_fields=["status", "updated_at"])
+        if new_status == TaskStatus.APPROVED:
+            # 审核通过后工站参数不再可编辑，在此固化物料需求供备料直接汇总
+            TaskStationRequirement.rebuild_for([self])
 
         # 记录状态变更日志
         TaskStatusLog.objects.create(
@@ -286,6 +329,69 @@ class Task(models.Model):
 
         return self
 
+    @classmethod
+    def bulk_transition_to(cls, task_ids, new_status, user, reason=None):
+        """
+        批量转换状态：一次查询校验来源状态，一条条件UPDATE更新，状态日志批量写入
+        返回 (成功的任务ID列表, {任务ID: 失败原因})
+        """
+        new_status_display = dict(TaskStatus.choices).get(new_status, new_status)
+        allowed_from = [
+            status for status, targets in TaskStatusManager.STATUS_TRANSITIONS.items()
+            if new_status in targets
+        ]
+        failures = {}
+        with transaction.atomic():
+            rows = cls.objects.select_for_update().filter(id__in=task_ids).values_list(
+                "id", "status", "created_by_id"
+            )
+            current = {task_id: status for task_id, status, _ in rows}
+            owners = {task_id: user_id for task_id, _, user_id in rows}
+            eligible = []
+            for task_id in task_ids:
+                if task_id not in current:
+                    failures[task_id] = "任务不存在"
+                elif current[task_id] not in allowed_from:
+                    failures[task_id] = (
+                        f"不允许从 {dict(TaskStatus.choices).get(current[task_id], current[task_id])} "
+                        f"转换到 {new_status_display}"
+                    )
+                elif task_id not in eligible:
+                    eligible.append(task_id)
+
+            if eligible:
+                cls.objects.filter(id__in=eligible, status__in=allowed_from).update(
+                    status=new_status, updated_at=timezone.now()
+                )
+                TaskStatusLog.objects.bulk_create([
+                    TaskStatusLog(
+                        task_id=task_id,
+                        from_status=current[task_id],
+                        to_status=new_status,
+                        changed_by=user,
+                        reason=reason,
+                    )
+                    for task_id in eligible
+                ])
+                deltas = {}
+                for task_id in eligible:
+                    for key, delta in (((owners[task_id], current[task_id]), -1), ((owners[task_id], new_status), 1)):
+                        deltas[key] = deltas.get(key, 0) + delta
+                TaskStatusCounter.adjust(deltas)
+                if new_status == TaskStatus.APPROVED:
+                    TaskStationRequirement.rebuild_for(cls.objects.filter(id__in=eligible).only("id", "stations"))
+                TaskChangeEvent.record([
+                    TaskChangeEvent(
+                        task_id=task_id,
+                        owner_id=owners[task_id],
+                        event_type=TaskChangeEvent.TRANSITION,
+                        from_status=current[task_id],
+                        to_status=new_status,
+                    )
+                    for task_id in eligible
+                ])
+        return eligible, failures
+
     def get_available_statuses(self):
         """
         获取当前可用的状态转换选项
@@ -308,6 +414,309 @@ class Task(models.Model):
 # endregion
 
 
+# region 任务全文检索(TaskSearchToken)
+SEARCH_STATION_NAMES = {
+    "solidLiquid": "固液配料",
+    "reaction": "反应",
+    "glovebox": "手套箱固液配料与反应",
+    "filtration": "过滤分液",
+    "evaporation": "旋蒸",
+    "column": "过柱",
+    "tlc": "点板",
+    "gcms": "GCMS",
+    "hplc": "HPLC",
+}
+
+_SEARCH_TERM_RE = re.compile(r"[\u4e00-\u9fff]+|[0-9a-z]+")
+
+
+def _ngrams(term, sizes):
+    return [term[i:i + n] for n in sizes for i in range(len(term) - n + 1)]
+
+
+def tokenize_search_text(text, for_query=False):
+    """
+    检索分词：中文按单字与二元组切分，英文/数字按 1~3 字符的 n-gram 切分
+    查询时英文/数字词取三元组（不足3个字符取整词），全部命中即视为包含该片段，
+    从而 "PLC"、"0826" 等任意位置的片段都走索引
+    """
+    tokens = []
+    for term in _SEARCH_TERM_RE.findall((text or "").lower()):
+        if "\u4e00" <= term[0] <= "\u9fff":
+            if for_query:
+                tokens.extend(term if len(term) == 1 else _ngrams(term, (2,)))
+            else:
+                tokens.extend(_ngrams(term, (1, 2)))
+        elif for_query:
+            tokens.extend(_ngrams(term, (3,)) if len(term) >= 3 else [term])
+        else:
+            tokens.extend(_ngrams(term, (1, 2, 3)))
+    return tokens
+
+
+class TaskSearchToken(models.Model):
+    """
+    任务检索倒排索引：名称、备注、工站名称与试剂名称切分后的词元
+    权重为词元所在字段权重之和，用于结果排序
+    """
+
+    INDEXED_FIELDS = ("name", "remark", "stations")
+    FIELD_WEIGHTS = {"name": 4, "reagent": 2, "station": 2, "remark": 1}
+    MAX_TOKEN_LENGTH = 32
+
+    task = models.ForeignKey(
+        Task, on_delete=models.CASCADE, related_name="search_tokens", verbose_name="任务"
+    )
+    token = models.CharField(max_length=MAX_TOKEN_LENGTH, verbose_name="词元")
+    weight = models.PositiveSmallIntegerField(default=1, verbose_name="权重")
+
+    class Meta:
+        db_table = "task_search_token"
+        verbose_name = "任务检索词元"
+        verbose_name_plural = "任务检索词元"
+        indexes = [models.Index(fields=["token", "task"])]
+        constraints = [
+            models.UniqueConstraint(fields=["task", "token"], name="uniq_task_search_token"),
+        ]
+
+    @classmethod
+    def extract_terms(cls, task):
+        """按字段返回任务的可检索文本：[(字段, 文本)]"""
+        terms = [("name", task.name), ("remark", task.remark)]
+        stations = task.stations if isinstance(task.stations, dict) else {}
+        for key, data in stations.items():
+            if not isinstance(data, dict) or not data.get("enabled"):
+                continue
+            terms.append(("station", f"{key} {SEARCH_STATION_NAMES.get(key, '')}"))
+            for reagent in data.get("reagents") or []:
+                if isinstance(reagent, dict) and reagent.get("name"):
+                    terms.append(("reagent", str(reagent["name"])))
+        return terms
+
+    @classmethod
+    def build_tokens(cls, task):
+        """计算任务的 {词元: 权重}"""
+        weights = {}
+        for field, text in cls.extract_terms(task):
+            for token in set(tokenize_search_text(text)):
+                weights[token] = weights.get(token, 0) + cls.FIELD_WEIGHTS[field]
+        return weights
+
+    @classmethod
+    def rebuild_for(cls, tasks):
+        """重建一批任务的索引（先删后批量写入）"""
+        tasks = [t for t in tasks if t.pk]
+        if not tasks:
+            return
+        with transaction.atomic():
+            cls.objects.filter(task__in=tasks).delete()
+            cls.objects.bulk_create(
+                [
+                    cls(task_id=task.pk, token=token, weight=min(weight, 32767))
+                    for task in tasks
+                    for token, weight in cls.build_tokens(task).items()
+                ],
+                batch_size=1000,
+            )
+
+    @classmethod
+    def search(cls, qs, text, ranked=True):
+        """
+        在任务查询集上按关键词检索：所有查询词元都需命中；ranked 时按权重和标注 search_rank（游标分页不需要排序权重）
+        无法切出词元时（如纯符号）只按名称模糊匹配
+        """
+        tokens = sorted(set(tokenize_search_text(text, for_query=True)))
+        if not tokens:
+            qs = qs.filter(name__icontains=text)
+            return qs.annotate(search_rank=models.Value(0)) if ranked else qs
+        matched = (
+            cls.objects.filter(token__in=tokens)
+            .values("task")
+            .annotate(hits=models.Count("token"), rank=models.Sum("weight"))
+            .filter(hits=len(tokens))
+        )
+        qs = qs.filter(id__in=matched.values("task"))
+        if not ranked:
+            return qs
+        from django.db.models.functions import Coalesce
+
+        return qs.annotate(
+            search_rank=Coalesce(
+                models.Subquery(matched.filter(task=models.OuterRef("pk")).values("rank")[:1]),
+                models.Value(0),
+            )
+        )
+
+
+# endregion
+
+
+# region 任务状态计数(TaskStatusCounter)
+class TaskStatusCounter(models.Model):
+    """
+    按 (用户, 状态) 维护的任务数量，随任务创建/状态变更/删除在同一事务内增减
+    全局统计为各用户计数按状态求和，仪表板无需扫描 task 表
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="task_status_counters",
+        verbose_name="用户",
+    )
+    status = models.CharField(max_length=20, choices=TaskStatus.choices, verbose_name="状态")
+    count = models.IntegerField(default=0, verbose_name="数量")
+
+    class Meta:
+        db_table = "task_status_counter"
+        verbose_name = "任务状态计数"
+        verbose_name_plural = "任务状态计数"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "status"], name="uniq_user_status_counter"),
+        ]
+
+    @classmethod
+    def adjust(cls, deltas):
+        """按 {(用户ID, 状态): 增量} 原子地调整计数"""
+        from django.db import IntegrityError
+
+        for (user_id, status), delta in deltas.items():
+            if not delta or user_id is None:
+                continue
+            updated = cls.objects.filter(user_id=user_id, status=status).update(
+                count=models.F("count") + delta
+            )
+            if updated:
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(user_id=user_id, status=status, count=delta)
+            except IntegrityError:
+                # 并发创建同一行时退回为更新
+                cls.objects.filter(user_id=user_id, status=status).update(
+                    count=models.F("count") + delta
+                )
+
+    @classmethod
+    def record_saved(cls, tasks, created=False):
+        """根据任务加载时与当前的状态差异调整计数（新建任务计 +1）"""
+        deltas = {}
+        for task in tasks:
+            old_status = None if created else getattr(task, "_counted_status", None)
+            if old_status == task.status or (old_status is None and not created):
+                # 状态未变，或加载时未取 status 字段而无从比较
+                continue
+            if old_status is not None:
+                key = (task.created_by_id, old_status)
+                deltas[key] = deltas.get(key, 0) - 1
+            key = (task.created_by_id, task.status)
+            deltas[key] = deltas.get(key, 0) + 1
+            task._counted_status = task.status
+        cls.adjust(deltas)
+
+    @classmethod
+    def summary(cls, user=None):
+        """返回 {状态: 数量}，不指定用户时为全局合计"""
+        qs = cls.objects.all() if user is None else cls.objects.filter(user=user)
+        counts = {status: 0 for status, _ in TaskStatus.choices}
+        for row in qs.values("status").annotate(total=models.Sum("count")):
+            counts[row["status"]] = row["total"]
+        return counts
+
+    @classmethod
+    def rebuild(cls):
+        """按 task 表重新计算全部计数"""
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                [
+                    cls(user_id=row["created_by"], status=row["status"], count=row["total"])
+                    for row in Task.objects.values("created_by", "status").annotate(
+                        total=models.Count("id")
+                    )
+                ]
+            )
+
+
+# endregion
+
+
+# region 任务工站需求索引(TaskStationRequirement)
+class TaskStationRequirement(models.Model):
+    """
+    任务工站需求索引：由 Task.stations 按备料规则展开的扁平行
+    material_type="station" 表示工站已启用；其余为物料/耗材需求（试剂物料每项一行）
+    """
+
+    STATION = "station"
+
+    task = models.ForeignKey(
+        Task, on_delete=models.CASCADE, related_name="station_requirements", verbose_name="任务"
+    )
+    station_key = models.CharField(max_length=32, verbose_name="工站")
+    material_type = models.CharField(max_length=32, verbose_name="物料类型")
+    reagent_name = models.CharField(max_length=255, blank=True, default="", verbose_name="试剂名称")
+    amount = models.FloatField(default=0, verbose_name="用量")
+    unit = models.CharField(max_length=32, blank=True, default="", verbose_name="单位")
+    count = models.PositiveIntegerField(default=1, verbose_name="数量")
+
+    class Meta:
+        db_table = "task_station_requirement"
+        verbose_name = "任务工站需求"
+        verbose_name_plural = "任务工站需求"
+        indexes = [
+            models.Index(fields=["station_key", "material_type"]),
+            models.Index(fields=["reagent_name"]),
+            models.Index(fields=["material_type", "reagent_name"]),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id}: {self.station_key}/{self.material_type} {self.reagent_name}"
+
+    @classmethod
+    def rebuild_for(cls, tasks):
+        """重建一批任务的工站需求行（先删后批量写入）"""
+        from .material_requirements import expand_station_requirements
+
+        tasks = [t for t in tasks if t.pk]
+        if not tasks:
+            return
+        with transaction.atomic():
+            cls.objects.filter(task__in=tasks).delete()
+            cls.objects.bulk_create(
+                [
+                    cls(task_id=task.pk, **row)
+                    for task in tasks
+                    for row in expand_station_requirements(task.stations)
+                ],
+                batch_size=1000,
+            )
+
+    @classmethod
+    def aggregate(cls, tasks):
+        """
+        在数据库中按 (工站, 物料类型, 试剂, 单位) 汇总一批任务的物料需求，
+        返回与备料计算一致的 (station_materials, totals)；工站与试剂按首次出现的顺序排列，
+        工站行（material_type="station"）保证不需要物料的已启用工站也出现在结果中
+        """
+        from .material_requirements import build_station_materials
+
+        rows = (
+            cls.objects.filter(task__in=tasks)
+            .values("station_key", "material_type", "reagent_name", "unit")
+            .annotate(
+                total_amount=models.Sum("amount"),
+                total_count=models.Sum("count"),
+                first_id=models.Min("id"),
+            )
+            .order_by("first_id")
+        )
+        return build_station_materials(rows)
+
+
+# endregion
+
+
 # region 任务状态变更日志(TaskStatusLog)
 class TaskStatusLog(models.Model):
     """
@@ -350,6 +759,151 @@ class TaskStatusLog(models.Model):
 # endregion
 
 
+# region 任务变更事件(TaskChangeEvent)
+TASK_FEED_ALL_GROUP = "task_feed_all"
+
+
+def task_feed_user_group(user_id):
+    """普通用户只订阅自己任务的变更"""
+    return f"task_feed_user_{user_id}"
+
+
+class TaskEventSequence(models.Model):
+    """
+    任务事件的按提交人串行化锁行：每个提交人一行，写事件前锁定，
+    使同一提交人的事件写入按事务依次进行，而不占用用户表的行锁
+    """
+
+    owner = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="task_event_sequence",
+        verbose_name="任务提交人",
+    )
+
+    class Meta:
+        db_table = "task_event_sequence"
+        verbose_name = "任务事件序列"
+        verbose_name_plural = "任务事件序列"
+
+    @classmethod
+    def lock(cls, owner_ids):
+        """按提交人ID顺序锁定（必要时先创建）锁行，直到当前事务结束（需在事务内调用）"""
+        locked = cls.objects.select_for_update().order_by("owner_id")
+        missing = set(owner_ids) - set(locked.filter(owner_id__in=owner_ids).values_list("owner_id", flat=True))
+        if missing:
+            # 首次写事件的提交人：插入锁行，并发插入同一行时等待对方提交后再锁定
+            cls.objects.bulk_create([cls(owner_id=uid) for uid in sorted(missing)], ignore_conflicts=True)
+            list(locked.filter(owner_id__in=missing).values_list("owner_id", flat=True))
+
+
+class TaskChangeEvent(models.Model):
+    """
+    任务变更事件流：创建/状态流转/修改/删除各记一条，自增ID即事件游标
+    WebSocket 推送与客户端断线续传都按ID顺序读取本表；删除事件即墓碑
+    写入前锁定提交人的 TaskEventSequence 行，同一提交人的事件ID顺序与事务提交顺序一致，按提交人读取游标之后的事件不会遗漏
+    """
+
+    CREATED = "created"
+    UPDATED = "updated"
+    TRANSITION = "transition"
+    DELETED = "deleted"
+    EVENT_TYPES = [
+        (CREATED, "创建"),
+        (UPDATED, "修改"),
+        (TRANSITION, "状态变更"),
+        (DELETED, "删除"),
+    ]
+
+    # 不建外键：任务删除后事件仍需保留
+    task_id = models.BigIntegerField(verbose_name="任务ID")
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="task_change_events",
+        verbose_name="任务提交人",
+    )
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPES, verbose_name="事件类型")
+    from_status = models.CharField(max_length=20, blank=True, default="", verbose_name="原状态")
+    to_status = models.CharField(max_length=20, blank=True, default="", verbose_name="新状态")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="发生时间")
+
+    class Meta:
+        db_table = "task_change_event"
+        verbose_name = "任务变更事件"
+        verbose_name_plural = "任务变更事件"
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["owner", "id"]),
+            models.Index(fields=["task_id", "id"]),
+        ]
+
+    @classmethod
+    def for_saved(cls, task, created, previous_status):
+        """根据一次保存构造事件：新建、状态变化或普通修改"""
+        if created:
+            event_type = cls.CREATED
+        elif previous_status and previous_status != task.status:
+            event_type = cls.TRANSITION
+        else:
+            event_type = cls.UPDATED
+        return cls(
+            task_id=task.pk,
+            owner_id=task.created_by_id,
+            event_type=event_type,
+            from_status="" if created else (previous_status or ""),
+            to_status=task.status,
+        )
+
+    @classmethod
+    def record(cls, events):
+        """写入事件，并在事务提交后通知订阅者拉取"""
+        events = [e for e in events if e.owner_id]
+        if not events:
+            return
+        owner_ids = {e.owner_id for e in events}
+        with transaction.atomic():
+            # 锁定提交人的序列行直到事务结束，再分配事件ID：先分配到ID的事务必然先提交
+            TaskEventSequence.lock(owner_ids)
+            cls.objects.bulk_create(events)
+        transaction.on_commit(lambda: cls.notify(owner_ids))
+
+    @staticmethod
+    def notify(owner_ids):
+        """向全局组与相关用户组发送轻量通知，消费者收到后按游标从本表读取新事件"""
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        groups = [TASK_FEED_ALL_GROUP] + [task_feed_user_group(uid) for uid in owner_ids]
+        for group in groups:
+            async_to_sync(channel_layer.group_send)(group, {"type": "task.changed"})
+
+    @classmethod
+    def visible_to(cls, user):
+        """管理员与备料员可见全部任务事件，普通用户仅见自己的"""
+        if user.is_admin() or user.is_preparator():
+            return cls.objects.all()
+        return cls.objects.filter(owner=user)
+
+    def to_dict(self):
+        return {
+            "event_id": self.id,
+            "event_type": self.event_type,
+            "task_id": self.task_id,
+            "owner_id": self.owner_id,
+            "from_status": self.from_status,
+            "to_status": self.to_status,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+# endregion
+
+
 # region 工站类型与工站模型(StationType, Station)
 
 
@@ -554,11 +1108,46 @@ class ContainerSlot(models.Model):
 # region 物料模型(TestTube15, LaiyuPowder, JingtaiPowder, ReagentBottle150)
 
 
-class TestTube15(models.Model):
+class MaterialNameMixin:
+    """
+    物料实体名称登记：新建或改名时同步 MaterialName 登记表，名称在四类物料间唯一
+    只改状态等其他字段的保存不访问登记表
+    """
+
+    material_kind = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录加载时的名称，保存时据此判断是否改名
+        instance._loaded_name = instance.__dict__.get("name")
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        adding = self._state.adding
+        renamed = adding or getattr(self, "_loaded_name", None) != self.name
+        if not renamed or (update_fields is not None and "name" not in update_fields):
+            return super().save(*args, **kwargs)
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                MaterialName.register(self, adding)
+        except IntegrityError:
+            if adding:
+                self.pk = None
+                self._state.adding = True
+            raise ValidationError(f"物料名称已存在: {self.name}")
+        self._loaded_name = self.name
+
+
+class TestTube15(MaterialNameMixin, models.Model):
     """
     15mL试管
     """
 
+    material_kind = MaterialKind.TEST_TUBE_15
+
     class State(models.TextChoices):
         IDLE = "idle", "空闲"
         IN_USE = "in_use", "使用中"
@@ -590,16 +1179,23 @@ class TestTube15(models.Model):
         db_table = "test_tube_15"
         verbose_name = "15mL试管"
         verbose_name_plural = "15mL试管"
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["state", "created_at"]),
+            models.Index(fields=["current_container", "state"]),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class LaiyuPowder(models.Model):
+class LaiyuPowder(MaterialNameMixin, models.Model):
     """
     铼羽粉筒
     """
 
+    material_kind = MaterialKind.LAIYU_POWDER
+
     class State(models.TextChoices):
         IDLE = "idle", "空闲"
         IN_USE = "in_use", "使用中"
@@ -628,16 +1224,23 @@ class LaiyuPowder(models.Model):
         db_table = "laiyu_powder"
         verbose_name = "铼羽粉筒"
         verbose_name_plural = "铼羽粉筒"
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["state", "created_at"]),
+            models.Index(fields=["current_container", "state"]),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class JingtaiPowder(models.Model):
+class JingtaiPowder(MaterialNameMixin, models.Model):
     """
     晶泰粉筒
     """
 
+    material_kind = MaterialKind.JINGTAI_POWDER
+
     class State(models.TextChoices):
         IDLE = "idle", "空闲"
         IN_USE = "in_use", "使用中"
@@ -666,16 +1269,23 @@ class JingtaiPowder(models.Model):
         db_table = "jingtai_powder"
         verbose_name = "晶泰粉筒"
         verbose_name_plural = "晶泰粉筒"
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["state", "created_at"]),
+            models.Index(fields=["current_container", "state"]),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class ReagentBottle150(models.Model):
+class ReagentBottle150(MaterialNameMixin, models.Model):
     """
     150mL试剂瓶
     """
 
+    material_kind = MaterialKind.REAGENT_BTL_150
+
     class State(models.TextChoices):
         IDLE = "idle", "空闲"
         IN_USE = "in_use", "使用中"
@@ -704,11 +1314,81 @@ class ReagentBottle150(models.Model):
         db_table = "reagent_bottle_150"
         verbose_name = "150mL试剂瓶"
         verbose_name_plural = "150mL试剂瓶"
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["state", "created_at"]),
+            models.Index(fields=["current_container", "state"]),
+        ]
 
     def __str__(self):
         return self.name
 
 
+ENTITY_MATERIAL_MODELS = {
+    MaterialKind.TEST_TUBE_15: TestTube15,
+    MaterialKind.LAIYU_POWDER: LaiyuPowder,
+    MaterialKind.JINGTAI_POWDER: JingtaiPowder,
+    MaterialKind.REAGENT_BTL_150: ReagentBottle150,
+}
+
+
+class MaterialName(models.Model):
+    """
+    物料名称登记表：名称 -> (物料类型, 物料ID)
+    扫码与按名查询只需一次索引查询，名称跨类型唯一；由 MaterialNameMixin 与删除信号维护
+    """
+
+    name = models.CharField(max_length=128, unique=True, verbose_name="唯一名")
+    kind = models.CharField(max_length=32, choices=MaterialKind.choices, verbose_name="物料类型")
+    material_id = models.BigIntegerField(verbose_name="物料ID")
+
+    class Meta:
+        db_table = "material_name_registry"
+        verbose_name = "物料名称登记"
+        verbose_name_plural = "物料名称登记"
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "material_id"], name="uniq_material_name_entity"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} -> {self.kind}#{self.material_id}"
+
+    @classmethod
+    def register(cls, material, adding=False):
+        """登记或更新物料名称；名称被其他物料占用时抛出 IntegrityError"""
+        if adding or not cls.objects.filter(kind=material.material_kind, material_id=material.pk).update(
+            name=material.name
+        ):
+            cls.objects.create(name=material.name, kind=material.material_kind, material_id=material.pk)
+
+    @classmethod
+    def unregister(cls, sender, instance, **kwargs):
+        cls.objects.filter(kind=instance.material_kind, material_id=instance.pk).delete()
+
+    @classmethod
+    def resolve(cls, names):
+        """批量解析名称，返回 {名称: (物料类型, 物料ID)}，未登记的名称不在结果中"""
+        return {
+            name: (kind, material_id)
+            for name, kind, material_id in cls.objects.filter(name__in=list(names)).values_list(
+                "name", "kind", "material_id"
+            )
+        }
+
+    @classmethod
+    def lookup(cls, name, kind=None):
+        """按名称查找物料实体，返回 (物料类型, 物料对象)，未找到时返回 (None, None)"""
+        entry = cls.resolve([name]).get(name)
+        if not entry or (kind and entry[0] != kind):
+            return None, None
+        obj = ENTITY_MATERIAL_MODELS[entry[0]].objects.filter(pk=entry[1]).first()
+        return (entry[0], obj) if obj else (None, None)
+
+
+for _model in ENTITY_MATERIAL_MODELS.values():
+    post_delete.connect(MaterialName.unregister, sender=_model, dispatch_uid=f"material_name_{_model.__name__}")
+
+
 # endregion
 
 # region 备料清单与装填操作(PreparationList, FillOperation)
@@ -738,13 +1418,6 @@ class PreparationList(models.Model):
         default=dict,
     )
 
-    # 新增：备料清单物料需求与实际装填的绑定关系
-    material_fill_bindings = models.JSONField(
-        verbose_name="物料装填绑定关系",
-        help_text="记录备料清单中物料需求与实际装填物料的绑定关系，结构：{工站: {物料类型: {索引: 绑定信息}}}",
-        default=dict,
-    )
-
     status = models.CharField(
         max_length=20,
         choices=Status.choices,
@@ -763,6 +1436,24 @@ class PreparationList(models.Model):
     def __str__(self):
         return f"备料清单 {self.id}"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # 清单完成或取消后，未取用完的试剂预留随之释放
+            if self.status in (self.Status.COMPLETED, self.Status.CANCELLED):
+                self.release_reservations()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self.release_reservations()
+            return super().delete(*args, **kwargs)
+
+    def release_reservations(self):
+        """释放关联到本清单的有效试剂预留，返回释放条数"""
+        return self.reservations.filter(status=ReagentReservation.Status.ACTIVE).update(
+            status=ReagentReservation.Status.RELEASED, updated_at=timezone.now()
+        )
+
     def get_station_materials(self, station_key):
         """获取指定工站的物料需求"""
         return self.station_materials.get(station_key, {})
@@ -777,6 +1468,15 @@ class PreparationList(models.Model):
         station_materials = self.get_station_materials(station_key)
         return station_materials.get(material_type, 0)
 
+    def get_fill_bindings(self):
+        """物料装填绑定关系，结构：{工站: {物料类型: {索引: 绑定信息}}}（与前端约定的格式一致）"""
+        bindings = {}
+        for binding in self.fill_bindings.all():
+            bindings.setdefault(binding.station_key, {}).setdefault(binding.material_type, {})[
+                str(binding.material_index)
+            ] = binding.to_dict()
+        return bindings
+
 
 class FillOperation(models.Model):
     """
@@ -813,6 +1513,73 @@ class FillOperation(models.Model):
         return f"装填操作 {self.container.name}#{self.slot_index}"
 
 
+class MaterialFillBinding(models.Model):
+    """
+    备料清单物料需求与实际装填的绑定关系：每个（工站, 物料类型, 需求索引）一行
+    耗材一行需求可能占用多个槽位，slots 记录全部槽位，slot_index 为首个槽位
+    """
+
+    preparation_list = models.ForeignKey(
+        PreparationList,
+        on_delete=models.CASCADE,
+        related_name="fill_bindings",
+        verbose_name="备料清单",
+    )
+    station_key = models.CharField(max_length=32, verbose_name="工站")
+    material_type = models.CharField(max_length=64, verbose_name="需求物料类型")
+    material_index = models.PositiveIntegerField(verbose_name="需求索引")
+    material_name = models.CharField(max_length=128, verbose_name="装填物料名称")
+    material_kind = models.CharField(max_length=64, verbose_name="装填物料类型")
+    container = models.ForeignKey(
+        Container, on_delete=models.SET_NULL, blank=True, null=True, verbose_name="转移仓"
+    )
+    container_name = models.CharField(max_length=128, blank=True, default="", verbose_name="转移仓名称")
+    slot_index = models.PositiveIntegerField(blank=True, null=True, verbose_name="槽位索引")
+    slots = models.JSONField(blank=True, null=True, verbose_name="占用槽位列表")
+    filled_at = models.DateTimeField(default=timezone.now, verbose_name="装填时间")
+    filled_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, blank=True, null=True, verbose_name="装填人"
+    )
+
+    class Meta:
+        db_table = "material_fill_binding"
+        verbose_name = "物料装填绑定"
+        verbose_name_plural = "物料装填绑定"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["preparation_list", "station_key", "material_type", "material_index"],
+                name="uniq_prep_material_binding",
+            )
+        ]
+        indexes = [models.Index(fields=["container", "slot_index"])]
+
+    def __str__(self):
+        return f"{self.preparation_list_id} {self.station_key}/{self.material_type}#{self.material_index}"
+
+    def to_dict(self):
+        data = {
+            "material_name": self.material_name,
+            "material_type": self.material_kind,
+            "container_name": self.container_name,
+            "slot_position": "" if self.slot_index is None else str(self.slot_index),
+            "filled_at": self.filled_at.isoformat(),
+            "filled_by": self.filled_by_id,
+        }
+        if self.slots is not None:
+            data["slots"] = self.slots
+        return data
+
+    @classmethod
+    def key_filter(cls, preparation_list_id, keys):
+        """按 (工站, 物料类型, 索引) 列表构造唯一键查询"""
+        condition = models.Q(pk__in=[])
+        for station_key, material_type, material_index in keys:
+            condition |= models.Q(
+                station_key=station_key, material_type=material_type, material_index=material_index
+            )
+        return cls.objects.filter(condition, preparation_list_id=preparation_list_id)
+
+
 # endregion
 
 # region 备料工位(PreparationStation)
@@ -1111,30 +1878,132 @@ class Reagent(models.Model):
         return timezone.now().date() >= (self.expiry_date - timezone.timedelta(days=days))
 
     def take(self, amount, user, purpose: str = ""):
-        """试剂取用，减少库存，并记录操作日志"""
+        """
+        试剂取用，减少库存，并记录操作日志
+        他人的有效预留不可取用；取用时优先冲减本人在该试剂上的预留（先到先冲）
+        """
         if amount is None:
             raise ValidationError("取用数量不能为空")
+        amount = Decimal(str(amount))
         if amount <= 0:
             raise ValidationError("取用数量必须大于0")
-        if self.quantity < amount:
-            raise ValidationError("取用数量不能大于当前剩余量")
-        before = self.quantity
-        self.quantity = before - amount
-        self.updated_at = timezone.now()
-        self.save()
-        ReagentOperation.objects.create(
-            reagent=self,
-            operation_type=ReagentOperation.Type.TAKE,
-            amount=amount,
-            unit=self.unit,
-            before_quantity=before,
-            after_quantity=self.quantity,
-            remark=purpose or "",
-            operated_by=user,
-        )
+        with transaction.atomic():
+            locked = Reagent.objects.select_for_update().get(pk=self.pk)
+            self.quantity = locked.quantity
+            if self.quantity < amount:
+                raise ValidationError("取用数量不能大于当前剩余量")
+            reserved_by_others = ReagentReservation.active_total(self, exclude_user=user)
+            if self.quantity - reserved_by_others < amount:
+                raise ValidationError(
+                    f"取用数量超过可用量（剩余 {self.quantity}{self.unit}，其中 {reserved_by_others}{self.unit} 已被预留）"
+                )
+            ReagentReservation.consume(self, user, amount)
+            before = self.quantity
+            self.quantity = before - amount
+            self.updated_at = timezone.now()
+            self.save()
+            ReagentOperation.objects.create(
+                reagent=self,
+                operation_type=ReagentOperation.Type.TAKE,
+                amount=amount,
+                unit=self.unit,
+                before_quantity=before,
+                after_quantity=self.quantity,
+                remark=purpose or "",
+                operated_by=user,
+            )
         return self
 
 
+class ReagentReservation(models.Model):
+    """
+    试剂预留：备料计算时为所需试剂预先占用库存，后续取用时冲减
+    amount 为尚未取用的预留量（单位与试剂一致），取用完后状态变为已消耗
+    同一用户对同一批任务只保留一组有效预留；生成备料清单后预留关联到清单，随清单完成、取消或删除而释放，
+    尚未关联清单的预留在 HOLD_DURATION 后过期，过期的预留不再占用库存
+    """
+
+    HOLD_DURATION = timezone.timedelta(hours=24)
+
+    class Status(models.TextChoices):
+        ACTIVE = "active", "预留中"
+        CONSUMED = "consumed", "已消耗"
+        RELEASED = "released", "已释放"
+
+    reagent = models.ForeignKey(
+        Reagent, on_delete=models.CASCADE, related_name="reservations", verbose_name="试剂"
+    )
+    amount = models.DecimalField(max_digits=16, decimal_places=3, verbose_name="预留量")
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.ACTIVE, verbose_name="状态"
+    )
+    task_ids = models.JSONField(default=list, blank=True, verbose_name="关联任务ID列表")
+    preparation_list = models.ForeignKey(
+        PreparationList,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="reservations",
+        verbose_name="备料清单",
+    )
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name="过期时间")
+    created_by = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="reagent_reservations", verbose_name="预留人"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        db_table = "reagent_reservation"
+        verbose_name = "试剂预留"
+        verbose_name_plural = "试剂预留"
+        ordering = ["created_at", "id"]
+        indexes = [
+            models.Index(fields=["reagent", "status"]),
+            models.Index(fields=["created_by", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.reagent.name} 预留 {self.amount}{self.reagent.unit}"
+
+    @classmethod
+    def live_filter(cls, prefix=""):
+        """有效预留（预留中且未过期）的过滤条件，prefix 用于跨关联过滤，如 reservations__"""
+        return models.Q(**{f"{prefix}status": cls.Status.ACTIVE}) & (
+            models.Q(**{f"{prefix}expires_at__isnull": True})
+            | models.Q(**{f"{prefix}expires_at__gt": timezone.now()})
+        )
+
+    @classmethod
+    def active_total(cls, reagent, exclude_user=None):
+        """试剂当前的有效预留总量，可排除某个用户的预留"""
+        qs = cls.objects.filter(cls.live_filter(), reagent=reagent)
+        if exclude_user is not None:
+            qs = qs.exclude(created_by=exclude_user)
+        return qs.aggregate(total=models.Sum("amount"))["total"] or Decimal("0")
+
+    @classmethod
+    def consume(cls, reagent, user, amount):
+        """按创建先后冲减用户在该试剂上的有效预留，返回冲减总量（需在事务内调用）"""
+        remaining = amount
+        changed = []
+        for reservation in cls.objects.select_for_update().filter(
+            cls.live_filter(), reagent=reagent, created_by=user
+        ):
+            if remaining <= 0:
+                break
+            used = min(reservation.amount, remaining)
+            reservation.amount -= used
+            remaining -= used
+            if reservation.amount <= 0:
+                reservation.status = cls.Status.CONSUMED
+            reservation.updated_at = timezone.now()
+            changed.append(reservation)
+        if changed:
+            cls.objects.bulk_update(changed, ["amount", "status", "updated_at"])
+        return amount - remaining
+
+
 class SpectrumType(models.TextChoices):
     """图谱类型"""
 
@@ -1227,6 +2096,28 @@ class ReagentOperation(models.Model):
 
 
 # region 机器学习相关模型(ML)
+class DataBlob(models.Model):
+    """
+    按内容哈希存储的数据文件实体，多个 DataFile 可共享同一份物理文件
+    """
+
+    sha256 = models.CharField(max_length=64, unique=True, verbose_name="内容SHA256")
+    file_path = models.CharField(max_length=500, verbose_name="文件路径")
+    file_size = models.BigIntegerField(verbose_name="文件大小(字节)")
+    ref_count = models.PositiveIntegerField(default=0, verbose_name="引用计数")
+    # 按内容缓存的数据画像（行列数、列统计、预览、行索引、CSV格式等），重复上传时直接复用
+    profile = models.JSONField(null=True, blank=True, verbose_name="数据画像缓存")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        db_table = "data_blob"
+        verbose_name = "数据文件实体"
+        verbose_name_plural = "数据文件实体"
+
+    def __str__(self):
+        return f"{self.sha256[:12]} (引用{self.ref_count})"
+
+
 class DataFile(models.Model):
     """
     数据文件模型，用于存储用户上传的CSV文件
@@ -1244,6 +2135,9 @@ class DataFile(models.Model):
     original_filename = models.CharField(max_length=255, verbose_name="原始文件名")
     file_path = models.CharField(max_length=500, verbose_name="文件路径")
     file_size = models.BigIntegerField(verbose_name="文件大小(字节)")
+    blob = models.ForeignKey(
+        DataBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='data_files', verbose_name="内容实体"
+    )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading', verbose_name="状态")
     
     # 数据统计信息
@@ -1255,10 +2149,16 @@ class DataFile(models.Model):
     # 数据质量分析
     missing_values = models.JSONField(null=True, blank=True, verbose_name="缺失值统计")
     outlier_info = models.JSONField(null=True, blank=True, verbose_name="异常值统计")
+    # 多检测器异常检测结果缓存（按文件版本与参数），含逐行掩码
+    outlier_cache = models.JSONField(null=True, blank=True, verbose_name="异常检测缓存")
     
     # 数据预览和分析结果
     data_preview = models.JSONField(null=True, blank=True, verbose_name="数据预览")
     quality_analysis = models.JSONField(null=True, blank=True, verbose_name="质量分析结果")
+    # 行偏移索引：每隔 stride 行记录一次字节偏移，用于分页预览时直接 seek
+    row_index = models.JSONField(null=True, blank=True, verbose_name="行偏移索引")
+    # CSV格式探测结果（编码/分隔符/表头/列类型），后续所有读取复用
+    csv_format = models.JSONField(null=True, blank=True, verbose_name="CSV格式")
     
     # 处理日志和错误信息
     processing_log = models.TextField(blank=True, verbose_name="处理日志")
@@ -1290,6 +2190,104 @@ class DataFile(models.Model):
         return dict(self.STATUS_CHOICES).get(self.status, self.status)
 
 
+class DataSplit(models.Model):
+    """
+    数据集划分：不复制数据，仅保存每行所属分区的标签数组
+    留出法标签：0=训练集，1=测试集，2=验证集；K折标签为折编号(0..k-1)
+    """
+
+    METHOD_CHOICES = (
+        ('random', '随机划分'),
+        ('stratified', '分层划分'),
+        ('group', '分组划分'),
+        ('time', '时间顺序划分'),
+        ('kfold', 'K折交叉'),
+    )
+
+    PART_TRAIN = 0
+    PART_TEST = 1
+    PART_VALIDATION = 2
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="用户")
+    data_file = models.ForeignKey(DataFile, on_delete=models.CASCADE, related_name='splits', verbose_name="数据文件")
+    name = models.CharField(max_length=200, verbose_name="划分名称")
+    method = models.CharField(max_length=20, choices=METHOD_CHOICES, default='random', verbose_name="划分方式")
+    parameters = models.JSONField(default=dict, verbose_name="划分参数")
+    n_folds = models.IntegerField(default=0, verbose_name="折数(K折)")
+    # 源文件版本：数据文件被处理覆盖后划分失效
+    source_rows = models.IntegerField(verbose_name="源数据行数")
+    source_file_size = models.BigIntegerField(verbose_name="源文件大小(字节)")
+    source_file_path = models.CharField(max_length=500, blank=True, default='', verbose_name="源文件路径")
+    source_file_mtime_ns = models.BigIntegerField(null=True, blank=True, verbose_name="源文件修改时间(ns)")
+    # zlib 压缩后的 int8 标签数组，每行 1 字节
+    assignments = models.BinaryField(verbose_name="行分区标签")
+    summary = models.JSONField(default=dict, verbose_name="各分区行数")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+
+    class Meta:
+        db_table = "data_split"
+        verbose_name = "数据集划分"
+        verbose_name_plural = "数据集划分"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.name} ({self.data_file.original_filename})"
+
+    def set_labels(self, labels):
+        """保存分区标签数组"""
+        import zlib
+        import numpy as np
+        labels = np.asarray(labels, dtype=np.int8)
+        self.assignments = zlib.compress(labels.tobytes())
+        values, counts = np.unique(labels, return_counts=True)
+        self.summary = {str(int(v)): int(c) for v, c in zip(values, counts)}
+
+    def get_labels(self):
+        """读取分区标签数组"""
+        import zlib
+        import numpy as np
+        return np.frombuffer(zlib.decompress(bytes(self.assignments)), dtype=np.int8)
+
+    def set_source_version(self):
+        """记录源数据文件当前的路径、大小与修改时间"""
+        import os
+        stat = os.stat(self.data_file.file_path)
+        self.source_file_path = self.data_file.file_path
+        self.source_file_size = stat.st_size
+        self.source_file_mtime_ns = stat.st_mtime_ns
+
+    def is_stale(self):
+        """
+        源数据文件是否已变更：路径、大小或修改时间任一不同即视为失效
+        （同大小的覆盖写入也能识别）；旧记录未保存路径与修改时间时只比较大小
+        """
+        import os
+        try:
+            stat = os.stat(self.data_file.file_path)
+        except OSError:
+            return True
+        if stat.st_size != self.source_file_size:
+            return True
+        if self.source_file_mtime_ns is None:
+            return False
+        return (self.source_file_path != self.data_file.file_path
+                or stat.st_mtime_ns != self.source_file_mtime_ns)
+
+    def get_train_test_indices(self, fold=None):
+        """
+        返回 (训练集行号, 测试集行号)
+        K折划分时 fold 为作为测试集的折编号，其余折为训练集
+        """
+        import numpy as np
+        labels = self.get_labels()
+        if self.method == 'kfold':
+            if fold is None or not (0 <= int(fold) < self.n_folds):
+                raise ValidationError(f"折编号必须在 0 到 {self.n_folds - 1} 之间")
+            test_mask = labels == int(fold)
+            return np.flatnonzero(~test_mask), np.flatnonzero(test_mask)
+        return np.flatnonzero(labels == self.PART_TRAIN), np.flatnonzero(labels == self.PART_TEST)
+
+
 class MLAlgorithm(models.Model):
     """
     机器学习算法模型
@@ -1346,7 +2344,9 @@ class MLTask(models.Model):
     data_file = models.ForeignKey(DataFile, on_delete=models.CASCADE, related_name='ml_tasks', verbose_name="数据文件")
     train_data_file = models.ForeignKey(DataFile, on_delete=models.CASCADE, null=True, blank=True, related_name='train_tasks', verbose_name="训练数据文件")
     test_data_file = models.ForeignKey(DataFile, on_delete=models.CASCADE, null=True, blank=True, related_name='test_tasks', verbose_name="测试数据文件")
-    
+    data_split = models.ForeignKey(DataSplit, on_delete=models.SET_NULL, null=True, blank=True, related_name='ml_tasks', verbose_name="数据集划分")
+    split_fold = models.IntegerField(null=True, blank=True, verbose_name="测试折编号(K折)")
+
     # 算法配置
     algorithm = models.ForeignKey(MLAlgorithm, on_delete=models.CASCADE, verbose_name="算法")
     algorithm_parameters = models.JSONField(verbose_name="算法参数")
@@ -1647,3 +2647,62 @@ class GCMSTask(StationTaskBase):
         db_table = 'gcms_task'
         verbose_name = 'GCMS任务'
         verbose_name_plural = 'GCMS任务'
+
+
+# region 审计日志归档(AuditArchiveSegment)
+class AuditArchiveSegment(models.Model):
+    """
+    审计日志归档段：冷数据按 (来源表, 归属对象, 月份) 打包为压缩JSON
+    热表只保留近期数据，历史查询由 audit_archive.load_history 合并热表与归档
+    """
+
+    SOURCE_CHOICES = [
+        ("task_status_log", "任务状态日志"),
+        ("reagent_operation", "试剂操作日志"),
+        ("fill_operation", "装填操作"),
+        ("data_processing_log", "数据处理日志"),
+    ]
+
+    source = models.CharField(max_length=32, choices=SOURCE_CHOICES, verbose_name="来源表")
+    # 归属对象主键：任务/试剂/数据文件为整数ID，备料清单为字符串ID，统一按字符串保存
+    owner_key = models.CharField(max_length=64, verbose_name="归属对象ID")
+    period = models.CharField(max_length=7, verbose_name="月份")
+    row_count = models.PositiveIntegerField(verbose_name="行数")
+    first_at = models.DateTimeField(verbose_name="最早时间")
+    last_at = models.DateTimeField(verbose_name="最晚时间")
+    payload = models.BinaryField(verbose_name="压缩数据")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="归档时间")
+
+    class Meta:
+        db_table = "audit_archive_segment"
+        verbose_name = "审计日志归档"
+        verbose_name_plural = "审计日志归档"
+        indexes = [
+            models.Index(fields=["source", "owner_key", "period"]),
+            models.Index(fields=["source", "period"]),
+        ]
+
+    def __str__(self):
+        return f"{self.source}#{self.owner_key} {self.period} ({self.row_count})"
+
+    @classmethod
+    def delete_for_owner(cls, sender, instance, **kwargs):
+        """归属对象删除时热表日志随外键级联删除，归档段一并清理"""
+        cls.objects.filter(source=AUDIT_ARCHIVE_OWNERS[sender], owner_key=str(instance.pk)).delete()
+
+
+# 归属对象模型 -> 其日志的归档来源表
+AUDIT_ARCHIVE_OWNERS = {
+    Task: "task_status_log",
+    Reagent: "reagent_operation",
+    PreparationList: "fill_operation",
+    DataFile: "data_processing_log",
+}
+
+for _model in AUDIT_ARCHIVE_OWNERS:
+    post_delete.connect(
+        AuditArchiveSegment.delete_for_owner, sender=_model, dispatch_uid=f"audit_archive_{_model.__name__}"
+    )
+
+
+# endregion
@@ -0,0 +1,213 @@
+"""
+备料试剂库存校验与预留
+把物料需求中的试剂用量换算为试剂库单位（固体 g、液体 mL），与库存扣除有效预留后的可用量比对；
+同名试剂的多个未过期批次合并计算，按有效期先到先用分摊到各批次，每个批次按自身的单位与密度/分子量换算
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .material_requirements import REAGENT_MATERIAL_TYPES, normalize_unit
+from .models import Reagent, ReagentReservation
+
+# 需求单位 -> 换算到 g / mL / mol 的系数
+MASS_FACTORS = {"g": Decimal("1"), "mg": Decimal("0.001"), "kg": Decimal("1000")}
+VOLUME_FACTORS = {"ml": Decimal("1"), "L": Decimal("1000")}
+MOLE_FACTORS = {"mol": Decimal("1"), "mmol": Decimal("0.001")}
+
+QUANTUM = Decimal("0.001")
+
+
+def convert_amount(amount, unit, reagent):
+    """把需求用量换算为试剂库单位，缺少分子量/密度或单位无法识别时返回 None"""
+    try:
+        amount = Decimal(str(amount))
+    except (InvalidOperation, ValueError):
+        return None
+    unit = normalize_unit(unit)
+    if unit in MOLE_FACTORS:
+        if not reagent.molecular_weight:
+            return None
+        amount, unit = amount * MOLE_FACTORS[unit] * reagent.molecular_weight, "g"
+    if unit in MASS_FACTORS:
+        grams = amount * MASS_FACTORS[unit]
+        if reagent.unit == "g":
+            return grams
+        return grams / reagent.density if reagent.density else None
+    if unit in VOLUME_FACTORS:
+        millilitres = amount * VOLUME_FACTORS[unit]
+        if reagent.unit == "mL":
+            return millilitres
+        return millilitres * reagent.density if reagent.density else None
+    return None
+
+
+def collect_reagent_requirements(station_materials):
+    """汇总各工站试剂类物料的用量（单位已为规范取值），返回 {试剂名: {单位: 用量}}"""
+    requirements = {}
+    for materials in station_materials.values():
+        for material_type in REAGENT_MATERIAL_TYPES:
+            for item in materials.get(material_type) or []:
+                if not item["reagent_name"]:
+                    continue
+                by_unit = requirements.setdefault(item["reagent_name"], {})
+                by_unit[item["unit"]] = by_unit.get(item["unit"], 0) + item["amount"]
+    return requirements
+
+
+def _lots_with_availability(names, lock=False):
+    """
+    同名试剂批次及其扣除有效预留后的可用量（一次聚合查询），按有效期先后排列
+    返回 (未过期批次 {试剂名: [批次]}, 含过期批次的试剂名集合)
+    """
+    if lock:
+        # 先锁定批次行，再做聚合（带 GROUP BY 的查询不能直接 FOR UPDATE）
+        list(Reagent.objects.select_for_update().filter(name__in=names).values_list("id", flat=True))
+    lots = (
+        Reagent.objects.filter(name__in=names)
+        .annotate(
+            reserved=Coalesce(
+                Sum("reservations__amount", filter=ReagentReservation.live_filter("reservations__")),
+                Value(Decimal("0")),
+                output_field=DecimalField(max_digits=16, decimal_places=3),
+            )
+        )
+        .order_by("name", F("expiry_date").asc(nulls_last=True), "id")
+    )
+    today = timezone.now().date()
+    by_name, expired = {}, set()
+    for lot in lots:
+        if lot.expiry_date and lot.expiry_date < today:
+            expired.add(lot.name)
+            continue
+        lot.available = max(lot.quantity - lot.reserved, Decimal("0"))
+        by_name.setdefault(lot.name, []).append(lot)
+    return by_name, expired
+
+
+def _allocate(usable):
+    """
+    按批次顺序分摊需求，usable 为 [(批次, 按该批次单位换算的需求量)]
+    批次间以“未满足比例”传递，单位不同（g 与 mL）的批次也能合并计算
+    返回 (分摊结果 [(批次, 用量)], 未满足比例, 以首个批次单位计的总可用量)
+    """
+    reference_required = usable[0][1]
+    remaining, available, allocations = Decimal("1"), Decimal("0"), []
+    for lot, required in usable:
+        if required <= 0:
+            continue
+        share = lot.available / required
+        available += share * reference_required
+        if remaining > 0:
+            take = min(share, remaining)
+            amount = (take * required).quantize(QUANTUM)
+            if amount > 0:
+                allocations.append((lot, amount))
+            remaining -= take
+    return allocations, remaining, available
+
+
+def check_inventory(station_materials, lock=False):
+    """
+    比对物料需求与试剂库存，返回每种试剂一行：
+    status 为 ok（充足）、short（不足）、missing（试剂库中无此试剂）、expired（批次均已过期）
+    或 unconvertible（单位无法换算）；required / available / shortfall 以首个可用批次的单位计
+    """
+    requirements = collect_reagent_requirements(station_materials)
+    lots_by_name, expired = _lots_with_availability(list(requirements), lock=lock)
+    report = []
+    for name, by_unit in requirements.items():
+        lots = lots_by_name.get(name)
+        row = {"reagent_name": name, "requested": by_unit, "lots": [], "unit": None,
+               "required": None, "available": None, "shortfall": None}
+        if not lots:
+            report.append({**row, "status": "expired" if name in expired else "missing"})
+            continue
+        usable = []
+        for lot in lots:
+            converted = [convert_amount(amount, unit, lot) for unit, amount in by_unit.items()]
+            lot.convertible = all(amount is not None for amount in converted)
+            if lot.convertible:
+                usable.append((lot, sum(converted, Decimal("0"))))
+        row["lots"] = [
+            {"id": lot.id, "cas": lot.cas, "unit": lot.unit, "available": float(lot.available),
+             "convertible": lot.convertible}
+            for lot in lots
+        ]
+        if not usable:
+            report.append({**row, "status": "unconvertible"})
+            continue
+        allocations, remaining, available = _allocate(usable)
+        reference, reference_required = usable[0]
+        required = reference_required.quantize(QUANTUM)
+        shortfall = max(remaining * reference_required, Decimal("0")).quantize(QUANTUM)
+        row.update(
+            unit=reference.unit,
+            required=float(required),
+            available=float(available.quantize(QUANTUM)),
+            shortfall=float(shortfall),
+            _allocations=allocations,
+        )
+        report.append({**row, "status": "short" if shortfall > 0 else "ok"})
+    return report
+
+
+def public_report(report):
+    """去掉内部字段，便于直接返回给前端"""
+    return [{k: v for k, v in row.items() if not k.startswith("_")} for row in report]
+
+
+def reserve_reagents(station_materials, user, task_ids=None):
+    """
+    在事务中锁定相关试剂后重新校验并创建预留；存在不足的试剂时抛出 ValidationError，不创建任何预留
+    同一用户对同一批任务重复预留时先释放上一组有效预留再重新分摊（已关联的备料清单沿用到新预留），
+    重复提交不会叠加占用库存；未关联清单的预留在 ReagentReservation.HOLD_DURATION 后过期
+    无法在试剂库中找到、批次均已过期或无法换算的试剂不做预留
+    返回 (校验结果, 新建的预留列表)
+    """
+    task_ids = sorted(task_ids or [])
+    now = timezone.now()
+    with transaction.atomic():
+        previous = list(
+            ReagentReservation.objects.select_for_update().filter(
+                created_by=user, task_ids=task_ids, status=ReagentReservation.Status.ACTIVE
+            )
+        )
+        preparation_list_id = next((r.preparation_list_id for r in previous if r.preparation_list_id), None)
+        ReagentReservation.objects.filter(id__in=[r.id for r in previous]).update(
+            status=ReagentReservation.Status.RELEASED, updated_at=now
+        )
+        report = check_inventory(station_materials, lock=True)
+        short = [row for row in report if row["status"] == "short"]
+        if short:
+            raise ValidationError(
+                [f"{row['reagent_name']}: 缺少 {row['shortfall']}{row['unit']}" for row in short]
+            )
+        expires_at = None if preparation_list_id else now + ReagentReservation.HOLD_DURATION
+        reservations = [
+            ReagentReservation(
+                reagent=lot,
+                amount=amount,
+                task_ids=task_ids,
+                preparation_list_id=preparation_list_id,
+                expires_at=expires_at,
+                created_by=user,
+            )
+            for row in report
+            if row["status"] == "ok"
+            for lot, amount in row["_allocations"]
+        ]
+        ReagentReservation.objects.bulk_create(reservations)
+    return report, reservations
+
+
+def attach_reservations(preparation_list, user, task_ids):
+    """把用户为同一批任务创建的有效预留关联到备料清单并取消过期时间，返回关联条数"""
+    return (
+        ReagentReservation.objects.filter(ReagentReservation.live_filter(), created_by=user, task_ids=sorted(task_ids))
+        .update(preparation_list=preparation_list, expires_at=None, updated_at=timezone.now())
+    )
@@ -13,4 +13,6 @@ websocket_urlpatterns = [
     re_path(r'ws/hplc/$', consumers.HplcConsumer.as_asgi()),
     # AI Chat WebSocket
     re_path(r'ws/ai-chat/$', consumers.AIChatConsumer.as_asgi()),
+    # 任务变更推送（支持 ?last_event_id= 断点续传）
+    re_path(r'ws/tasks/feed/$', consumers.TaskFeedConsumer.as_asgi()),
 ]
@@ -0,0 +1,182 @@
+"""
+扫码批量处理：手持扫码枪一次提交整架条码（物料/转移仓唯一名），一次查询解析全部条码后在事务中批量落实
+place   将物料放入转移仓槽位（复用 apply_slot_operations 的校验与写入）
+move    将转移仓移至工站（仍登记在备料工站位置上的转移仓同时从该位置移除）
+consume 标记物料已用完：从槽位取出并清空内容，状态恢复为空闲
+任一条码无法解析或操作不合法时抛出 ValidationError（messages 为全部错误），不写入任何数据
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Container, ContainerSlot, ENTITY_MATERIAL_MODELS, MaterialName, PreparationStation, Station
+from .slot_planner import apply_slot_operations
+
+SCAN_ACTIONS = ("place", "move", "consume")
+
+# 用完后需要清空的内容字段
+CONSUME_RESET_FIELDS = {
+    "test_tube_15": {"task": None},
+    "laiyu_powder": {"material_name": "", "mass_mg": 0},
+    "jingtai_powder": {"material_name": "", "mass_mg": 0},
+    "reagent_bottle_150": {"reagent_name": "", "volume_ml": 0},
+}
+
+
+def _unique_codes(codes):
+    """去除空白与重复扫码，保持扫码顺序；返回 (条码列表, 各条码在原列表中的位置, 重复的条码)"""
+    kept, positions, duplicates = [], [], []
+    for position, code in enumerate(codes):
+        code = str(code or "").strip()
+        if not code:
+            continue
+        if code in kept:
+            duplicates.append(code)
+        else:
+            kept.append(code)
+            positions.append(position)
+    return kept, positions, duplicates
+
+
+def _resolve_materials(codes):
+    """一次查询解析物料条码，返回 {条码: (物料类型, 物料ID)}；存在未登记条码时抛出 ValidationError"""
+    resolved = MaterialName.resolve(codes)
+    unknown = [code for code in codes if code not in resolved]
+    if unknown:
+        raise ValidationError([f"{code}: 未找到物料" for code in unknown])
+    return resolved
+
+
+def place_scanned(codes, user, container_id=None, container_code=None, slot_indexes=None, start_slot=0,
+                  preparation_id=None, target_station_key=None):
+    """
+    按扫码顺序把物料放入转移仓：给出 slot_indexes 时逐一对应，否则从 start_slot 起依次占用空闲槽位
+    """
+    resolved = _resolve_materials(codes)
+    container = (
+        Container.objects.select_related("spec")
+        .filter(Q(id=container_id) if container_id else Q(name=container_code))
+        .first()
+    )
+    if container is None:
+        raise ValidationError("转移仓不存在")
+    if slot_indexes is None:
+        occupied = set(
+            ContainerSlot.objects.filter(container=container, occupied=True).values_list("index", flat=True)
+        )
+        free = [i for i in range(start_slot, container.spec.capacity) if i not in occupied]
+        if len(free) < len(codes):
+            raise ValidationError(f"转移仓 \"{container.name}\" 空闲槽位不足：需要 {len(codes)} 个，剩余 {len(free)} 个")
+        slot_indexes = free[: len(codes)]
+    operations = [
+        {"slot_index": index, "material_id": resolved[code][1], "material_kind": resolved[code][0]}
+        for code, index in zip(codes, slot_indexes)
+    ]
+    result = apply_slot_operations(
+        container.id, operations, user, preparation_id=preparation_id, target_station_key=target_station_key
+    )
+    return {**result, "container_id": container.id, "slots": dict(zip(codes, slot_indexes))}
+
+
+def move_scanned(codes, station_id):
+    """
+    将扫码的转移仓批量移至工站
+    放在备料工站位置上的转移仓在同一事务中释放该位置，语义与 PreparationStation.remove_container 一致
+    """
+    try:
+        station = Station.objects.filter(id=int(station_id)).first() if station_id else None
+    except (TypeError, ValueError):
+        station = None
+    if station is None:
+        raise ValidationError("工站不存在")
+    with transaction.atomic():
+        containers = dict(
+            Container.objects.select_for_update().filter(name__in=codes).values_list("name", "id")
+        )
+        unknown = [code for code in codes if code not in containers]
+        if unknown:
+            raise ValidationError([f"{code}: 未找到转移仓" for code in unknown])
+        now = timezone.now()
+        positions = list(
+            PreparationStation.objects.select_for_update().filter(current_container_id__in=containers.values())
+        )
+        released = [p.current_container_id for p in positions]
+        if positions:
+            PreparationStation.objects.filter(id__in=[p.id for p in positions]).update(
+                current_container=None, is_occupied=False, placed_at=None, placed_by=None, updated_at=now
+            )
+            Container.objects.filter(id__in=released).update(state=Container.State.IDLE)
+        moved = Container.objects.filter(id__in=containers.values()).update(current_station=station, updated_at=now)
+    return {"moved": moved, "station_id": station.id, "released_positions": [p.position for p in positions]}
+
+
+def consume_scanned(codes):
+    """标记扫码物料已用完：释放所在槽位并清空内容；转移仓因此变空时清空其目标工站"""
+    now = timezone.now()
+    with transaction.atomic():
+        by_kind = {}
+        for kind, material_id in _resolve_materials(codes).values():
+            by_kind.setdefault(kind, []).append(material_id)
+        containers = set()
+        for kind, ids in by_kind.items():
+            model = ENTITY_MATERIAL_MODELS[kind]
+            containers.update(
+                model.objects.select_for_update().filter(id__in=ids, current_container__isnull=False)
+                .values_list("current_container_id", flat=True)
+            )
+            ContainerSlot.objects.filter(**{f"{kind}_id__in": ids}).update(
+                occupied=False, meta=None, **{f"{kind}_id": None}
+            )
+            model.objects.filter(id__in=ids).update(
+                state=model.State.IDLE, current_container=None, updated_at=now, **CONSUME_RESET_FIELDS[kind]
+            )
+        if containers:
+            Container.objects.filter(id__in=containers).exclude(slots__occupied=True).update(
+                target_station=None, updated_at=now
+            )
+    return {"consumed": sum(len(ids) for ids in by_kind.values())}
+
+
+def apply_scan_batch(action, codes, user, options=None):
+    """
+    处理一批扫码，options 为各动作的参数：
+    place 需 container_id 或 container_code，可选 slot_indexes / start_slot / preparation_id / target_station_key；
+    move 需 station_id；consume 无额外参数
+    返回处理结果，其中 duplicates 为被忽略的重复扫码
+    """
+    options = options or {}
+    if action not in SCAN_ACTIONS:
+        raise ValidationError(f"不支持的扫码动作: {action}")
+    if not isinstance(codes, list):
+        raise ValidationError("codes 必须为列表")
+    raw_count = len(codes)
+    codes, positions, duplicates = _unique_codes(codes)
+    if not codes:
+        raise ValidationError("未提供条码")
+    if action == "place":
+        try:
+            container_id = int(options["container_id"]) if options.get("container_id") else None
+            start_slot = int(options.get("start_slot") or 0)
+            slot_indexes = options.get("slot_indexes")
+            if slot_indexes is not None:
+                if not isinstance(slot_indexes, list) or len(slot_indexes) != raw_count:
+                    raise ValidationError("slot_indexes 数量必须与条码数量一致")
+                slot_indexes = [int(slot_indexes[i]) for i in positions]
+        except (TypeError, ValueError):
+            raise ValidationError("转移仓或槽位编号无效")
+        result = place_scanned(
+            codes,
+            user,
+            container_id=container_id,
+            container_code=(options.get("container_code") or "").strip(),
+            slot_indexes=slot_indexes,
+            start_slot=start_slot,
+            preparation_id=options.get("preparation_id"),
+            target_station_key=options.get("target_station_key"),
+        )
+    elif action == "move":
+        result = move_scanned(codes, options.get("station_id"))
+    else:
+        result = consume_scanned(codes)
+    return {"action": action, "count": len(codes), "duplicates": duplicates, **result}
@@ -0,0 +1,572 @@
+"""
+备料清单装填规划：把 PreparationList.station_materials 中尚未装填的物料需求分配到转移仓槽位
+与手工装填的校验一致，每个转移仓只服务一个目标工站、只装一种物料；
+规划按（工站, 物料类型）分组装箱，使用的转移仓（即需要转运的转移仓）数量最少，
+确认后在一个事务中批量写入槽位、物料状态、装填记录与绑定关系；
+apply_slot_operations 提供同一转移仓多槽位的批量装填/清空
+"""
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .material_requirements import COUNTED_MATERIAL_TYPES
+from .models import (
+    Container,
+    ContainerSlot,
+    FillOperation,
+    JingtaiPowder,
+    LaiyuPowder,
+    MaterialFillBinding,
+    MaterialKind,
+    PreparationList,
+    ReagentBottle150,
+    Station,
+    TestTube15,
+)
+
+# 前端工站标识（驼峰）-> StationType
+STATION_TYPE_BY_KEY = {
+    "solidLiquid": "solid_liquid",
+    "reaction": "reaction",
+    "glovebox": "glovebox",
+    "filtration": "filtration",
+    "evaporation": "evaporation",
+    "column": "column",
+    "tlc": "tlc",
+    "gcms": "gcms",
+    "hplc": "hplc",
+}
+
+# 有独立物料模型的物料类型：(模型, 与需求试剂名匹配的字段；None 表示不限试剂)
+ENTITY_MATERIALS = {
+    "test_tube_15": (TestTube15, None),
+    "laiyu_powder": (LaiyuPowder, "material_name"),
+    "jingtai_powder": (JingtaiPowder, "material_name"),
+    "reagent_bottle_150": (ReagentBottle150, "reagent_name"),
+}
+
+
+def collect_demands(preparation_list):
+    """
+    列出备料清单中尚未绑定的装填需求
+    试管与试剂物料每项占1个槽位（material_index 为列表下标）；耗材整行按数量占槽位（material_index 固定为0）
+    """
+    bound = set(preparation_list.fill_bindings.values_list("station_key", "material_type", "material_index"))
+    demands = []
+    for station_key, materials in (preparation_list.station_materials or {}).items():
+        for material_type in ENTITY_MATERIALS:
+            for index, item in enumerate(materials.get(material_type) or []):
+                if (station_key, material_type, index) in bound:
+                    continue
+                demands.append(
+                    {
+                        "station_key": station_key,
+                        "material_type": material_type,
+                        "material_index": index,
+                        "reagent_name": item.get("reagent_name") or "",
+                        "quantity": 1,
+                    }
+                )
+        for material_type in COUNTED_MATERIAL_TYPES:
+            quantity = int(materials.get(material_type) or 0)
+            if quantity > 0 and (station_key, material_type, 0) not in bound:
+                demands.append(
+                    {
+                        "station_key": station_key,
+                        "material_type": material_type,
+                        "material_index": 0,
+                        "reagent_name": "",
+                        "quantity": quantity,
+                    }
+                )
+    return demands
+
+
+def _pick_materials(demands, shortages):
+    """
+    为需要实物的需求挑选空闲且未入仓的物料，每种物料类型一次查询
+    找不到物料的需求记入 shortages 并从规划中剔除
+    """
+    wanted = {}
+    for demand in demands:
+        if demand["material_type"] in ENTITY_MATERIALS:
+            wanted.setdefault(demand["material_type"], set()).add(demand["reagent_name"])
+
+    available = {}
+    for material_type, names in wanted.items():
+        model, name_field = ENTITY_MATERIALS[material_type]
+        qs = model.objects.filter(state="idle", current_container__isnull=True)
+        if name_field:
+            qs = qs.filter(**{f"{name_field}__in": names})
+        for material in qs.order_by("id"):
+            key = getattr(material, name_field) if name_field else ""
+            available.setdefault((material_type, key), []).append(material)
+
+    planned = []
+    for demand in demands:
+        if demand["material_type"] in ENTITY_MATERIALS:
+            _, name_field = ENTITY_MATERIALS[demand["material_type"]]
+            pool = available.get((demand["material_type"], demand["reagent_name"] if name_field else ""))
+            if not pool:
+                shortages.append({**demand, "reason": "没有空闲的可用物料"})
+                continue
+            material = pool.pop(0)
+            demand = {**demand, "material_id": material.id, "material_name": material.name}
+        planned.append(demand)
+    return planned
+
+
+def _pack(entries, need):
+    """
+    从候选转移仓中选出覆盖 need 个槽位所需的最少转移仓：
+    剩余需求无法一次装下时取空位最多者，能装下时取恰好装下的最小者，减少零散占用
+    """
+    chosen = []
+    pool = sorted(entries, key=lambda e: (-len(e["free"]), e["container"].id))
+    while need > 0 and pool:
+        fitting = [e for e in pool if len(e["free"]) >= need]
+        pick = min(fitting, key=lambda e: (len(e["free"]), e["container"].id)) if fitting else pool[0]
+        pool.remove(pick)
+        chosen.append(pick)
+        need -= len(pick["free"])
+    return chosen
+
+
+def plan_slot_allocation(preparation_list, container_ids=None):
+    """
+    生成装填规划（不写库），返回 {"assignments", "containers", "shortages"}
+    assignments 每项对应一个槽位；container_ids 为空时从全部转移仓中选择
+    已设定目标工站的转移仓只用于该工站，且优先于空闲转移仓使用
+    """
+    shortages = []
+    demands = _pick_materials(collect_demands(preparation_list), shortages)
+
+    kinds = {d["material_type"] for d in demands}
+    containers = Container.objects.select_related("spec", "target_station").filter(
+        spec__allowed_material_kind__in=kinds
+    )
+    if container_ids is not None:
+        containers = containers.filter(id__in=container_ids)
+    containers = list(containers)
+    occupied = set(
+        ContainerSlot.objects.filter(container__in=containers, occupied=True).values_list("container_id", "index")
+    )
+    pools = {}
+    for container in containers:
+        free = [i for i in range(container.spec.capacity) if (container.id, i) not in occupied]
+        if free:
+            pools.setdefault(container.spec.allowed_material_kind, []).append(
+                {
+                    "container": container,
+                    "free": free,
+                    "target": container.target_station.station_type if container.target_station_id else None,
+                }
+            )
+
+    groups = {}
+    for demand in demands:
+        groups.setdefault((demand["station_key"], demand["material_type"]), []).append(demand)
+
+    assignments = []
+    used = {}
+    # 需求量大的分组先装箱，避免大容量转移仓被小分组占用
+    for (station_key, material_type), items in sorted(
+        groups.items(), key=lambda kv: -sum(d["quantity"] for d in kv[1])
+    ):
+        station_type = STATION_TYPE_BY_KEY.get(station_key, station_key)
+        pool = pools.get(material_type, [])
+        need = sum(d["quantity"] for d in items)
+        chosen = _pack([e for e in pool if e["target"] == station_type], need)
+        remaining = need - sum(len(e["free"]) for e in chosen)
+        if remaining > 0:
+            chosen += _pack([e for e in pool if e["target"] is None], remaining)
+        for entry in chosen:
+            entry["target"] = station_type
+
+        slots = [(entry, index) for entry in chosen for index in entry["free"]]
+        label = MaterialKind(material_type).label
+        for demand in items:
+            if len(slots) < demand["quantity"]:
+                shortages.append({**demand, "reason": "转移仓可用槽位不足"})
+                continue
+            taken, slots = slots[: demand["quantity"]], slots[demand["quantity"]:]
+            for n, (entry, index) in enumerate(taken, start=1):
+                entry["free"].remove(index)
+                container = entry["container"]
+                if container.id not in used:
+                    used[container.id] = {
+                        "id": container.id,
+                        "name": container.name,
+                        "station_key": station_key,
+                        "material_type": material_type,
+                        "slots": [],
+                    }
+                used[container.id]["slots"].append(index)
+                if demand["material_type"] in ENTITY_MATERIALS:
+                    material_id = demand["material_id"]
+                    binding_name = material_name = demand["material_name"]
+                else:
+                    # 耗材与手工装填的命名一致：槽位记 "名称 xN (i/N)"，绑定记 "名称 xN"
+                    material_id = None
+                    binding_name = f"{label} x{demand['quantity']}"
+                    material_name = f"{binding_name} ({n}/{demand['quantity']})"
+                assignments.append(
+                    {
+                        "station_key": station_key,
+                        "material_type": material_type,
+                        "material_index": demand["material_index"],
+                        "container_id": container.id,
+                        "container_name": container.name,
+                        "slot_index": index,
+                        "material_id": material_id,
+                        "material_name": material_name,
+                        "binding_name": binding_name,
+                    }
+                )
+
+    return {"assignments": assignments, "containers": list(used.values()), "shortages": shortages}
+
+
+def commit_slot_plan(preparation_list, plan, user):
+    """
+    在一个事务中落实装填规划：锁定转移仓、槽位与物料并复核仍然空闲，
+    批量写入槽位与物料状态、目标工站、装填记录与绑定关系
+    规划生成后槽位、物料、绑定被他人占用或转移仓目标工站与规划不一致时抛出 ValidationError，需重新规划
+    """
+    assignments = plan["assignments"]
+    if not assignments:
+        return preparation_list
+    now = timezone.now()
+
+    with transaction.atomic():
+        container_ids = {a["container_id"] for a in assignments}
+        containers = {
+            c.id: c
+            for c in Container.objects.select_for_update().select_related("target_station").filter(id__in=container_ids)
+        }
+        if len(containers) != len(container_ids):
+            raise ValidationError("转移仓不存在，请重新规划")
+        # 规划生成后转移仓可能已被他人设定了其他目标工站
+        planned_types = {}
+        for a in assignments:
+            planned_types.setdefault(a["container_id"], set()).add(
+                STATION_TYPE_BY_KEY.get(a["station_key"], a["station_key"])
+            )
+        for container_id, types in planned_types.items():
+            container = containers[container_id]
+            if container.target_station_id is not None:
+                types = types | {container.target_station.station_type}
+            if len(types) > 1:
+                raise ValidationError(f"转移仓 \"{container.name}\" 的目标工站已变更，请重新规划")
+        slots = {
+            (s.container_id, s.index): s
+            for s in ContainerSlot.objects.select_for_update().filter(container_id__in=container_ids)
+        }
+        taken = [slots.get((a["container_id"], a["slot_index"])) for a in assignments]
+        if any(slot is not None and slot.occupied for slot in taken):
+            raise ValidationError("槽位已被占用，请重新规划")
+
+        material_ids = {}
+        for a in assignments:
+            if a["material_type"] in ENTITY_MATERIALS:
+                material_ids.setdefault(a["material_type"], {})[a["material_id"]] = a["container_id"]
+        for material_type, ids in material_ids.items():
+            model, _ = ENTITY_MATERIALS[material_type]
+            free = model.objects.select_for_update().filter(
+                id__in=ids, state="idle", current_container__isnull=True
+            ).count()
+            if free != len(ids):
+                raise ValidationError("物料已被占用，请重新规划")
+
+        to_update, to_create = [], []
+        for a in assignments:
+            slot = slots.get((a["container_id"], a["slot_index"]))
+            if slot is None:
+                slot = ContainerSlot(container_id=a["container_id"], index=a["slot_index"])
+                to_create.append(slot)
+            else:
+                to_update.append(slot)
+            slot.occupied = True
+            slot.meta = {
+                "material_id": a["material_id"],
+                "material_kind": a["material_type"],
+                "material_name": a["material_name"],
+                "filled_at": now.isoformat(),
+                "filled_by": user.id,
+            }
+            if a["material_type"] in ENTITY_MATERIALS:
+                setattr(slot, f"{a['material_type']}_id", a["material_id"])
+        ContainerSlot.objects.bulk_update(to_update, ["occupied", "meta", *[f"{k}_id" for k in ENTITY_MATERIALS]])
+        ContainerSlot.objects.bulk_create(to_create)
+
+        for material_type, ids in material_ids.items():
+            model, _ = ENTITY_MATERIALS[material_type]
+            by_container = {}
+            for material_id, container_id in ids.items():
+                by_container.setdefault(container_id, []).append(material_id)
+            for container_id, group in by_container.items():
+                model.objects.filter(id__in=group).update(
+                    state="in_use", current_container_id=container_id, updated_at=now
+                )
+
+        # 尚未设定目标工站的转移仓按规划工站设定
+        station_types = {STATION_TYPE_BY_KEY.get(a["station_key"], a["station_key"]) for a in assignments}
+        stations = {}
+        for station in Station.objects.filter(station_type__in=station_types).order_by("id"):
+            stations.setdefault(station.station_type, station)
+        targets = {}
+        for a in assignments:
+            container = containers[a["container_id"]]
+            if container.target_station_id is None:
+                station = stations.get(STATION_TYPE_BY_KEY.get(a["station_key"], a["station_key"]))
+                if station is None:
+                    raise ValidationError(f"未找到工站类型 {a['station_key']}")
+                targets.setdefault(station.id, set()).add(container.id)
+        for station_id, ids in targets.items():
+            Container.objects.filter(id__in=ids).update(target_station_id=station_id, updated_at=now)
+
+        FillOperation.objects.bulk_create(
+            [
+                FillOperation(
+                    preparation_list=preparation_list,
+                    container_id=a["container_id"],
+                    slot_index=a["slot_index"],
+                    material_id=a["material_id"],
+                    material_kind=a["material_type"],
+                    material_name=a["material_name"],
+                    operated_by=user,
+                )
+                for a in assignments
+            ]
+        )
+
+        bindings = {}
+        for a in assignments:
+            key = (a["station_key"], a["material_type"], a["material_index"])
+            binding = bindings.get(key)
+            if binding is None:
+                binding = bindings[key] = MaterialFillBinding(
+                    preparation_list=preparation_list,
+                    station_key=a["station_key"],
+                    material_type=a["material_type"],
+                    material_index=a["material_index"],
+                    material_name=a["binding_name"],
+                    material_kind=a["material_type"],
+                    container_id=a["container_id"],
+                    container_name=a["container_name"],
+                    slot_index=a["slot_index"],
+                    slots=None if a["material_type"] in ENTITY_MATERIALS else [],
+                    filled_at=now,
+                    filled_by=user,
+                )
+            if binding.slots is not None:
+                binding.slots.append({"container_name": a["container_name"], "slot_index": a["slot_index"]})
+        _create_bindings(bindings.values())
+    return preparation_list
+
+
+def apply_slot_operations(container_id, operations, user, preparation_id=None, target_station_key=None):
+    """
+    在一个事务中对同一转移仓批量装填/清空槽位，语义与单槽位装填接口一致：
+    material_id 为空且不是耗材时清空槽位，否则装填；带 station_key/material_type/material_index 的操作同步维护绑定关系
+    先锁定转移仓、槽位与物料并集中校验，任一操作不合法时抛出 ValidationError（messages 为全部错误），不写入任何数据
+    返回 {"filled": 装填数, "cleared": 清空数}
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        try:
+            container = Container.objects.select_for_update().select_related("spec", "target_station").get(
+                id=container_id
+            )
+        except Container.DoesNotExist:
+            raise ValidationError("转移仓不存在")
+        preparation_list = PreparationList.objects.filter(id=preparation_id).first() if preparation_id else None
+
+        capacity = container.spec.capacity
+        allowed_kind = container.spec.allowed_material_kind
+        slots = {s.index: s for s in ContainerSlot.objects.select_for_update().filter(container=container)}
+        errors, fills, clears, seen = [], [], [], set()
+        for op in operations:
+            try:
+                index = int(op.get("slot_index"))
+            except (TypeError, ValueError):
+                errors.append(f"槽位 {op.get('slot_index')}: 槽位编号无效")
+                continue
+            if index < 0 or index >= capacity:
+                errors.append(f"槽位 {index}: 超出范围，有效范围为 0~{capacity - 1}")
+                continue
+            if index in seen:
+                errors.append(f"槽位 {index}: 同一请求中重复操作")
+                continue
+            seen.add(index)
+            kind = op.get("material_kind")
+            if op.get("material_id") is None and kind not in COUNTED_MATERIAL_TYPES:
+                clears.append((index, op))
+                continue
+            if kind != allowed_kind:
+                errors.append(f"槽位 {index}: 该转移仓只允许装填 {allowed_kind} 类型的物料，不能装填 {kind}")
+            elif kind not in ENTITY_MATERIALS and kind not in COUNTED_MATERIAL_TYPES:
+                errors.append(f"槽位 {index}: 物料类型不支持")
+            elif index in slots and slots[index].occupied:
+                errors.append(f"槽位 {index}: 已被占用")
+            else:
+                fills.append((index, op))
+
+        # 实物物料一次查询加锁校验
+        materials = {}
+        if fills and allowed_kind in ENTITY_MATERIALS:
+            model, _ = ENTITY_MATERIALS[allowed_kind]
+            wanted = [_as_int(op["material_id"]) for _, op in fills]
+            materials = {
+                m.id: m
+                for m in model.objects.select_for_update().select_related("current_container").filter(id__in=wanted)
+            }
+            counted = set()
+            for index, op in fills:
+                material = materials.get(_as_int(op["material_id"]))
+                if material is None:
+                    errors.append(f"槽位 {index}: 物料不存在")
+                elif material.id in counted:
+                    errors.append(f"槽位 {index}: 物料 \"{material.name}\" 在同一请求中重复装填")
+                elif material.state == "in_use" or material.current_container_id:
+                    where = f"已在转移仓 \"{material.current_container.name}\" 中" if material.current_container_id else "已处于使用中状态"
+                    errors.append(f"槽位 {index}: 物料 \"{material.name}\" {where}，不能重复装填")
+                else:
+                    counted.add(material.id)
+
+        # 工站一致性：转移仓已有目标工站时必须一致，否则按本次工站设定
+        target_station = container.target_station
+        if fills and target_station_key:
+            station_type = STATION_TYPE_BY_KEY.get(target_station_key, target_station_key)
+            if target_station is None:
+                target_station = Station.objects.filter(station_type=station_type).order_by("id").first()
+                if target_station is None:
+                    errors.append(f"未找到工站类型 {target_station_key}")
+            elif target_station.station_type != station_type:
+                errors.append(
+                    f"工站不匹配！该转移仓的目标工站是 {target_station.get_station_type_display()}，"
+                    f"不能装填 {target_station_key} 工站的物料"
+                )
+        if errors:
+            raise ValidationError(errors)
+
+        # 清空：释放物料引用并重置槽位
+        released = {}
+        touched = []
+        for index, _ in clears:
+            slot = slots.get(index)
+            if slot is None or not slot.occupied:
+                continue
+            touched.append(slot)
+            for material_type in ENTITY_MATERIALS:
+                material_id = getattr(slot, f"{material_type}_id")
+                if material_id:
+                    released.setdefault(material_type, []).append(material_id)
+                setattr(slot, f"{material_type}_id", None)
+            slot.occupied = False
+            slot.meta = None
+        cleared = len(touched)
+        for material_type, ids in released.items():
+            model, _ = ENTITY_MATERIALS[material_type]
+            model.objects.filter(id__in=ids).update(state="idle", current_container=None, updated_at=now)
+
+        # 装填：写槽位与物料状态
+        to_create = []
+        for index, op in fills:
+            slot = slots.get(index)
+            if slot is None:
+                slot = slots[index] = ContainerSlot(container=container, index=index)
+                to_create.append(slot)
+            else:
+                touched.append(slot)
+            material = materials.get(_as_int(op["material_id"]))
+            op["_material_name"] = material.name if material else op.get("material_name") or f"{allowed_kind}_quantity"
+            slot.occupied = True
+            slot.meta = {
+                "material_id": op.get("material_id"),
+                "material_kind": allowed_kind,
+                "material_name": op["_material_name"],
+                "filled_at": now.isoformat(),
+                "filled_by": user.id,
+            }
+            if material:
+                setattr(slot, f"{allowed_kind}_id", material.id)
+        if materials:
+            model, _ = ENTITY_MATERIALS[allowed_kind]
+            model.objects.filter(id__in=list(materials)).update(
+                state="in_use", current_container=container, updated_at=now
+            )
+        ContainerSlot.objects.bulk_create(to_create)
+        ContainerSlot.objects.bulk_update(touched, ["occupied", "meta", *[f"{k}_id" for k in ENTITY_MATERIALS]])
+
+        if not any(s.occupied for s in slots.values()):
+            # 转移仓已无占用槽位时清空目标工站
+            target_station = None
+        if target_station != container.target_station:
+            container.target_station = target_station
+            container.save(update_fields=["target_station", "updated_at"])
+
+        if preparation_list is not None:
+            FillOperation.objects.bulk_create(
+                [
+                    FillOperation(
+                        preparation_list=preparation_list,
+                        container=container,
+                        slot_index=index,
+                        material_id=op.get("material_id"),
+                        material_kind=allowed_kind,
+                        material_name=op["_material_name"],
+                        operated_by=user,
+                    )
+                    for index, op in fills
+                ]
+            )
+            # 绑定关系按唯一键删除后重建，同一需求以最后一次装填为准
+            keys = [_binding_key(op) for _, op in clears + fills]
+            keys = [key for key in keys if key]
+            if keys:
+                MaterialFillBinding.key_filter(preparation_list.pk, keys).delete()
+            bindings = {}
+            for index, op in fills:
+                key = _binding_key(op)
+                if key:
+                    bindings[key] = MaterialFillBinding(
+                        preparation_list=preparation_list,
+                        station_key=key[0],
+                        material_type=key[1],
+                        material_index=key[2],
+                        material_name=op["_material_name"],
+                        material_kind=allowed_kind,
+                        container=container,
+                        container_name=container.name,
+                        slot_index=index,
+                        filled_at=now,
+                        filled_by=user,
+                    )
+            _create_bindings(bindings.values())
+
+    return {"filled": len(fills), "cleared": cleared}
+
+
+def _create_bindings(bindings):
+    """批量写入绑定关系；并发装填同一需求触发唯一约束时转为 ValidationError"""
+    try:
+        with transaction.atomic():
+            MaterialFillBinding.objects.bulk_create(list(bindings))
+    except IntegrityError:
+        raise ValidationError("物料需求已被其他操作绑定，请刷新后重试")
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _binding_key(op):
+    """操作携带完整绑定参数时返回 (工站, 物料类型, 索引)，否则返回 None"""
+    index = _as_int(op.get("material_index"))
+    if op.get("station_key") and op.get("material_type") and index is not None:
+        return op["station_key"], op["material_type"], index
+    return None
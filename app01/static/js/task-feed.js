@@ -0,0 +1,48 @@
+/**
+ * 任务变更推送订阅
+ * 通过 /ws/tasks/feed/ 接收任务创建、状态变更、删除事件，断线后按最后事件ID续传
+ */
+
+function subscribeTaskFeed(onChange) {
+    let lastEventId = null;
+    let refreshTimer = null;
+    let retryDelay = 1000;
+
+    function scheduleRefresh(event) {
+        // 短时间内的多条事件合并为一次刷新
+        clearTimeout(refreshTimer);
+        refreshTimer = setTimeout(function () { onChange(event); }, 300);
+    }
+
+    function connect() {
+        const protocol = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+        let url = protocol + window.location.host + '/ws/tasks/feed/';
+        if (lastEventId !== null) {
+            url += '?last_event_id=' + lastEventId;
+        }
+        const socket = new WebSocket(url);
+
+        socket.onopen = function () {
+            retryDelay = 1000;
+        };
+
+        socket.onmessage = function (e) {
+            const data = JSON.parse(e.data);
+            if (data.type === 'ready') {
+                lastEventId = data.last_event_id;
+            } else if (data.type === 'task_event') {
+                // 晚提交的较小ID事件会被补发，游标只前进不后退
+                lastEventId = Math.max(lastEventId || 0, data.event_id);
+                scheduleRefresh(data);
+            }
+        };
+
+        socket.onclose = function () {
+            console.warn('任务推送连接已断开，稍后重连');
+            setTimeout(connect, retryDelay);
+            retryDelay = Math.min(retryDelay * 2, 30000);
+        };
+    }
+
+    connect();
+}
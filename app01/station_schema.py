@@ -0,0 +1,218 @@
+"""
+工站参数（Task.stations）的结构校验与规范化
+各工站的校验器在模块加载时一次性组装为闭包，提交时只需逐字段执行；
+数值统一为 float/int，单位与试剂类型统一为任务编辑页使用的取值，未知字段原样保留
+"""
+from django.core.exceptions import ValidationError
+
+# 单位别名 -> 规范取值（与任务编辑页下拉选项一致）
+UNIT_ALIASES = {
+    "g": "g", "克": "g",
+    "mg": "mg", "毫克": "mg",
+    "kg": "kg", "千克": "kg",
+    "ml": "ml", "毫升": "ml",
+    "l": "L", "升": "L",
+    "mol": "mol", "摩尔": "mol",
+    "mmol": "mmol", "毫摩尔": "mmol",
+}
+
+REAGENT_TYPE_ALIASES = {
+    "solid": "solid", "固体": "solid",
+    "liquid": "liquid", "液体": "liquid",
+}
+
+
+def _number(minimum=None, maximum=None, integer=False, required=False):
+    def check(value, path, errors):
+        if value is None or value == "":
+            if required:
+                errors.append(f"{path}: 不能为空")
+            return None
+        if isinstance(value, bool):
+            errors.append(f"{path}: 必须为数字")
+            return value
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            errors.append(f"{path}: 必须为数字")
+            return value
+        if number != number or number in (float("inf"), float("-inf")):
+            errors.append(f"{path}: 必须为有限数字")
+            return value
+        if minimum is not None and number < minimum:
+            errors.append(f"{path}: 不能小于 {minimum}")
+        if maximum is not None and number > maximum:
+            errors.append(f"{path}: 不能大于 {maximum}")
+        if integer:
+            if number != int(number):
+                errors.append(f"{path}: 必须为整数")
+            return int(number)
+        return number
+    return check
+
+
+def _text(max_length=255, required=False):
+    def check(value, path, errors):
+        if value is None:
+            if required:
+                errors.append(f"{path}: 不能为空")
+            return None
+        text = str(value).strip()
+        if required and not text:
+            errors.append(f"{path}: 不能为空")
+        if len(text) > max_length:
+            errors.append(f"{path}: 长度不能超过 {max_length}")
+        return text
+    return check
+
+
+def _choice(aliases, required=False):
+    lookup = {k.lower(): v for k, v in aliases.items()}
+
+    def check(value, path, errors):
+        if value is None or value == "":
+            if required:
+                errors.append(f"{path}: 不能为空")
+            return None
+        canonical = lookup.get(str(value).strip().lower())
+        if canonical is None:
+            errors.append(f"{path}: 不支持的取值 {value}")
+            return value
+        return canonical
+    return check
+
+
+def _bool():
+    def check(value, path, errors):
+        if isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "yes", "on")
+        return bool(value)
+    return check
+
+
+def _list(item_check):
+    def check(value, path, errors):
+        if value is None:
+            return []
+        if not isinstance(value, list):
+            errors.append(f"{path}: 必须为列表")
+            return value
+        return [item_check(item, f"{path}[{i}]", errors) for i, item in enumerate(value)]
+    return check
+
+
+def _object(fields, nullable=True):
+    def check(value, path, errors):
+        if value is None:
+            if not nullable:
+                errors.append(f"{path}: 不能为空")
+            return None
+        if not isinstance(value, dict):
+            errors.append(f"{path}: 必须为对象")
+            return value
+        result = dict(value)
+        for key, field_check in fields.items():
+            if key in value or not nullable:
+                result[key] = field_check(value.get(key), f"{path}.{key}", errors)
+        return result
+    return check
+
+
+REAGENT = _object(
+    {
+        "name": _text(200, required=True),
+        "amount": _number(minimum=0, required=True),
+        "unit": _choice(UNIT_ALIASES, required=True),
+        "type": _choice(REAGENT_TYPE_ALIASES, required=True),
+        "order": _number(integer=True),
+    },
+    nullable=False,
+)
+
+REACTION_PARAMS = _object(
+    {
+        "temperature": _number(),
+        "stirringSpeed": _number(minimum=0),
+        "duration": _number(minimum=0, integer=True),
+        "samplingInterval": _number(minimum=0, integer=True),
+        "samplingVolume": _number(minimum=0),
+        "quenchingAgent": _text(),
+        "quenchingAgentVolume": _number(minimum=0),
+        "samplingAnalysis": _text(),
+    }
+)
+
+REACTION = _object(
+    {
+        "enabled": _bool(),
+        "params": REACTION_PARAMS,
+        "monitoringCount": _number(minimum=0, integer=True),
+    }
+)
+
+STATION_SCHEMAS = {
+    "solidLiquid": _object({"enabled": _bool(), "reagents": _list(REAGENT)}),
+    "glovebox": _object(
+        {"enabled": _bool(), "reagents": _list(REAGENT), "params": REACTION_PARAMS, "reaction": REACTION}
+    ),
+    "reaction": REACTION,
+    "evaporation": _object(
+        {
+            "enabled": _bool(),
+            "params": _object(
+                {
+                    "mode": _choice({"auto": "auto", "manual": "manual"}),
+                    "rotationSpeed": _number(minimum=0),
+                    "bathTemperature": _number(),
+                    "vacuumPressure": _number(minimum=0),
+                    "condenserTemperature": _number(),
+                }
+            ),
+        }
+    ),
+    "filtration": _object({"enabled": _bool()}),
+    "column": _object({"enabled": _bool()}),
+    "tlc": _object(
+        {
+            "enabled": _bool(),
+            "params": _object(
+                {
+                    "temperature": _number(),
+                    "developingTime": _number(minimum=0),
+                    "spotVolume": _number(minimum=0),
+                    "sampleConcentration": _number(minimum=0),
+                    "expectedRfMin": _number(minimum=0, maximum=1),
+                    "expectedRfMax": _number(minimum=0, maximum=1),
+                }
+            ),
+        }
+    ),
+    "gcms": _object({"enabled": _bool(), "params": _object({"sequence": _text()})}),
+    "hplc": _object({"enabled": _bool(), "params": _object({"method": _text()})}),
+}
+
+
+def normalize_stations(stations):
+    """
+    校验并规范化工站参数，返回规范形式；存在错误时抛出 ValidationError（messages 为全部错误）
+    未启用的工站只规范 enabled 字段，其余内容原样保留
+    """
+    if stations is None or stations == {}:
+        return stations or None
+    if not isinstance(stations, dict):
+        raise ValidationError(["stations: 必须为对象"])
+    errors = []
+    result = {}
+    for key, data in stations.items():
+        schema = STATION_SCHEMAS.get(key)
+        if schema is None:
+            errors.append(f"{key}: 未知工站")
+            continue
+        if not isinstance(data, dict):
+            errors.append(f"{key}: 必须为对象")
+            continue
+        enabled = _bool()(data.get("enabled"), key, errors)
+        result[key] = schema(data, key, errors) if enabled else {**data, "enabled": False}
+    if errors:
+        raise ValidationError(errors)
+    return result
@@ -0,0 +1,148 @@
+"""
+统计卡片数据服务
+物料、转移仓、试剂的统计各用一条聚合查询计算，结果按统计组的版本号缓存；
+相关模型保存/删除后（事务提交时）递增版本号使缓存失效，另设较短的过期时间兜底批量 update() 等不触发信号的改动
+版本号与结果存放在各进程共享的缓存（settings.CACHES 为数据库缓存），任一进程的写入对所有进程立即生效
+"""
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import CharField, Count, F, Q, Value
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .models import (
+    Container,
+    ContainerSpec,
+    HazardType,
+    JingtaiPowder,
+    LaiyuPowder,
+    Reagent,
+    ReagentBottle150,
+    ReagentType,
+    TestTube15,
+)
+
+STATS_CACHE_SECONDS = 300
+
+MATERIAL_MODELS = {
+    "test_tube_15": TestTube15,
+    "laiyu_powder": LaiyuPowder,
+    "jingtai_powder": JingtaiPowder,
+    "reagent_bottle_150": ReagentBottle150,
+}
+
+# 统计组 -> 影响该组的模型
+STATS_GROUPS = {
+    "materials": tuple(MATERIAL_MODELS.values()),
+    "containers": (Container, ContainerSpec),
+    "reagents": (Reagent,),
+}
+
+
+def _version_key(group):
+    return f"stats:{group}:version"
+
+
+def invalidate(group):
+    """递增统计组版本号，旧版本的缓存自然失效"""
+    try:
+        cache.incr(_version_key(group))
+    except ValueError:
+        cache.set(_version_key(group), 1, None)
+
+
+def _cached(group, params, compute):
+    version = cache.get_or_set(_version_key(group), 1, None)
+    digest = hashlib.md5(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+    return cache.get_or_set(f"stats:{group}:{version}:{digest}", compute, STATS_CACHE_SECONDS)
+
+
+def _compute_material_stats():
+    parts = [
+        model.objects.order_by()
+        .annotate(kind=Value(code, output_field=CharField()))
+        .values("kind")
+        .annotate(cnt=Count("id"))
+        for code, model in MATERIAL_MODELS.items()
+    ]
+    by_kind = {code: 0 for code in MATERIAL_MODELS}
+    for row in parts[0].union(*parts[1:], all=True):
+        by_kind[row["kind"]] = row["cnt"]
+    return {"total": sum(by_kind.values()), "by_kind": by_kind}
+
+
+def material_stats():
+    """各类物料数量：{"total": n, "by_kind": {物料类型: n}}"""
+    return _cached("materials", {}, _compute_material_stats)
+
+
+def _compute_container_stats():
+    by_code = dict(
+        Container.objects.order_by().values_list("spec__code").annotate(cnt=Count("id"))
+    )
+    return {"total": sum(by_code.values()), "by_code": by_code}
+
+
+def container_stats():
+    """各类型转移仓数量：{"total": n, "by_code": {类型编码: n}}"""
+    return _cached("containers", {}, _compute_container_stats)
+
+
+REAGENT_FILTER_KEYS = ("name", "cas", "formula", "q", "type", "hazard")
+
+
+def _filtered_reagents(filters):
+    qs = Reagent.objects.all()
+    if filters.get("name"):
+        qs = qs.filter(name__icontains=filters["name"])
+    if filters.get("cas"):
+        qs = qs.filter(cas__icontains=filters["cas"])
+    if filters.get("formula"):
+        qs = qs.filter(formula__icontains=filters["formula"])
+    if filters.get("q"):
+        kw = filters["q"]
+        qs = qs.filter(Q(name__icontains=kw) | Q(cas__icontains=kw) | Q(formula__icontains=kw))
+    if filters.get("type") in (ReagentType.SOLID, ReagentType.LIQUID):
+        qs = qs.filter(reagent_type=filters["type"])
+    if filters.get("hazard") in dict(HazardType.choices):
+        qs = qs.filter(hazard_type=filters["hazard"])
+    return qs
+
+
+def reagent_stats(filters):
+    """
+    试剂统计卡片：总数、液体、固体、危险品、缺料、过期
+    filters 为列表页的筛选条件（name/cas/formula/q/type/hazard），过期按当天日期判断，日期也计入缓存键
+    """
+    filters = {key: (filters.get(key) or "").strip() for key in REAGENT_FILTER_KEYS}
+    today = timezone.now().date()
+
+    def compute():
+        return _filtered_reagents(filters).aggregate(
+            total=Count("id"),
+            liquid=Count("id", filter=Q(reagent_type=ReagentType.LIQUID)),
+            solid=Count("id", filter=Q(reagent_type=ReagentType.SOLID)),
+            hazardous=Count("id", filter=~Q(hazard_type=HazardType.GENERAL)),
+            lowStock=Count("id", filter=Q(quantity__lte=F("warning_threshold"))),
+            expiring=Count("id", filter=Q(expiry_date__lt=today)),
+        )
+
+    return _cached("reagents", {**filters, "today": today.isoformat()}, compute)
+
+
+def _connect_invalidation(group, model):
+    def handler(sender, **kwargs):
+        transaction.on_commit(lambda: invalidate(group))
+
+    post_save.connect(handler, sender=model, weak=False, dispatch_uid=f"stats_{group}_{model.__name__}_save")
+    post_delete.connect(handler, sender=model, weak=False, dispatch_uid=f"stats_{group}_{model.__name__}_delete")
+
+
+def connect_signals():
+    """注册统计缓存失效信号，由 App01Config.ready() 调用"""
+    for group, models in STATS_GROUPS.items():
+        for model in models:
+            _connect_invalidation(group, model)
@@ -1,8 +1,17 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
+from django.db.models import Count
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django.core.exceptions import ValidationError
 import json
+import os
+import shutil
+import tempfile
+
+from .models import DataBlob, DataFile, DataSplit, Task, TaskChangeEvent, TaskStatus, TaskStatusCounter, TaskStatusLog
+from .models import TaskStationRequirement
+from .station_schema import normalize_stations
 
 User = get_user_model()
 
@@ -303,3 +312,1057 @@ class RegistrationTest(TestCase):
         user = User.objects.get(username='admin')
         self.assertEqual(user.role, 'admin')
         self.assertTrue(user.is_superuser)
+
+
+class MLDataFileTest(TestCase):
+    """数据文件API测试"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.media_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_dir)
+        self.settings_override.enable()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='user1',
+            email='user1@test.com',
+            password='User123',
+            role='user'
+        )
+        self.client.login(username='user1', password='User123')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_dir, ignore_errors=True)
+
+    def upload_csv(self, content, name='data.csv', encoding='utf-8'):
+        response = self.client.post('/api/ml/data-files/upload/', {
+            'file': SimpleUploadedFile(name, content.encode(encoding), content_type='text/csv')
+        })
+        data = json.loads(response.content)
+        self.assertTrue(data['success'], data)
+        return data['file_id']
+
+    def test_preview_window_and_sort(self):
+        """测试任意窗口读取与服务端排序/筛选"""
+        lines = ['id,name,score'] + [f'{i},n{i},{i % 10}' for i in range(2500)]
+        file_id = self.upload_csv('\n'.join(lines) + '\n')
+
+        response = self.client.get(f'/api/ml/data-files/{file_id}/preview/', {'offset': 2100, 'limit': 3})
+        preview = json.loads(response.content)['preview']
+        self.assertEqual(preview['total_rows'], 2500)
+        self.assertEqual([row[0] for row in preview['data']], [2100, 2101, 2102])
+
+        response = self.client.get(f'/api/ml/data-files/{file_id}/preview/', {
+            'page': 1, 'page_size': 2, 'sort_by': 'id', 'sort_order': 'desc',
+            'filter_column': 'score', 'filter_op': 'eq', 'filter_value': '9',
+        })
+        preview = json.loads(response.content)['preview']
+        self.assertEqual(preview['total_rows'], 250)
+        self.assertEqual([row[0] for row in preview['data']], [2499, 2489])
+
+        # 不带分页参数时保持原有的前5行预览
+        response = self.client.get(f'/api/ml/data-files/{file_id}/preview/')
+        self.assertEqual(len(json.loads(response.content)['preview']['data']), 5)
+
+    def test_index_split_without_copies(self):
+        """测试行索引划分不生成新的数据文件"""
+        lines = ['x,label'] + [f'{i},{i % 2}' for i in range(100)]
+        file_id = self.upload_csv('\n'.join(lines) + '\n')
+
+        response = self.client.post('/api/ml/data-processing/split/', data=json.dumps({
+            'file_id': file_id, 'method': 'stratified', 'stratify_column': 'label', 'test_ratio': 0.2,
+        }), content_type='application/json')
+        data = json.loads(response.content)
+        self.assertTrue(data['success'], data)
+        self.assertEqual(data['split']['parts']['test_rows'], 20)
+        self.assertEqual(DataFile.objects.filter(user=self.user).count(), 1)
+
+        response = self.client.post('/api/ml/data-processing/split/', data=json.dumps({
+            'file_id': file_id, 'method': 'kfold', 'n_splits': 4,
+        }), content_type='application/json')
+        split = DataSplit.objects.get(id=json.loads(response.content)['split']['id'])
+        train_idx, test_idx = split.get_train_test_indices(fold=1)
+        self.assertEqual((len(train_idx), len(test_idx)), (75, 25))
+        self.assertFalse(set(train_idx) & set(test_idx))
+        self.assertFalse(split.is_stale())
+
+        # 同大小的覆盖写入（修改时间变化）也使划分失效
+        path = split.data_file.file_path
+        stat = os.stat(path)
+        with open(path, 'r+b') as f:
+            f.write(b'y')
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(os.path.getsize(path), split.source_file_size)
+        self.assertTrue(split.is_stale())
+
+    def test_detected_csv_format_is_cached(self):
+        """测试GBK编码、分号分隔文件的格式探测与复用"""
+        file_id = self.upload_csv('温度;产率\n25;0.5\n30;0.7\n', encoding='gbk')
+        data_file = DataFile.objects.get(id=file_id)
+        self.assertEqual(data_file.status, 'ready')
+        self.assertEqual(data_file.column_names, ['温度', '产率'])
+        self.assertEqual(data_file.csv_format['encoding'], 'gbk')
+        self.assertEqual(data_file.csv_format['delimiter'], ';')
+
+        response = self.client.get(f'/api/ml/data-files/{file_id}/preview/', {'offset': 1, 'limit': 1})
+        self.assertEqual(json.loads(response.content)['preview']['data'], [[30, 0.7]])
+
+    def test_csv_format_header_and_late_encoding(self):
+        """测试表头探测需类型冲突，以及头部为ASCII、后部含GBK字符时的编码修正"""
+        from .views import detect_csv_format
+        # 数值表头与整数数据类型冲突（浮点 vs 整数）时仍视为表头；纯文本列无法判断时保留表头
+        self.assertTrue(detect_csv_format(b'1.5,2.5\n1,2\n3,4\n', complete=True)['has_header'])
+        self.assertTrue(detect_csv_format(b'a,b\nc,d\n', complete=True)['has_header'])
+        self.assertTrue(detect_csv_format(b'1,2\n', complete=True)['has_header'])
+        headless = detect_csv_format(b'1,x\n2,y\n3,z\n', complete=True)
+        self.assertFalse(headless['has_header'])
+        self.assertEqual(headless['columns'], ['column_1', 'column_2'])
+
+        lines = ['id,name'] + [f'{i},n{i}' for i in range(8000)] + ['8000,温度']
+        file_id = self.upload_csv('\n'.join(lines) + '\n', encoding='gbk')
+        data_file = DataFile.objects.get(id=file_id)
+        self.assertEqual(data_file.status, 'ready')
+        self.assertEqual(data_file.csv_format['encoding'], 'gbk')
+        response = self.client.get(f'/api/ml/data-files/{file_id}/preview/', {'offset': 8000, 'limit': 1})
+        self.assertEqual(json.loads(response.content)['preview']['data'], [[8000, '温度']])
+
+    def test_csv_column_types_from_head(self):
+        """测试按头部采样推断列类型并缓存，分页读取沿用统一类型；后部内容推翻采样类型时以全文类型回填"""
+        lines = ['code,value'] + [f'A{i},{i}' for i in range(10)] + ['007,10']
+        file_id = self.upload_csv('\n'.join(lines) + '\n')
+        data_file = DataFile.objects.get(id=file_id)
+        self.assertEqual(data_file.csv_format['column_types'], {'code': 'text', 'value': 'integer'})
+        response = self.client.get(f'/api/ml/data-files/{file_id}/preview/', {'offset': 10, 'limit': 1})
+        self.assertEqual(json.loads(response.content)['preview']['data'], [['007', 10]])
+
+        lines = ['id,value'] + [f'{i},{i}' for i in range(8000)] + ['8000,0.5']
+        file_id = self.upload_csv('\n'.join(lines) + '\n')
+        data_file = DataFile.objects.get(id=file_id)
+        self.assertEqual(data_file.status, 'ready')
+        self.assertEqual(data_file.csv_format['column_types'], {'id': 'integer', 'value': 'float'})
+        self.assertEqual(data_file.data_types['value'], 'float64')
+
+    def test_identical_uploads_share_storage(self):
+        """测试相同内容重复上传只保存一份并复用画像"""
+        content = 'a,b\n1,2\n3,4\n'
+        first_id = self.upload_csv(content, name='first.csv')
+        second_id = self.upload_csv(content, name='second.csv')
+
+        first, second = DataFile.objects.get(id=first_id), DataFile.objects.get(id=second_id)
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(first.file_path, second.file_path)
+        self.assertIn('复用缓存画像', second.processing_log)
+        self.assertEqual(DataBlob.objects.get().ref_count, 2)
+
+        self.client.delete(f'/api/ml/data-files/{first_id}/delete/')
+        self.assertTrue(os.path.exists(second.file_path))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/ml/data-files/{second_id}/delete/')
+        self.assertFalse(DataBlob.objects.exists())
+        self.assertFalse(os.path.exists(second.file_path))
+
+    def test_outlier_detectors_and_cached_mask(self):
+        """测试多检测器异常检测、缓存与整行删除"""
+        rows = '\n'.join(f'{i % 5},{10 + i % 3}' for i in range(40))
+        file_id = self.upload_csv('x,y\n' + rows + '\n1000,11\n2,500\n')
+        self.assertEqual(DataFile.objects.get(id=file_id).outlier_info, {'x': 1, 'y': 1})
+
+        response = self.client.get(
+            f'/api/ml/data-files/{file_id}/outliers/', {'detectors': 'iqr,zscore,mad', 'include_rows': '1'}
+        ).json()
+        self.assertTrue(response['success'])
+        self.assertEqual(response['outlier_row_positions'], [40, 41])
+        self.assertEqual(response['detectors']['mad']['column_counts'], {'x': 1, 'y': 1})
+        self.assertEqual(len(DataFile.objects.get(id=file_id).outlier_cache['reports']), 1)
+
+        # 处理前的检测命中检测接口写入的缓存，只有处理后的结果需要重新检测
+        from unittest import mock
+        from . import views
+        with mock.patch.object(views, 'detect_outliers', wraps=views.detect_outliers) as detect:
+            response = self.client.post(
+                '/api/ml/data-processing/outliers/',
+                data=json.dumps({'file_id': file_id, 'outlier_strategy': 'remove', 'detectors': ['iqr', 'zscore', 'mad']}),
+                content_type='application/json'
+            ).json()
+        self.assertTrue(response['success'])
+        self.assertEqual(response['outliers_before'], {'x': 1, 'y': 1})
+        self.assertEqual(detect.call_count, 1)
+        data_file = DataFile.objects.get(id=file_id)
+        self.assertEqual(data_file.total_rows, 40)
+
+        # 处理后的结果已按新文件版本缓存
+        with mock.patch.object(views, 'detect_outliers') as detect:
+            response = self.client.get(f'/api/ml/data-files/{file_id}/outliers/', {'detectors': 'iqr,zscore,mad'}).json()
+        self.assertFalse(detect.called)
+        self.assertEqual(response['total_rows'], 40)
+
+        response = self.client.post(
+            '/api/ml/data-processing/outliers/',
+            data=json.dumps({'file_id': file_id, 'outlier_strategy': 'remove', 'detectors': ['iqr', 'isolation_forest']}),
+            content_type='application/json'
+        ).json()
+        self.assertTrue(response['success'])
+        self.assertLessEqual(DataFile.objects.get(id=file_id).total_rows, 40)
+
+
+class TaskAPITest(TestCase):
+    """实验任务API测试"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = User.objects.create_superuser(
+            username='admin', email='admin@test.com', password='Admin123', role='admin'
+        )
+        self.normal_user = User.objects.create_user(
+            username='user1', email='user1@test.com', password='User123', role='user'
+        )
+        self.client.login(username='admin', password='Admin123')
+
+    def post_json(self, url, payload):
+        return self.client.post(url, data=json.dumps(payload), content_type='application/json')
+
+    def test_batch_update_reports_failures(self):
+        """测试批量审核：合法任务一次性更新并写日志，非法任务逐个返回原因"""
+        pending = [
+            Task.objects.create(created_by=self.normal_user, name=f'任务{i}', status=TaskStatus.PENDING)
+            for i in range(3)
+        ]
+        draft = Task.objects.create(created_by=self.normal_user, name='草稿', status=TaskStatus.DRAFT)
+
+        response = self.post_json('/api/batch-update-tasks/', {
+            'task_ids': [t.id for t in pending] + [draft.id, 99999],
+            'status': TaskStatus.APPROVED,
+            'reason': '批量通过',
+        }).json()
+
+        self.assertTrue(response['ok'])
+        self.assertEqual(response['updated_count'], 3)
+        self.assertEqual({f['id'] for f in response['failed']}, {draft.id, 99999})
+        self.assertEqual(Task.objects.filter(status=TaskStatus.APPROVED).count(), 3)
+        self.assertEqual(Task.objects.get(id=draft.id).status, TaskStatus.DRAFT)
+        self.assertEqual(
+            TaskStatusLog.objects.filter(to_status=TaskStatus.APPROVED, from_status=TaskStatus.PENDING).count(), 3
+        )
+
+    def test_submit_tasks_bulk_upsert(self):
+        """测试批量提交按 client_id 幂等：新建、更新与批内重复"""
+        self.client.login(username='user1', password='User123')
+        Task.objects.create(created_by=self.normal_user, client_id='1', name='旧名称')
+
+        response = self.post_json('/api/tasks/submit/', {'tasks': [
+            {'id': 1, 'name': '新名称', 'status': '待审核'},
+            {'id': 2, 'name': '任务二'},
+            {'id': 2, 'name': '任务二改'},
+            {'name': '无编号任务'},
+            {'id': 3},
+        ]}).json()
+
+        self.assertTrue(response['ok'])
+        self.assertEqual((response['created'], response['updated']), (2, 2))
+        self.assertFalse(response['results'][4]['ok'])
+        self.assertEqual(response['results'][1]['server_id'], response['results'][2]['server_id'])
+        self.assertEqual(Task.objects.get(client_id='1').status, TaskStatus.PENDING)
+        self.assertEqual(Task.objects.get(client_id='2').name, '任务二改')
+        self.assertEqual(Task.objects.filter(created_by=self.normal_user).count(), 3)
+
+    def test_task_stations_normalized(self):
+        """测试工站参数校验：数值与单位规范化，非法取值与未知工站被拒绝"""
+        self.client.login(username='user1', password='User123')
+        reagent = {'name': '甲醇', 'amount': '2', 'unit': 'mL', 'type': '液体'}
+        response = self.post_json('/api/user/task/create/', {
+            'name': '规范化任务',
+            'stations': {'solidLiquid': {'enabled': 'true', 'reagents': [reagent]}},
+        }).json()
+        self.assertTrue(response['ok'])
+        stored = Task.objects.get(name='规范化任务').stations['solidLiquid']
+        self.assertEqual(stored['reagents'][0]['amount'], 2.0)
+        self.assertEqual((stored['reagents'][0]['unit'], stored['reagents'][0]['type']), ('ml', 'liquid'))
+
+        bad = self.post_json('/api/user/task/create/', {
+            'name': '非法任务',
+            'stations': {'solidLiquid': {'enabled': True, 'reagents': [{**reagent, 'amount': 'abc'}]}},
+        })
+        self.assertEqual(bad.status_code, 400)
+        unknown = self.post_json('/api/tasks/submit/', {'tasks': [{'id': 9, 'name': '未知', 'stations': {'foo': {}}}]})
+        self.assertFalse(unknown.json()['results'][0]['ok'])
+        self.assertFalse(Task.objects.filter(name__in=['非法任务', '未知']).exists())
+
+    def test_user_tasks_cursor_pagination(self):
+        """测试任务列表游标分页：同一创建时间按ID连续翻页且不重不漏"""
+        self.client.login(username='user1', password='User123')
+        tasks = Task.objects.bulk_create(
+            [Task(created_by=self.normal_user, name=f'任务{i}') for i in range(7)]
+        )
+        Task.objects.filter(id__in=[t.id for t in tasks[:4]]).update(created_at=tasks[0].created_at)
+
+        seen, cursor = [], ''
+        while True:
+            response = self.client.get('/api/user/tasks/', {'cursor': cursor, 'page_size': 3, 'total': 'approx'}).json()
+            self.assertEqual(response['total_count'], 7)
+            seen += [t['id'] for t in response['tasks']]
+            if not response['has_next']:
+                break
+            cursor = response['next_cursor']
+        self.assertEqual(sorted(seen), sorted(t.id for t in tasks))
+        self.assertEqual(len(seen), 7)
+
+        response = self.client.get('/api/user/tasks/', {'cursor': 'bad'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_task_search_by_reagent_and_chinese_terms(self):
+        """测试任务检索：中文、试剂名与前缀匹配，名称命中排在前面"""
+        self.client.login(username='user1', password='User123')
+        by_name = Task.objects.create(created_by=self.normal_user, name='乙酸乙酯萃取')
+        by_reagent = Task.objects.create(
+            created_by=self.normal_user,
+            name='合成实验',
+            remark='夜间运行',
+            stations={'solidLiquid': {'enabled': True, 'reagents': [{'name': '乙酸乙酯', 'type': 'liquid', 'amount': 1.0, 'unit': 'ml'}]}},
+        )
+        Task.objects.create(created_by=self.normal_user, name='其它任务', remark='HPLC-A 测试')
+
+        ids = [t['id'] for t in self.client.get('/api/user/tasks/', {'search': '乙酸'}).json()['tasks']]
+        self.assertEqual(ids, [by_name.id, by_reagent.id])
+        ids = [t['id'] for t in self.client.get('/api/user/tasks/', {'search': '固液 夜间'}).json()['tasks']]
+        self.assertEqual(ids, [by_reagent.id])
+        self.assertEqual(len(self.client.get('/api/user/tasks/', {'search': 'hpl'}).json()['tasks']), 1)
+
+        by_reagent.name = '改名'
+        by_reagent.stations = {}
+        by_reagent.save()
+        ids = [t['id'] for t in self.client.get('/api/user/tasks/', {'search': '乙酸'}).json()['tasks']]
+        self.assertEqual(ids, [by_name.id])
+
+    def test_task_search_fragments_and_keyset(self):
+        """测试任务检索：英文/数字任意位置片段与单个字母走 n-gram 索引，游标分页按创建时间排序"""
+        self.client.login(username='user1', password='User123')
+        hplc = Task.objects.create(created_by=self.normal_user, name='HPLC 检测')
+        dated = Task.objects.create(created_by=self.normal_user, name='样品20250826批次')
+        by_reagent = Task.objects.create(
+            created_by=self.normal_user, name='乙酸合成',
+            stations={'solidLiquid': {'enabled': True, 'reagents': [{'name': '乙酸', 'type': 'liquid', 'amount': 1.0, 'unit': 'ml'}]}},
+        )
+
+        def search(text, **params):
+            return [t['id'] for t in self.client.get('/api/user/tasks/', {'search': text, **params}).json()['tasks']]
+
+        self.assertEqual(search('PLC'), [hplc.id])
+        self.assertEqual(search('0826'), [dated.id])
+        self.assertEqual(search('h'), [hplc.id])
+        self.assertEqual(search('lc 检测'), [hplc.id])
+        self.assertEqual(search('xplc'), [])
+        self.assertEqual(search('乙酸', cursor=''), [by_reagent.id])
+        Task.objects.create(created_by=self.normal_user, name='乙酸')
+        ids = search('乙酸', cursor='')
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_search_token_backfill_matches_live_index(self):
+        """测试迁移 0035 的回填与应用代码生成的词元一致"""
+        import importlib
+        from django.apps import apps as django_apps
+        from .models import TaskSearchToken
+
+        tasks = [
+            Task.objects.create(created_by=self.normal_user, name='HPLC-0826 乙酸乙酯', remark='夜间 run'),
+            Task.objects.create(
+                created_by=self.normal_user, name='合成',
+                stations={'gcms': {'enabled': True}, 'solidLiquid': {'enabled': True, 'reagents': [{'name': 'NaCl', 'type': 'solid', 'amount': 1.0, 'unit': 'g'}]}},
+            ),
+        ]
+        live = set(TaskSearchToken.objects.values_list('task_id', 'token', 'weight'))
+        TaskSearchToken.objects.all().delete()
+        migration = importlib.import_module('app01.migrations.0035_tasksearchtoken')
+        migration.populate_search_tokens(django_apps, None)
+        self.assertEqual(set(TaskSearchToken.objects.values_list('task_id', 'token', 'weight')), live)
+        self.assertEqual({t.id for t in tasks}, {task_id for task_id, _, _ in live})
+
+    def test_status_counters_follow_task_lifecycle(self):
+        """测试状态计数随创建、单个/批量状态变更与删除同步"""
+        tasks = [Task.objects.create(created_by=self.normal_user, name=f'任务{i}', status=TaskStatus.PENDING) for i in range(3)]
+        Task.objects.get(id=tasks[0].id).transition_to(TaskStatus.REJECTED, self.admin_user)
+        self.post_json('/api/batch-update-tasks/', {'task_ids': [t.id for t in tasks], 'status': TaskStatus.APPROVED})
+        Task.objects.get(id=tasks[0].id).delete()
+        self.client.login(username='user1', password='User123')
+        self.post_json('/api/tasks/submit/', {'tasks': [{'id': 'a', 'name': '草稿一'}]})
+
+        expected = {TaskStatus.APPROVED: 2, TaskStatus.DRAFT: 1}
+        summary = self.client.get('/api/tasks/status-summary/').json()
+        self.assertEqual({k: v for k, v in summary['counts'].items() if v}, expected)
+        self.assertEqual(summary['total'], 3)
+        actual = dict(Task.objects.values_list('status').annotate(n=Count('id')))
+        self.assertEqual(actual, expected)
+        self.assertEqual(TaskStatusCounter.summary(self.normal_user)[TaskStatus.REJECTED], 0)
+
+    def test_station_requirement_index(self):
+        """测试工站需求索引随保存更新，并可按工站/试剂筛选任务"""
+        preparator = User.objects.create_user(username='prep', password='Prep1234', role='preparator')
+        stations = {
+            'solidLiquid': {'enabled': True, 'reagents': [
+                {'name': '氯化钠', 'type': 'solid', 'amount': 2.0, 'unit': 'g'},
+                {'name': '乙醇', 'type': 'liquid', 'amount': 5.0, 'unit': 'ml'},
+            ]},
+            'gcms': {'enabled': True},
+            'hplc': {'enabled': False},
+        }
+        task = Task.objects.create(created_by=self.normal_user, name='索引任务', stations=stations)
+        Task.objects.create(created_by=self.normal_user, name='无工站任务')
+
+        reqs = task.station_requirements.all()
+        self.assertEqual(
+            set(reqs.filter(material_type='station').values_list('station_key', flat=True)), {'solidLiquid', 'gcms'}
+        )
+        self.assertEqual(reqs.get(material_type='laiyu_powder').reagent_name, '氯化钠')
+        self.assertEqual(reqs.get(material_type='tip_1').count, 1)
+
+        self.client.login(username='prep', password='Prep1234')
+        ids = [t['id'] for t in self.client.get('/api/preparator/filter-tasks/', {'station': 'gcms'}).json()['tasks']]
+        self.assertEqual(ids, [task.id])
+        task.stations = {'gcms': {'enabled': True}}
+        task.save()
+        ids = [t['id'] for t in self.client.get('/api/preparator/filter-tasks/', {'reagent': '乙醇'}).json()['tasks']]
+        self.assertEqual(ids, [])
+
+    def test_batch_prepare_aggregates_materials(self):
+        """测试批量备料：同工站同试剂按规范单位合并用量，耗材与试管按任务累加"""
+        User.objects.create_user(username='prep', password='Prep1234', role='preparator')
+        tasks = [
+            Task.objects.create(
+                created_by=self.normal_user, name=f'备料{i}', status=TaskStatus.APPROVED,
+                stations=normalize_stations({'solidLiquid': {'enabled': True, 'reagents': [
+                    {'name': '乙醇', 'type': 'liquid', 'amount': str(i + 1), 'unit': unit},
+                    {'name': '氯化钠', 'type': 'solid', 'amount': '1', 'unit': 'g'},
+                ]}}),
+            )
+            for i, unit in enumerate(['ml', 'mL', '毫升'])
+        ]
+
+        self.client.login(username='prep', password='Prep1234')
+        response = self.post_json('/api/preparator/batch-prepare/', {'task_ids': [t.id for t in tasks]}).json()
+        materials = response['preparation_list']['station_materials']['solidLiquid']
+        self.assertEqual(materials['reagent_bottle_150'], [{'reagent_name': '乙醇', 'unit': 'ml', 'amount': 6.0}])
+        self.assertEqual(materials['laiyu_powder'][0]['amount'], 3.0)
+        self.assertEqual((len(materials['test_tube_15']), materials['tip_1']), (3, 3))
+
+    def test_requirements_frozen_on_approval(self):
+        """测试审核通过时重建物料需求，备料汇总直接读取需求索引"""
+        task = Task.objects.create(created_by=self.normal_user, name='待审', status=TaskStatus.PENDING)
+        Task.objects.filter(id=task.id).update(stations={'solidLiquid': {'enabled': True, 'reagents': [
+            {'name': '丙酮', 'type': 'liquid', 'amount': 4.0, 'unit': 'L'},
+        ]}})
+        self.assertEqual(TaskStationRequirement.aggregate([task])[1]['reagent_bottle_150'], 0)
+
+        Task.bulk_transition_to([task.id], TaskStatus.APPROVED, self.admin_user)
+        materials, totals = TaskStationRequirement.aggregate(Task.objects.filter(status=TaskStatus.APPROVED))
+        self.assertEqual(materials['solidLiquid']['reagent_bottle_150'], [{'reagent_name': '丙酮', 'unit': 'L', 'amount': 4.0}])
+        self.assertEqual((totals['test_tube_15'], totals['tip_1']), (1, 1))
+
+    def test_requirements_keep_stations_without_materials(self):
+        """测试需求索引汇总保留不需要物料的已启用工站，与逐任务分析的结果一致"""
+        from .material_requirements import analyze_material_requirements_for_task
+
+        task = Task.objects.create(created_by=self.normal_user, name='含检测', status=TaskStatus.APPROVED, stations={
+            'solidLiquid': {'enabled': True, 'reagents': [
+                {'name': '乙醇', 'type': 'liquid', 'amount': 2.0, 'unit': 'ml'},
+            ]},
+            'gcms': {'enabled': True},
+            'hplc': {'enabled': False},
+        })
+        materials, totals = TaskStationRequirement.aggregate([task])
+        self.assertIn('gcms', materials)
+        self.assertNotIn('hplc', materials)
+        self.assertEqual(materials, analyze_material_requirements_for_task(task))
+        self.assertEqual((totals['test_tube_15'], totals['reagent_bottle_150'], totals['tip_1']), (1, 1, 1))
+
+    def test_normalize_task_stations_migration(self):
+        """测试迁移 0048：历史工站参数改写为规范形式并重建需求索引，无法换算的值中止迁移"""
+        import importlib
+        from django.apps import apps as django_apps
+
+        migration = importlib.import_module('app01.migrations.0048_normalize_task_stations')
+        task = Task.objects.create(created_by=self.normal_user, name='历史任务', status=TaskStatus.APPROVED)
+        Task.objects.filter(id=task.id).update(stations={
+            'solidLiquid': {'enabled': 'true', 'reagents': [
+                {'name': ' 乙醇 ', 'type': '液体', 'amount': '2', 'unit': 'mL'},
+                {'name': '氯化钠', 'type': 'solid', 'amount': '', 'unit': '克'},
+            ]},
+            'reaction': {'enabled': True, 'params': {'duration': '60', 'samplingInterval': 30.0}},
+            'hplc': {'enabled': False, 'params': {'method': 1}},
+        })
+        migration.check_unnormalizable_stations(django_apps, None)
+        migration.normalize_task_stations(django_apps, None)
+
+        task.refresh_from_db()
+        self.assertEqual(task.stations, normalize_stations(task.stations))
+        self.assertEqual(task.stations['solidLiquid']['reagents'][1]['amount'], 0.0)
+        self.assertEqual(task.stations['hplc'], {'enabled': False, 'params': {'method': 1}})
+        live = TaskStationRequirement.aggregate([task])
+        TaskStationRequirement.rebuild_for([task])
+        self.assertEqual(TaskStationRequirement.aggregate([task]), live)
+        self.assertEqual(live[0]['solidLiquid']['reagent_bottle_150'], [{'reagent_name': '乙醇', 'unit': 'ml', 'amount': 2.0}])
+        self.assertEqual(live[1]['sample_tube'], 2)
+
+        Task.objects.filter(id=task.id).update(stations={'solidLiquid': {'enabled': True, 'reagents': [
+            {'name': '乙醇', 'type': 'liquid', 'amount': 'abc', 'unit': 'ml'},
+        ]}})
+        with self.assertRaisesMessage(RuntimeError, f'task#{task.id}: solidLiquid.reagents[0].amount'):
+            migration.check_unnormalizable_stations(django_apps, None)
+
+    def test_change_events_lock_sequence_rows(self):
+        """测试写任务事件时按提交人锁定序列行（首次写入时创建），每个提交人只有一行"""
+        from .models import TaskEventSequence
+
+        task = Task.objects.create(created_by=self.normal_user, name='序列任务', status=TaskStatus.PENDING)
+        Task.objects.get(id=task.id).transition_to(TaskStatus.APPROVED, self.admin_user)
+        Task.objects.create(created_by=self.admin_user, name='管理员任务')
+        self.assertEqual(
+            sorted(TaskEventSequence.objects.values_list('owner_id', flat=True)),
+            sorted([self.normal_user.id, self.admin_user.id]),
+        )
+        self.assertEqual(TaskChangeEvent.objects.filter(owner=self.normal_user).count(), 2)
+
+    def test_task_feed_resume_and_live_events(self):
+        """测试任务推送：按 last_event_id 续传历史事件，并实时推送新事件"""
+        from asgiref.sync import async_to_sync, sync_to_async
+        from channels.testing import WebsocketCommunicator
+        from .consumers import TaskFeedConsumer
+
+        task = Task.objects.create(created_by=self.normal_user, name='推送任务', status=TaskStatus.PENDING)
+        created_event = TaskChangeEvent.objects.get(task_id=task.id)
+        self.assertEqual(created_event.event_type, TaskChangeEvent.CREATED)
+
+        def approve():
+            Task.objects.get(id=task.id).transition_to(TaskStatus.APPROVED, self.admin_user)
+            TaskChangeEvent.notify({self.normal_user.id})
+
+        async def scenario():
+            communicator = WebsocketCommunicator(
+                TaskFeedConsumer.as_asgi(), f'/ws/tasks/feed/?last_event_id={created_event.id - 1}'
+            )
+            communicator.scope['user'] = self.normal_user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            replayed = json.loads(await communicator.receive_from())
+            await sync_to_async(approve)()
+            live = json.loads(await communicator.receive_from())
+            await communicator.disconnect()
+            return replayed, live
+
+        replayed, live = async_to_sync(scenario)()
+        self.assertEqual((replayed['event_id'], replayed['event_type']), (created_event.id, 'created'))
+        self.assertEqual(live['event_type'], 'transition')
+        self.assertEqual((live['from_status'], live['to_status']), (TaskStatus.PENDING, TaskStatus.APPROVED))
+
+        Task.objects.get(id=task.id).delete()
+        self.assertEqual(TaskChangeEvent.objects.last().event_type, TaskChangeEvent.DELETED)
+
+    def test_task_feed_delivers_cross_process_events(self):
+        """测试其他进程（不同通道层实例）写入的事件经轮询实时送达"""
+        from unittest import mock
+        from asgiref.sync import async_to_sync, sync_to_async
+        from channels.layers import InMemoryChannelLayer
+        from channels.testing import WebsocketCommunicator
+        from . import consumers
+
+        task = Task.objects.create(created_by=self.normal_user, name='跨进程任务', status=TaskStatus.PENDING)
+        other_process_layer = InMemoryChannelLayer()
+
+        def approve_elsewhere():
+            Task.objects.get(id=task.id).transition_to(TaskStatus.APPROVED, self.admin_user)
+            with mock.patch('channels.layers.get_channel_layer', return_value=other_process_layer):
+                TaskChangeEvent.notify({self.normal_user.id})
+
+        async def scenario():
+            communicator = WebsocketCommunicator(consumers.TaskFeedConsumer.as_asgi(), '/ws/tasks/feed/')
+            communicator.scope['user'] = self.normal_user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            ready = json.loads(await communicator.receive_from())
+            await sync_to_async(approve_elsewhere)()
+            live = json.loads(await communicator.receive_from(timeout=2))
+            await communicator.disconnect()
+            return ready, live
+
+        with mock.patch.object(consumers, 'TASK_FEED_POLL_SECONDS', 0.05):
+            ready, live = async_to_sync(scenario)()
+        self.assertEqual(ready['type'], 'ready')
+        self.assertEqual((live['task_id'], live['event_type']), (task.id, 'transition'))
+
+    def test_task_feed_replays_late_commits(self):
+        """测试全量订阅的ID空洞：游标跳过、之后才提交的事件补发一次"""
+        from .consumers import TASK_FEED_ALL_GROUP, TaskFeedConsumer
+
+        first = Task.objects.create(created_by=self.normal_user, name='先分配', status=TaskStatus.PENDING)
+        late = TaskChangeEvent.objects.get(task_id=first.id)
+        late_id = late.id
+        late.delete()  # 模拟先分配ID、尚未提交的事务
+        late.id = late_id
+
+        consumer = TaskFeedConsumer()
+        consumer.user = self.admin_user
+        consumer.group_name = TASK_FEED_ALL_GROUP
+        consumer.last_event_id = late.id - 1
+        consumer.seed_gaps()
+        Task.objects.create(created_by=self.admin_user, name='后分配', status=TaskStatus.PENDING)
+        newer = TaskChangeEvent.objects.order_by('-id').first()
+        self.assertEqual([e.id for e in consumer.pending_events()], [newer.id])
+        self.assertEqual(consumer.pending_events(), [])
+
+        late.save()  # 事务提交
+        self.assertEqual([e.id for e in consumer.pending_events()], [late.id])
+        self.assertEqual(consumer.pending_events(), [])
+        self.assertEqual(consumer.last_event_id, newer.id)
+
+    def test_user_tasks_delta_sync(self):
+        """测试增量同步：since 之后的变更、删除墓碑与 304"""
+        self.client.login(username='user1', password='User123')
+        keep = Task.objects.create(created_by=self.normal_user, name='保留')
+        gone = Task.objects.create(created_by=self.normal_user, name='删除')
+
+        full = self.client.get('/api/user/tasks/delta/')
+        self.assertTrue(full.json()['full'])
+        self.assertEqual(len(full.json()['tasks']), 2)
+        since, etag = full.json()['since'], full['ETag']
+        self.assertEqual(self.client.get('/api/user/tasks/delta/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        keep.name = '已修改'
+        keep.save()
+        gone_id = gone.id
+        gone.delete()
+        Task.objects.create(created_by=self.admin_user, name='他人任务')
+
+        delta = self.client.get('/api/user/tasks/delta/', {'since': since}, HTTP_IF_NONE_MATCH=etag).json()
+        self.assertEqual([t['name'] for t in delta['tasks']], ['已修改'])
+        self.assertEqual(delta['deleted'], [gone_id])
+        empty = self.client.get('/api/user/tasks/delta/', {'since': delta['since']}).json()
+        self.assertEqual((empty['tasks'], empty['deleted']), ([], []))
+
+    def test_status_history_reads_archived_logs(self):
+        """测试状态日志归档后热表清空，历史接口仍返回完整记录"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .audit_archive import archive_cold_rows
+        from .models import AuditArchiveSegment
+
+        task = Task.objects.create(created_by=self.normal_user, name='归档任务', status=TaskStatus.PENDING)
+        task.transition_to(TaskStatus.APPROVED, self.admin_user, '通过')
+        TaskStatusLog.objects.filter(task=task).update(changed_at=timezone.now() - timedelta(days=400))
+        task.transition_to(TaskStatus.SCHEDULED, self.admin_user)
+
+        archived = archive_cold_rows('task_status_log', timezone.now() - timedelta(days=180))
+        self.assertEqual(archived, 1)
+        self.assertEqual(TaskStatusLog.objects.filter(task=task).count(), 1)
+        self.assertEqual(AuditArchiveSegment.objects.get().row_count, 1)
+
+        history = self.client.get(f'/api/tasks/{task.id}/status-history/').json()['history']
+        self.assertEqual([h['to_status'] for h in history], ['已排程', '已通过'])
+        self.assertEqual(history[1]['reason'], '通过')
+        self.assertEqual(history[1]['changed_by'], self.admin_user.username)
+
+        # 备料清单主键为字符串，同样可归档
+        from .models import Container, ContainerSpec, FillOperation, PreparationList
+        prep = PreparationList.objects.create(id='prep_archive', created_by=self.admin_user, task_ids=[task.id])
+        container = Container.objects.create(name='C-1', spec=ContainerSpec.objects.create(name='仓', code='c1', capacity=1))
+        FillOperation.objects.create(preparation_list=prep, container=container, slot_index=0, material_kind='tip_1',
+                                     material_name='枪头', operated_by=self.admin_user)
+        FillOperation.objects.update(operated_at=timezone.now() - timedelta(days=400))
+        self.assertEqual(archive_cold_rows('fill_operation', timezone.now() - timedelta(days=180)), 1)
+
+        # 归属对象删除时归档段一并删除
+        task.delete()
+        prep.delete()
+        self.assertFalse(AuditArchiveSegment.objects.exists())
+
+
+class PreparationAPITest(TestCase):
+    """备料与转移仓API测试"""
+
+    def setUp(self):
+        from .models import ContainerSpec, Station
+
+        self.client = Client()
+        self.preparator = User.objects.create_user(username='prep', password='Prep1234', role='preparator')
+        self.client.login(username='prep', password='Prep1234')
+        self.tube_spec = ContainerSpec.objects.create(
+            name='试管仓4', code='tube4', capacity=4, allowed_material_kind='test_tube_15'
+        )
+        self.bottle_spec = ContainerSpec.objects.create(
+            name='试剂瓶仓6', code='btl6', capacity=6, allowed_material_kind='reagent_bottle_150'
+        )
+        self.station = Station.objects.create(name='固液配料1', station_type='solid_liquid')
+
+    def post_json(self, url, payload):
+        return self.client.post(url, data=json.dumps(payload), content_type='application/json')
+
+    def test_plan_slots_packs_and_commits(self):
+        """测试自动装填规划：选用最少的转移仓，缺料记入 shortages，确认后批量落实并写入绑定"""
+        from .models import Container, ContainerSpec, ContainerSlot, PreparationList, ReagentBottle150, TestTube15
+
+        small = ContainerSpec.objects.create(name='试管仓2', code='tube2', capacity=2, allowed_material_kind='test_tube_15')
+        big = Container.objects.create(name='T-4', spec=self.tube_spec)
+        Container.objects.create(name='T-2', spec=small)
+        Container.objects.create(name='B-6', spec=self.bottle_spec)
+        tubes = [TestTube15.objects.create(name=f'tube-{i}') for i in range(3)]
+        bottle = ReagentBottle150.objects.create(name='btl-1', reagent_name='乙醇', volume_ml=150)
+        prep = PreparationList.objects.create(id='prep_test', created_by=self.preparator, task_ids=[1, 2, 3], station_materials={
+            'solidLiquid': {
+                'test_tube_15': [{'reagent_name': '', 'unit': '', 'amount': 0}] * 3,
+                'reagent_bottle_150': [
+                    {'reagent_name': '乙醇', 'unit': 'ml', 'amount': 6.0},
+                    {'reagent_name': '丙酮', 'unit': 'ml', 'amount': 2.0},
+                ],
+                'tip_1': 2,
+            },
+        })
+
+        url = f'/api/preparation-list/{prep.id}/plan-slots/'
+        plan = self.post_json(url, {}).json()['plan']
+        self.assertEqual({c['name'] for c in plan['containers']}, {'T-4', 'B-6'})
+        self.assertEqual(
+            {(s['material_type'], s['reason']) for s in plan['shortages']},
+            {('reagent_bottle_150', '没有空闲的可用物料'), ('tip_1', '转移仓可用槽位不足')},
+        )
+        self.assertEqual(self.post_json(url, {'commit': True}).status_code, 409)
+
+        response = self.post_json(url, {'commit': True, 'allow_partial': True}).json()
+        self.assertTrue(response['committed'])
+        self.assertEqual(ContainerSlot.objects.filter(container=big, occupied=True).count(), 3)
+        self.assertEqual(TestTube15.objects.filter(id__in=[t.id for t in tubes], state='in_use', current_container=big).count(), 3)
+        bottle.refresh_from_db()
+        self.assertEqual((bottle.state, bottle.current_container.name), ('in_use', 'B-6'))
+        big.refresh_from_db()
+        self.assertEqual(big.target_station, self.station)
+        self.assertEqual(set(prep.get_fill_bindings()['solidLiquid']['test_tube_15']), {'0', '1', '2'})
+        self.assertEqual(prep.operations.count(), 4)
+
+        # 已绑定的需求不再重复规划
+        again = self.post_json(url, {}).json()['plan']
+        self.assertEqual(again['assignments'], [])
+
+    def test_commit_plan_rejects_changed_target_station(self):
+        """测试规划后转移仓被设定为其他类型工站时拒绝落实"""
+        from django.core.exceptions import ValidationError
+        from .models import Container, ContainerSlot, PreparationList, Station, TestTube15
+        from .slot_planner import commit_slot_plan, plan_slot_allocation
+
+        container = Container.objects.create(name='T-4', spec=self.tube_spec)
+        TestTube15.objects.create(name='tube-0')
+        prep = PreparationList.objects.create(id='prep_target', created_by=self.preparator, task_ids=[1], station_materials={
+            'solidLiquid': {'test_tube_15': [{'reagent_name': '', 'unit': '', 'amount': 0}]},
+        })
+        plan = plan_slot_allocation(prep)
+        self.assertEqual(len(plan['assignments']), 1)
+
+        container.target_station = Station.objects.create(name='反应1', station_type='reaction')
+        container.save()
+        with self.assertRaises(ValidationError):
+            commit_slot_plan(prep, plan, self.preparator)
+        self.assertFalse(ContainerSlot.objects.filter(container=container, occupied=True).exists())
+
+    def test_bulk_slots_fill_and_clear(self):
+        """测试批量槽位操作：校验失败整体不生效，成功时一次写入槽位、物料与绑定"""
+        from .models import Container, ContainerSlot, PreparationList, TestTube15
+
+        container = Container.objects.create(name='T-4', spec=self.tube_spec)
+        tubes = [TestTube15.objects.create(name=f'tube-{i}') for i in range(3)]
+        prep = PreparationList.objects.create(id='prep_bulk', created_by=self.preparator, task_ids=[1])
+        url = f'/api/containers/{container.id}/slots/bulk/'
+        ops = [
+            {'slot_index': i, 'material_id': t.id, 'material_kind': 'test_tube_15',
+             'station_key': 'solidLiquid', 'material_type': 'test_tube_15', 'material_index': i}
+            for i, t in enumerate(tubes)
+        ]
+
+        bad = self.post_json(url, {'operations': ops + [{'slot_index': 9, 'material_id': 1, 'material_kind': 'test_tube_15'}]})
+        self.assertEqual(bad.status_code, 400)
+        self.assertFalse(ContainerSlot.objects.filter(occupied=True).exists())
+
+        response = self.post_json(url, {
+            'operations': ops, 'preparation_id': prep.id, 'target_station_key': 'solidLiquid',
+        }).json()
+        self.assertEqual((response['filled'], response['cleared']), (3, 0))
+        self.assertEqual(TestTube15.objects.filter(state='in_use', current_container=container).count(), 3)
+        container.refresh_from_db()
+        self.assertEqual(container.target_station, self.station)
+        detail = self.client.get(f'/api/preparation-list/{prep.id}/').json()['preparation_list']
+        self.assertEqual(detail['material_fill_bindings']['solidLiquid']['test_tube_15']['2']['slot_position'], '2')
+        self.assertEqual(prep.fill_bindings.get(material_index=2).container, container)
+
+        clear_ops = [{**op, 'material_id': None, 'material_kind': None} for op in ops]
+        response = self.post_json(url, {'operations': clear_ops, 'preparation_id': prep.id}).json()
+        self.assertEqual(response['cleared'], 3)
+        self.assertEqual(TestTube15.objects.filter(state='idle', current_container__isnull=True).count(), 3)
+        container.refresh_from_db()
+        self.assertIsNone(container.target_station)
+        self.assertFalse(prep.fill_bindings.exists())
+
+    def test_calc_materials_inventory_and_reservations(self):
+        """测试备料计算对照库存：不足时拒绝预留，预留后他人取用受限，本人取用冲减预留"""
+        from datetime import date
+        from decimal import Decimal
+        from .models import Reagent, ReagentReservation
+
+        def make_reagent(name, reagent_type, unit, quantity):
+            return Reagent.objects.create(
+                name=name, cas=name, reagent_type=reagent_type, unit=unit, quantity=quantity,
+                molecular_weight=58.44, density=1, smiles='C', formula='C',
+                expiry_date=date(2099, 1, 1), storage_location='A1',
+            )
+
+        ethanol = make_reagent('乙醇', 'liquid', 'mL', 100)
+        salt = make_reagent('氯化钠', 'solid', 'g', Decimal('0.2'))
+        owner = User.objects.create_user(username='owner', password='Owner123', role='user')
+        task = Task.objects.create(created_by=owner, name='库存任务', status=TaskStatus.APPROVED, stations={
+            'solidLiquid': {'enabled': True, 'reagents': [
+                {'name': '乙醇', 'type': 'liquid', 'amount': 30.0, 'unit': 'ml'},
+                {'name': '氯化钠', 'type': 'solid', 'amount': 500.0, 'unit': 'mg'},
+                {'name': '未入库试剂', 'type': 'solid', 'amount': 1.0, 'unit': 'g'},
+            ]},
+        })
+
+        url = '/api/preparator/calc-materials/'
+        response = self.post_json(url, {'task_ids': [task.id], 'reserve': True})
+        self.assertEqual(response.status_code, 409)
+        status = {row['reagent_name']: row['status'] for row in response.json()['inventory']}
+        self.assertEqual(status, {'乙醇': 'ok', '氯化钠': 'short', '未入库试剂': 'missing'})
+        self.assertFalse(ReagentReservation.objects.exists())
+
+        Reagent.objects.filter(id=salt.id).update(quantity=1)
+        data = self.post_json(url, {'task_ids': [task.id], 'reserve': True}).json()
+        self.assertEqual(sorted(r['amount'] for r in data['reservations']), [0.5, 30.0])
+
+        User.objects.create_user(username='prep2', password='Prep1234', role='preparator')
+        other = Client()
+        other.login(username='prep2', password='Prep1234')
+        take_url = f'/api/reagent/{ethanol.id}/take/'
+        self.assertEqual(other.post(take_url, json.dumps({'amount': 80}), content_type='application/json').status_code, 400)
+        self.assertTrue(self.post_json(take_url, {'amount': 10}).json()['ok'])
+        self.assertEqual(ReagentReservation.objects.get(reagent=ethanol).amount, Decimal('20'))
+
+    def test_reservation_lifecycle(self):
+        """测试试剂预留：同一批任务重复预留不叠加，未关联清单的预留过期后不占库存，删除清单时释放"""
+        from datetime import date
+        from decimal import Decimal
+        from django.utils import timezone
+        from .models import PreparationList, Reagent, ReagentReservation
+
+        ethanol = Reagent.objects.create(
+            name='乙醇', cas='64-17-5', reagent_type='liquid', unit='mL', quantity=100,
+            molecular_weight=46.07, density=Decimal('0.8'), smiles='CCO', formula='C2H6O',
+            expiry_date=date(2099, 1, 1), storage_location='A1',
+        )
+        task = Task.objects.create(created_by=self.preparator, name='预留任务', status=TaskStatus.APPROVED, stations={
+            'solidLiquid': {'enabled': True, 'reagents': [{'name': '乙醇', 'type': 'liquid', 'amount': 60.0, 'unit': 'ml'}]},
+        })
+        url = '/api/preparator/calc-materials/'
+        for _ in range(2):
+            self.assertEqual(self.post_json(url, {'task_ids': [task.id], 'reserve': True}).status_code, 200)
+        self.assertEqual(ReagentReservation.active_total(ethanol), Decimal('60'))
+        self.assertTrue(ReagentReservation.objects.get(status='active').expires_at)
+
+        ReagentReservation.objects.filter(status='active').update(expires_at=timezone.now())
+        self.assertEqual(ReagentReservation.active_total(ethanol), 0)
+        self.post_json(url, {'task_ids': [task.id], 'reserve': True})
+
+        prep_id = self.post_json('/api/preparator/batch-prepare/', {'task_ids': [task.id]}).json()['preparation_list']['id']
+        reservation = ReagentReservation.objects.get(status='active')
+        self.assertEqual((reservation.preparation_list_id, reservation.expires_at), (prep_id, None))
+        self.post_json(url, {'task_ids': [task.id], 'reserve': True})
+        self.assertEqual(ReagentReservation.objects.get(status='active').preparation_list_id, prep_id)
+
+        self.client.delete(f'/api/preparation-list/{prep_id}/delete/')
+        self.assertFalse(PreparationList.objects.exists())
+        self.assertEqual(ReagentReservation.active_total(ethanol), 0)
+
+    def test_inventory_mixed_unit_and_expired_lots(self):
+        """测试同名试剂批次单位不同时逐批换算分摊，过期批次不计入可用量也不被预留"""
+        from datetime import date
+        from decimal import Decimal
+        from .models import Reagent
+        from .reagent_inventory import check_inventory, reserve_reagents
+
+        def make_lot(cas, unit, quantity, expiry, density=Decimal('0.8')):
+            return Reagent.objects.create(
+                name='乙醇', cas=cas, reagent_type='solid' if unit == 'g' else 'liquid', unit=unit, quantity=quantity,
+                molecular_weight=46.07, density=density, smiles='CCO', formula='C2H6O',
+                expiry_date=expiry, storage_location='A1',
+            )
+
+        expired = make_lot('old', 'mL', 1000, date(2000, 1, 1))
+        grams = make_lot('g-lot', 'g', 8, date(2098, 1, 1))
+        millilitres = make_lot('ml-lot', 'mL', 100, date(2099, 1, 1))
+        needs = {'solidLiquid': {'reagent_bottle_150': [{'reagent_name': '乙醇', 'unit': 'ml', 'amount': 20}]}}
+
+        row = check_inventory(needs)[0]
+        self.assertEqual(row['status'], 'ok')
+        self.assertEqual((row['unit'], row['required'], row['available']), ('g', 16.0, 88.0))
+        self.assertNotIn(expired.id, [lot['id'] for lot in row['lots']])
+
+        _, reservations = reserve_reagents(needs, self.preparator)
+        self.assertEqual(
+            sorted((r.reagent_id, r.amount) for r in reservations),
+            [(grams.id, Decimal('8.000')), (millilitres.id, Decimal('10.000'))],
+        )
+
+        Reagent.objects.exclude(id=expired.id).delete()
+        self.assertEqual(check_inventory(needs)[0]['status'], 'expired')
+
+    def test_materials_cursor_pagination(self):
+        """测试物料统一索引：跨四类物料按时间倒序翻页不重不漏，过滤条件下推生效"""
+        from .models import Container, JingtaiPowder, LaiyuPowder, ReagentBottle150, TestTube15
+
+        container = Container.objects.create(name='T-4', spec=self.tube_spec)
+        for i in range(3):
+            TestTube15.objects.create(name=f'tube-{i}', state='in_use' if i == 0 else 'idle',
+                                      current_container=container if i < 2 else None)
+            LaiyuPowder.objects.create(name=f'laiyu-{i}', material_name='粉', mass_mg=1)
+            JingtaiPowder.objects.create(name=f'jingtai-{i}', material_name='粉', mass_mg=1)
+        ReagentBottle150.objects.create(name='btl-0', reagent_name='乙醇', volume_ml=150)
+
+        seen, cursor = [], ''
+        while True:
+            data = self.client.get('/api/materials/', {'cursor': cursor, 'page_size': 3}).json()
+            seen += [(m['kind_code'], m['id']) for m in data['materials']]
+            if not data['has_next']:
+                break
+            cursor = data['next_cursor']
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(len(set(seen)), 10)
+
+        # 每张表只按索引顺序读取 page_size + 1 行
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/materials/', {'cursor': '', 'page_size': 3})
+        material_queries = [q['sql'] for q in ctx.captured_queries if '"created_at" DESC' in q['sql']]
+        self.assertEqual(len(material_queries), 4)
+        self.assertTrue(all('LIMIT 4' in sql for sql in material_queries))
+
+        data = self.client.get('/api/materials/', {'cursor': '', 'state': 'idle', 'container_id': container.id}).json()
+        self.assertEqual([m['name'] for m in data['materials']], ['tube-1'])
+        self.assertEqual(data['materials'][0]['state'], '空闲')
+        data = self.client.get('/api/materials/', {'cursor': '', 'kind': 'laiyu_powder', 'name_prefix': 'laiyu-'}).json()
+        self.assertEqual(len(data['materials']), 3)
+        self.assertEqual(self.client.get('/api/materials/', {'cursor': 'bad'}).status_code, 400)
+        self.assertIn('materials', self.client.get('/api/materials/').json())
+
+    def test_stats_cached_and_invalidated(self):
+        """测试统计卡片：单条聚合查询计算、重复请求命中缓存、增删物料后缓存失效"""
+        from datetime import date
+        from django.core.cache import cache
+        from .models import Container, LaiyuPowder, Reagent, TestTube15
+
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            TestTube15.objects.create(name='tube-0')
+            LaiyuPowder.objects.create(name='laiyu-0', material_name='粉', mass_mg=1)
+            Container.objects.create(name='T-4', spec=self.tube_spec)
+            Reagent.objects.create(
+                name='乙醇', cas='64-17-5', reagent_type='liquid', unit='mL', quantity=1, warning_threshold=5,
+                molecular_weight=46.07, density=0.79, smiles='CCO', formula='C2H6O',
+                expiry_date=date(2000, 1, 1), storage_location='A1',
+            )
+
+        data = self.client.get('/api/materials/stats/').json()
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['by_kind']['reagent_bottle_150'], 0)
+        with self.assertNumQueries(4):  # 会话、用户与两次缓存表读取，不执行统计查询
+            self.assertEqual(self.client.get('/api/materials/stats/').json()['total'], 2)
+        self.assertEqual(self.client.get('/api/containers/stats/').json()['by_code'], {'tube4': 1})
+        stats = self.client.get('/api/reagents/stats/').json()['stats']
+        self.assertEqual((stats['total'], stats['liquid'], stats['lowStock'], stats['expiring']), (1, 1, 1, 1))
+        self.assertEqual(self.client.get('/api/reagents/stats/', {'type': 'solid'}).json()['stats']['total'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TestTube15.objects.create(name='tube-1')
+        self.assertEqual(self.client.get('/api/materials/stats/').json()['by_kind']['test_tube_15'], 2)
+
+    def test_material_name_registry(self):
+        """测试物料名称登记：按名查询走登记表，改名与删除同步，名称跨类型唯一"""
+        from .models import LaiyuPowder, MaterialName, TestTube15
+
+        tube = TestTube15.objects.create(name='scan-1')
+        LaiyuPowder.objects.create(name='scan-2', material_name='粉', mass_mg=1)
+        self.assertEqual(MaterialName.resolve(['scan-1', 'scan-2', 'none']),
+                         {'scan-1': ('test_tube_15', tube.id), 'scan-2': ('laiyu_powder', LaiyuPowder.objects.get().id)})
+
+        data = self.client.get('/api/materials/by-name/', {'name': 'scan-2'}).json()
+        self.assertEqual((data['material']['kind'], data['material']['material_name']), ('laiyu_powder', '粉'))
+        self.assertEqual(self.client.get('/api/materials/by-name/', {'name': 'scan-2', 'kind': '15mL试管'}).status_code, 404)
+
+        with self.assertRaises(ValidationError):
+            TestTube15.objects.create(name='scan-2')
+        self.assertEqual(TestTube15.objects.count(), 1)
+        response = self.post_json(f'/api/materials/test_tube_15/{tube.id}/update/', {'name': 'scan-2'})
+        self.assertEqual(response.status_code, 400)
+
+        self.post_json(f'/api/materials/test_tube_15/{tube.id}/update/', {'name': 'scan-3'})
+        self.assertEqual(MaterialName.resolve(['scan-1', 'scan-3']), {'scan-3': ('test_tube_15', tube.id)})
+        TestTube15.objects.filter(id=tube.id).delete()
+        self.assertFalse(MaterialName.objects.filter(name='scan-3').exists())
+
+    def test_material_name_legacy_duplicates(self):
+        """测试历史跨类型重名：迁移中止并列出重名，不改写物料名称；未改名的保存不访问登记表"""
+        import importlib
+        from django.apps import apps as django_apps
+        from .models import LaiyuPowder, MaterialName, TestTube15
+
+        tube = TestTube15.objects.create(name='dup')
+        powder = LaiyuPowder.objects.create(name='dup-x', material_name='粉', mass_mg=1)
+        LaiyuPowder.objects.filter(id=powder.id).update(name='dup')
+        MaterialName.objects.all().delete()
+
+        powder = LaiyuPowder.objects.get(id=powder.id)
+        powder.state = 'in_use'
+        with self.assertNumQueries(1):
+            powder.save()
+
+        migration = importlib.import_module('app01.migrations.0044_materialname')
+        with self.assertRaisesMessage(RuntimeError, f'dup: test_tube_15#{tube.id}, laiyu_powder#{powder.id}'):
+            migration.check_cross_kind_duplicates(django_apps, None)
+        powder.refresh_from_db()
+        self.assertEqual(powder.name, 'dup')
+
+        LaiyuPowder.objects.filter(id=powder.id).update(name='dup-powder')
+        migration.check_cross_kind_duplicates(django_apps, None)
+        migration.backfill_material_names(django_apps, None)
+        self.assertEqual(MaterialName.resolve(['dup', 'dup-powder']),
+                         {'dup': ('test_tube_15', tube.id), 'dup-powder': ('laiyu_powder', powder.id)})
+
+    def test_scan_batch(self):
+        """测试扫码批量处理：整架放入转移仓、移至工站、标记用完，任一条码无效时全部不生效"""
+        from .models import Container, ContainerSlot, TestTube15
+
+        container = Container.objects.create(name='T-4', spec=self.tube_spec)
+        for i in range(3):
+            TestTube15.objects.create(name=f'rack-{i}')
+        url = '/api/scan/batch/'
+
+        response = self.post_json(url, {'action': 'place', 'codes': ['rack-0', 'unknown'], 'container_code': 'T-4'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], ['unknown: 未找到物料'])
+        self.assertFalse(ContainerSlot.objects.filter(occupied=True).exists())
+
+        data = self.post_json(url, {'action': 'place', 'codes': ['rack-0', 'rack-1', 'rack-0', 'rack-2'],
+                                    'container_code': 'T-4', 'start_slot': 1}).json()
+        self.assertEqual((data['filled'], data['duplicates']), (3, ['rack-0']))
+        self.assertEqual(data['slots'], {'rack-0': 1, 'rack-1': 2, 'rack-2': 3})
+        self.assertEqual(TestTube15.objects.filter(state='in_use', current_container=container).count(), 3)
+
+        from .models import PreparationStation
+        position = PreparationStation.objects.create(
+            position='prep_1', area_type='preparation', position_name='备料区-1', expected_material_kind='test_tube_15'
+        )
+        position.place_container(container, self.preparator)
+        data = self.post_json(url, {'action': 'move', 'codes': ['T-4'], 'station_id': self.station.id}).json()
+        self.assertEqual((data['moved'], data['released_positions']), (1, ['prep_1']))
+        container.refresh_from_db()
+        self.assertEqual((container.current_station, container.state), (self.station, 'idle'))
+        position.refresh_from_db()
+        self.assertEqual((position.is_occupied, position.current_container), (False, None))
+
+        data = self.post_json(url, {'action': 'consume', 'codes': ['rack-0', 'rack-1']}).json()
+        self.assertEqual(data['consumed'], 2)
+        self.assertEqual(list(ContainerSlot.objects.filter(occupied=True).values_list('index', flat=True)), [3])
+        self.assertEqual(TestTube15.objects.filter(state='idle', current_container__isnull=True).count(), 2)
+        self.assertEqual(self.post_json(url, {'action': 'drop', 'codes': ['rack-2']}).status_code, 400)
@@ -1,4 +1,6 @@
 # region 导入与公共依赖
+import base64
+import binascii
 import json
 import re
 import random
@@ -14,21 +16,27 @@ from django.http import HttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
 from django.core.paginator import Paginator
-from django.db import transaction, models
-from django.db.models import Count, Q
+from django.db import IntegrityError, connection, transaction, models
+from django.db.models import CharField, Count, Q, Value
 from django.utils import timezone
 from datetime import datetime, timedelta
 
-from .models import Task, TaskStatus
+from .models import Task, TaskStatus, TaskSearchToken, TaskStatusCounter, TaskStationRequirement, TaskChangeEvent
 from .models import Container, ContainerSpec, ContainerSlot, Station
-from .models import TestTube15, LaiyuPowder, JingtaiPowder, ReagentBottle150
-from .models import PreparationList, FillOperation, PreparationStation
-from .models import DataFile, MLAlgorithm, MLTask, MLTaskResult, DataProcessingLog
-from .models import Reagent, ReagentSpectrum, ReagentOperation, ReagentType, HazardType, SpectrumType
+from .models import TestTube15, LaiyuPowder, JingtaiPowder, ReagentBottle150, MaterialKind, MaterialName, ENTITY_MATERIAL_MODELS
+from .models import PreparationList, FillOperation, MaterialFillBinding, PreparationStation
+from .models import DataBlob, DataFile, DataSplit, MLAlgorithm, MLTask, MLTaskResult, DataProcessingLog
+from .models import Reagent, ReagentSpectrum, ReagentOperation, ReagentReservation, ReagentType, HazardType, SpectrumType
 from decimal import Decimal
 from datetime import datetime
 from django.core.exceptions import ValidationError
 # 精简并修正模型导入：去除不存在的模型，保留实际使用的模型
+from .audit_archive import load_history, usernames_for
+from .station_schema import normalize_stations
+from .slot_planner import plan_slot_allocation, commit_slot_plan, apply_slot_operations
+from .reagent_inventory import attach_reservations, check_inventory, public_report, reserve_reagents
+from .stats import container_stats, material_stats, reagent_stats
+from .scan_batch import apply_scan_batch
 from .models import TaskStatusManager, BayesianOptTask, BOIteration, BOTrial, AIModelConfig, AIChatSession, AIChatMessage
 User = get_user_model()
 # endregion
@@ -277,16 +285,17 @@ def user_task_management(request):
     # 获取当前用户的任务（从数据库）
     db_tasks = Task.objects.filter(created_by=request.user).order_by("-created_at")
 
-    # 计算数据库任务的统计数据
-    total_db_tasks = db_tasks.count()
-    draft_db_tasks = db_tasks.filter(status=TaskStatus.DRAFT).count()
-    pending_db_tasks = db_tasks.filter(status=TaskStatus.PENDING).count()
-    approved_db_tasks = db_tasks.filter(status=TaskStatus.APPROVED).count()
-    scheduled_db_tasks = db_tasks.filter(status=TaskStatus.SCHEDULED).count()
-    in_progress_db_tasks = db_tasks.filter(status=TaskStatus.IN_PROGRESS).count()
-    completed_db_tasks = db_tasks.filter(status=TaskStatus.COMPLETED).count()
-    rejected_db_tasks = db_tasks.filter(status=TaskStatus.REJECTED).count()
-    cancelled_db_tasks = db_tasks.filter(status=TaskStatus.CANCELLED).count()
+    # 计算数据库任务的统计数据（读取状态计数表）
+    status_counts = TaskStatusCounter.summary(request.user)
+    total_db_tasks = sum(status_counts.values())
+    draft_db_tasks = status_counts[TaskStatus.DRAFT]
+    pending_db_tasks = status_counts[TaskStatus.PENDING]
+    approved_db_tasks = status_counts[TaskStatus.APPROVED]
+    scheduled_db_tasks = status_counts[TaskStatus.SCHEDULED]
+    in_progress_db_tasks = status_counts[TaskStatus.IN_PROGRESS]
+    completed_db_tasks = status_counts[TaskStatus.COMPLETED]
+    rejected_db_tasks = status_counts[TaskStatus.REJECTED]
+    cancelled_db_tasks = status_counts[TaskStatus.CANCELLED]
 
     print("数据库查询结果:")
     print(f"  - 总任务数: {total_db_tasks}")
@@ -499,23 +508,16 @@ def api_bo_upload_csv(request: HttpRequest, bo_task_id: int):
     import csv, io
     # 一次性读取字节，避免多次 read() 导致内容为空
     raw_bytes = f.read()
-    content = None
-    # 依次尝试更健壮的解码方案
-    for enc in ('utf-8-sig', 'utf-8', 'gbk', 'latin-1'):
+    # 仅采样头部探测编码与分隔符，整体只解码、解析一次
+    csv_format = detect_csv_format(raw_bytes[:CSV_SNIFF_BYTES], complete=len(raw_bytes) <= CSV_SNIFF_BYTES)
+    encoding = csv_format['encoding']
+    while True:
         try:
-            content = raw_bytes.decode(enc)
+            content = raw_bytes.decode(encoding)
             break
-        except Exception:
-            continue
-    if content is None:
-        return JsonResponse({'ok': False, 'message': '文件编码不支持，请使用UTF-8/GBK'}, status=400)
-
-    # 自动分隔符探测（若失败则用逗号）
-    try:
-        dialect = csv.Sniffer().sniff(content.splitlines()[0] + '\n' + (content.splitlines()[1] if len(content.splitlines())>1 else ''))
-        reader = csv.DictReader(io.StringIO(content), dialect=dialect)
-    except Exception:
-        reader = csv.DictReader(io.StringIO(content))
+        except UnicodeDecodeError:
+            encoding = next_csv_encoding(encoding)
+    reader = csv.DictReader(io.StringIO(content), delimiter=csv_format['delimiter'], quotechar=csv_format['quotechar'])
     rows = list(reader)
     if not rows:
         return JsonResponse({'ok': False, 'message': 'CSV为空'}, status=400)
@@ -1058,7 +1060,10 @@ def api_user_task_create(request: HttpRequest):
         return JsonResponse({"ok": False, "message": "缺少实验名称"}, status=400)
 
     remark = data.get("remark") or None
-    stations = data.get("stations") or None
+    try:
+        stations = normalize_stations(data.get("stations") or None)
+    except ValidationError as e:
+        return JsonResponse({"ok": False, "message": "工站参数无效", "errors": e.messages}, status=400)
     client_id = str(data.get("client_id") or data.get("id") or "").strip() or None
     date = (data.get("date") or "").strip() or None
 
@@ -1133,6 +1138,11 @@ def api_user_task_update(request: HttpRequest, task_id: int):
     remark = data.get("remark") if "remark" in data else None
     stations = data.get("stations") if "stations" in data else None
     date = (data.get("date") or "").strip() or None
+    if stations is not None:
+        try:
+            stations = normalize_stations(stations) or {}
+        except ValidationError as e:
+            return JsonResponse({"ok": False, "message": "工站参数无效", "errors": e.messages}, status=400)
 
     if name is not None and name == "":
         return JsonResponse({"ok": False, "message": "实验名称不能为空"}, status=400)
@@ -1170,6 +1180,62 @@ def api_user_task_update(request: HttpRequest, task_id: int):
 
 
 # region 任务管理（管理员审核/筛选/详情 + 用户端查询/复制/列表/删除/提交/结果）
+TASK_APPROX_COUNT_CACHE_SECONDS = 60
+
+
+def encode_task_cursor(task):
+    """将任务的 (created_at, id) 编码为游标"""
+    raw = f"{task.created_at.isoformat()}|{task.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_task_cursor(cursor):
+    """解析游标，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, task_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(task_id)
+    except (binascii.Error, UnicodeError) as e:
+        raise ValueError(str(e))
+
+
+def keyset_paginate_tasks(request, qs, page_size):
+    """
+    按 (created_at, id) 倒序的游标分页，每页开销与页深无关：
+    GET ...?cursor=（首页传空）&total=exact|approx
+    total=approx 时总数按查询条件缓存一段时间，避免每页都 COUNT(*)
+    返回 (本页任务列表, 分页信息)
+    """
+    import hashlib
+    from django.core.cache import cache
+
+    ordered = qs.order_by("-created_at", "-id")
+    cursor = (request.GET.get("cursor") or "").strip()
+    page_qs = ordered
+    if cursor:
+        created_at, task_id = decode_task_cursor(cursor)
+        page_qs = ordered.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=task_id)
+        )
+    rows = list(page_qs[: page_size + 1])
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    meta = {
+        "page_size": page_size,
+        "has_next": has_next,
+        "next_cursor": encode_task_cursor(rows[-1]) if has_next else None,
+    }
+    total = request.GET.get("total")
+    if total == "exact":
+        meta["total_count"] = qs.count()
+    elif total == "approx":
+        key = "task_count:" + hashlib.md5(str(qs.order_by().query).encode("utf-8")).hexdigest()
+        meta["total_count"] = cache.get_or_set(key, qs.count, TASK_APPROX_COUNT_CACHE_SECONDS)
+        meta["total_is_approximate"] = True
+    return rows, meta
+
+
 @login_required
 @require_http_methods(["POST"])
 def api_submit_tasks(request: HttpRequest):
@@ -1222,59 +1288,122 @@ def api_submit_tasks(request: HttpRequest):
         }
         return status_mapping.get(s, TaskStatus.DRAFT)
 
-    with transaction.atomic():
-        for raw in items:
-            if not isinstance(raw, dict):
-                continue
-            client_id = str(raw.get("id") or "").strip() or None
-            name = (raw.get("name") or "").strip()
-            date = (raw.get("date") or "").strip() or None
-            remark = raw.get("remark") or None
-            stations = raw.get("stations") or None
-            status = norm_status(raw.get("status"))
-
-            if not name:
-                results.append(
-                    {"client_id": client_id, "ok": False, "message": "缺少实验名称"}
-                )
-                continue
+    upsert_fields = ["name", "date", "remark", "stations", "status"]
+    entries = []
+    for raw in items:
+        if not isinstance(raw, dict):
+            continue
+        client_id = str(raw.get("id") or "").strip() or None
+        name = (raw.get("name") or "").strip()
+        if not name:
+            entries.append((client_id, "缺少实验名称"))
+            continue
+        try:
+            stations = normalize_stations(raw.get("stations") or None)
+        except ValidationError as e:
+            entries.append((client_id, "工站参数无效: " + "；".join(e.messages)))
+            continue
+        entries.append(
+            (
+                client_id,
+                {
+                    "name": name,
+                    "date": (raw.get("date") or "").strip() or None,
+                    "remark": raw.get("remark") or None,
+                    "stations": stations,
+                    "status": norm_status(raw.get("status")),
+                },
+            )
+        )
 
-            if client_id:
-                obj, is_created = Task.objects.update_or_create(
-                    created_by=request.user,
-                    client_id=str(client_id),
-                    defaults={
-                        "name": name,
-                        "date": date,
-                        "remark": remark,
-                        "stations": stations,
-                        "status": status,
-                    },
-                )
-            else:
-                obj = Task.objects.create(
-                    created_by=request.user,
-                    client_id=None,
-                    name=name,
-                    date=date,
-                    remark=remark,
-                    stations=stations,
-                    status=status,
+    try:
+        with transaction.atomic():
+            # 一次查询取出本批已存在的 (user, client_id) 任务并加锁
+            client_ids = {cid for cid, fields in entries if cid and isinstance(fields, dict)}
+            tasks_by_client = {
+                t.client_id: t
+                for t in Task.objects.select_for_update().filter(
+                    created_by=request.user, client_id__in=client_ids
                 )
-                is_created = True
-
-            if is_created:
-                created += 1
-            else:
-                updated += 1
-            results.append(
-                {
-                    "client_id": client_id,
-                    "server_id": obj.id,
-                    "is_created": is_created,
-                    "status": obj.get_status_display(),
-                }
+            }
+            existing_ids = set(tasks_by_client)
+            to_create, to_update, anonymous = [], {}, []
+            now = timezone.now()
+
+            rows = []
+            for client_id, fields in entries:
+                if not isinstance(fields, dict):
+                    rows.append((client_id, fields, False))
+                    continue
+                if not client_id:
+                    obj = Task(created_by=request.user, client_id=None, **fields)
+                    anonymous.append(obj)
+                    rows.append((client_id, obj, True))
+                    continue
+                obj = tasks_by_client.get(client_id)
+                if obj is None:
+                    obj = Task(created_by=request.user, client_id=client_id, **fields)
+                    tasks_by_client[client_id] = obj
+                    to_create.append(obj)
+                    rows.append((client_id, obj, True))
+                    continue
+                # 同一批次内重复的 client_id 以最后一条为准
+                if any(getattr(obj, k) != v for k, v in fields.items()):
+                    for k, v in fields.items():
+                        setattr(obj, k, v)
+                    if client_id in existing_ids:
+                        obj.updated_at = now
+                        to_update[client_id] = obj
+                rows.append((client_id, obj, False))
+
+            if to_create:
+                Task.objects.bulk_create(to_create)
+                if any(obj.pk is None for obj in to_create):
+                    # 不支持批量插入返回主键的数据库（如 MySQL）按唯一键回查
+                    pk_map = dict(
+                        Task.objects.filter(
+                            created_by=request.user,
+                            client_id__in=[obj.client_id for obj in to_create],
+                        ).values_list("client_id", "id")
+                    )
+                    for obj in to_create:
+                        obj.pk = pk_map[obj.client_id]
+            if to_update:
+                Task.objects.bulk_update(to_update.values(), upsert_fields + ["updated_at"])
+            # 批量写入绕过了 save()，在此统一维护变更事件、状态计数与检索索引
+            TaskChangeEvent.record(
+                [TaskChangeEvent.for_saved(obj, True, None) for obj in to_create]
+                + [
+                    TaskChangeEvent.for_saved(obj, False, getattr(obj, "_counted_status", None))
+                    for obj in to_update.values()
+                ]
             )
+            TaskStatusCounter.record_saved(to_create, created=True)
+            TaskStatusCounter.record_saved(to_update.values())
+            TaskSearchToken.rebuild_for(to_create + list(to_update.values()))
+            TaskStationRequirement.rebuild_for(to_create + list(to_update.values()))
+            for obj in anonymous:
+                obj.save()
+    except IntegrityError:
+        # 并发提交相同 client_id 时由 uniq_user_client_task 约束拦截
+        return JsonResponse({"ok": False, "message": "任务提交冲突，请重试"}, status=409)
+
+    for client_id, obj, is_created in rows:
+        if isinstance(obj, str):
+            results.append({"client_id": client_id, "ok": False, "message": obj})
+            continue
+        if is_created:
+            created += 1
+        else:
+            updated += 1
+        results.append(
+            {
+                "client_id": client_id,
+                "server_id": obj.id,
+                "is_created": is_created,
+                "status": obj.get_status_display(),
+            }
+        )
 
     return JsonResponse(
         {"ok": True, "created": created, "updated": updated, "results": results}
@@ -1310,24 +1439,22 @@ def api_batch_update_tasks(request):
         if new_status not in valid_statuses:
             return JsonResponse({"ok": False, "message": "无效的状态值"}, status=400)
 
-        # 批量更新
-        updated_count = 0
-        for task_id in task_ids:
-            try:
-                task = Task.objects.get(id=task_id)
-                # 使用状态机进行状态转换
-                task.transition_to(new_status, request.user, reason)
-                updated_count += 1
-            except (Task.DoesNotExist, ValueError) as e:
-                # 记录错误但继续处理其他任务
-                print(f"任务 {task_id} 状态更新失败: {str(e)}")
-                continue
+        try:
+            task_ids = [int(task_id) for task_id in task_ids]
+        except (TypeError, ValueError):
+            return JsonResponse({"ok": False, "message": "任务ID无效"}, status=400)
+
+        # 批量状态转换：不符合状态机的任务逐个返回失败原因，其余任务一次性更新
+        updated_ids, failures = Task.bulk_transition_to(task_ids, new_status, request.user, reason)
+        updated_count = len(updated_ids)
 
         return JsonResponse(
             {
                 "ok": True,
                 "message": f"成功更新 {updated_count} 个任务状态为 {dict(TaskStatus.choices).get(new_status, new_status)}",
                 "updated_count": updated_count,
+                "updated_ids": updated_ids,
+                "failed": [{"id": task_id, "message": msg} for task_id, msg in failures.items()],
                 "status": new_status,
             }
         )
@@ -1444,21 +1571,39 @@ def api_filter_tasks(request):
             qs = qs.filter(status=status_value)
 
     if search:
-        qs = qs.filter(name__icontains=search)
-
-    # 分页处理
-    page_num = request.GET.get("page") or "1"
-    try:
-        page_num_int = int(page_num)
-    except Exception:
-        page_num_int = 1
+        # 全文检索（名称/备注/工站/试剂）；页码分页按命中权重排序，游标分页固定按创建时间倒序
+        keyset = "cursor" in request.GET
+        qs = TaskSearchToken.search(qs, search, ranked=not keyset)
+        if not keyset:
+            qs = qs.order_by("-search_rank", "-created_at")
+
+    # 分页处理：传 cursor 参数时使用游标分页，否则沿用页码分页
+    if "cursor" in request.GET:
+        try:
+            page_tasks, page_meta = keyset_paginate_tasks(request, qs, 10)
+        except ValueError:
+            return JsonResponse({"ok": False, "message": "无效的游标"}, status=400)
+    else:
+        page_num = request.GET.get("page") or "1"
+        try:
+            page_num_int = int(page_num)
+        except Exception:
+            page_num_int = 1
 
-    paginator = Paginator(qs, 10)
-    page_obj = paginator.get_page(page_num_int)
+        paginator = Paginator(qs, 10)
+        page_obj = paginator.get_page(page_num_int)
+        page_tasks = page_obj.object_list
+        page_meta = {
+            "total_pages": paginator.num_pages,
+            "current_page": page_obj.number,
+            "has_previous": page_obj.has_previous(),
+            "has_next": page_obj.has_next(),
+            "total_count": paginator.count,
+        }
 
     # 序列化任务数据
     tasks_data = []
-    for task in page_obj.object_list:
+    for task in page_tasks:
         tasks_data.append(
             {
                 "id": task.id,
@@ -1470,17 +1615,7 @@ def api_filter_tasks(request):
             }
         )
 
-    return JsonResponse(
-        {
-            "ok": True,
-            "tasks": tasks_data,
-            "total_pages": paginator.num_pages,
-            "current_page": page_obj.number,
-            "has_previous": page_obj.has_previous(),
-            "has_next": page_obj.has_next(),
-            "total_count": paginator.count,
-        }
-    )
+    return JsonResponse({"ok": True, "tasks": tasks_data, **page_meta})
 
 
 @login_required
@@ -1593,6 +1728,7 @@ def api_user_tasks(request: HttpRequest):
     """
     获取当前用户的任务列表，支持简单筛选与分页：
     GET /api/user/tasks/?page=1&page_size=10&status=进行中&search=xxx
+    游标分页：GET /api/user/tasks/?cursor=&page_size=10&total=approx，之后传返回的 next_cursor
     """
     page_size_raw = request.GET.get("page_size") or "10"
     try:
@@ -1626,29 +1762,22 @@ def api_user_tasks(request: HttpRequest):
         if status_value:
             qs = qs.filter(status=status_value)
     if search:
-        qs = qs.filter(name__icontains=search)
-
-    paginator = Paginator(qs, page_size)
-    page_obj = paginator.get_page(page_num)
-
-    items = []
-    for t in page_obj.object_list:
-        items.append(
-            {
-                "id": t.id,
-                "name": t.name,
-                "status": t.get_status_display(),
-                "remark": t.remark or "",
-                "date": t.date or "",
-                "created_at": t.created_at.strftime("%Y-%m-%d %H:%M"),
-                "updated_at": t.updated_at.strftime("%Y-%m-%d %H:%M"),
-            }
-        )
+        # 全文检索（名称/备注/工站/试剂）；页码分页按命中权重排序，游标分页固定按创建时间倒序
+        keyset = "cursor" in request.GET
+        qs = TaskSearchToken.search(qs, search, ranked=not keyset)
+        if not keyset:
+            qs = qs.order_by("-search_rank", "-created_at")
 
-    return JsonResponse(
-        {
-            "ok": True,
-            "tasks": items,
+    if "cursor" in request.GET:
+        try:
+            page_tasks, page_meta = keyset_paginate_tasks(request, qs, page_size)
+        except ValueError:
+            return JsonResponse({"ok": False, "message": "无效的游标"}, status=400)
+    else:
+        paginator = Paginator(qs, page_size)
+        page_obj = paginator.get_page(page_num)
+        page_tasks = page_obj.object_list
+        page_meta = {
             "page": page_obj.number,
             "page_size": page_obj.paginator.per_page,
             "total_pages": page_obj.paginator.num_pages,
@@ -1656,7 +1785,77 @@ def api_user_tasks(request: HttpRequest):
             "has_next": page_obj.has_next(),
             "has_previous": page_obj.has_previous(),
         }
+
+    items = [serialize_user_task(t) for t in page_tasks]
+
+    return JsonResponse({"ok": True, "tasks": items, **page_meta})
+
+
+def serialize_user_task(t):
+    """用户任务列表项"""
+    return {
+        "id": t.id,
+        "name": t.name,
+        "status": t.get_status_display(),
+        "remark": t.remark or "",
+        "date": t.date or "",
+        "created_at": t.created_at.strftime("%Y-%m-%d %H:%M"),
+        "updated_at": t.updated_at.strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_user_tasks_delta(request: HttpRequest):
+    """
+    当前用户任务的增量同步：
+    GET /api/user/tasks/delta/?since=<上次返回的 token>
+    不带 since 时返回全部任务；带 since 时只返回之后新建/修改的任务与已删除任务ID（墓碑）
+    token 为任务变更事件游标（同一提交人的事件按提交顺序分配ID，见 TaskChangeEvent）；
+    响应带 ETag，If-None-Match 命中时返回 304
+    """
+    last_event_id = (
+        TaskChangeEvent.objects.filter(owner=request.user)
+        .order_by("-id")
+        .values_list("id", flat=True)
+        .first()
+    ) or 0
+    etag = f'W/"tasks-{request.user.id}-{last_event_id}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponse(status=304)
+        response["ETag"] = etag
+        return response
+
+    since_raw = request.GET.get("since")
+    if since_raw:
+        try:
+            since = int(since_raw)
+        except ValueError:
+            return JsonResponse({"ok": False, "message": "无效的同步标记"}, status=400)
+        changed_ids = set(
+            TaskChangeEvent.objects.filter(
+                owner=request.user, id__gt=since, id__lte=last_event_id
+            ).values_list("task_id", flat=True)
+        )
+        tasks = list(
+            Task.objects.filter(created_by=request.user, id__in=changed_ids).order_by("-created_at")
+        )
+        deleted = sorted(changed_ids - {t.id for t in tasks})
+    else:
+        tasks = list(Task.objects.filter(created_by=request.user).order_by("-created_at"))
+        deleted = []
+
+    response = JsonResponse(
+        {
+            "ok": True,
+            "full": not since_raw,
+            "tasks": [serialize_user_task(t) for t in tasks],
+            "deleted": deleted,
+            "since": str(last_event_id),
+        }
     )
+    response["ETag"] = etag
+    return response
 
 
 @login_required
@@ -1751,6 +1950,83 @@ def api_task_result(request, task_id):
         )
 
 
+def task_status_counts_by_user():
+    """按用户汇总状态计数表（每个用户至多一行/状态），字段与原 Task 聚合口径一致"""
+    from django.db.models import Sum
+    statuses = {
+        "draft": TaskStatus.DRAFT,
+        "pending": TaskStatus.PENDING,
+        "approved": TaskStatus.APPROVED,
+        "scheduled": TaskStatus.SCHEDULED,
+        "in_progress": TaskStatus.IN_PROGRESS,
+        "completed": TaskStatus.COMPLETED,
+        "rejected": TaskStatus.REJECTED,
+        "cancelled": TaskStatus.CANCELLED,
+    }
+    return (
+        TaskStatusCounter.objects.values(created_by__username=models.F("user__username"))
+        .annotate(
+            total=Sum("count", default=0),
+            **{
+                key: Sum("count", filter=Q(status=value), default=0)
+                for key, value in statuses.items()
+            },
+        )
+        .filter(total__gt=0)
+        .order_by("-total")
+    )
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_task_status_summary(request):
+    """
+    任务状态汇总：普通用户返回本人计数；管理员返回全局计数，by_user=1 时附带各用户计数
+    """
+    if request.user.is_admin():
+        counts = TaskStatusCounter.summary()
+    else:
+        counts = TaskStatusCounter.summary(request.user)
+    data = {
+        "ok": True,
+        "counts": counts,
+        "labels": dict(TaskStatus.choices),
+        "total": sum(counts.values()),
+    }
+    if request.user.is_admin() and request.GET.get("by_user") in ("1", "true"):
+        data["by_user"] = list(task_status_counts_by_user())
+    return JsonResponse(data)
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_task_status_history(request, task_id):
+    """
+    任务状态变更历史（含已归档的日志）
+    """
+    try:
+        task = Task.objects.get(id=task_id)
+    except Task.DoesNotExist:
+        return JsonResponse({"ok": False, "message": "任务不存在"}, status=404)
+    if task.created_by_id != request.user.id and not (request.user.is_admin() or request.user.is_preparator()):
+        return JsonResponse({"ok": False, "message": "权限不足"}, status=403)
+
+    labels = dict(TaskStatus.choices)
+    rows = load_history("task_status_log", task.id)
+    users = usernames_for(rows, "changed_by_id")
+    history = [
+        {
+            "from_status": labels.get(row["from_status"], row["from_status"]),
+            "to_status": labels.get(row["to_status"], row["to_status"]),
+            "changed_by": users.get(row["changed_by_id"], ""),
+            "changed_at": row["changed_at"],
+            "reason": row["reason"] or "",
+        }
+        for row in rows
+    ]
+    return JsonResponse({"ok": True, "history": history})
+
+
 # endregion
 
 
@@ -1772,22 +2048,7 @@ def admin_experiment_tasks(request):
     )
 
     # 用户维度统计：为保证与仪表板一致，统计口径覆盖全部状态（不做排除）
-    qs_all = Task.objects.select_related("created_by")
-    user_stats = (
-        qs_all.values("created_by__username")
-        .annotate(
-            total=Count("id"),
-            draft=Count("id", filter=Q(status=TaskStatus.DRAFT)),
-            pending=Count("id", filter=Q(status=TaskStatus.PENDING)),
-            approved=Count("id", filter=Q(status=TaskStatus.APPROVED)),
-            scheduled=Count("id", filter=Q(status=TaskStatus.SCHEDULED)),
-            in_progress=Count("id", filter=Q(status=TaskStatus.IN_PROGRESS)),
-            completed=Count("id", filter=Q(status=TaskStatus.COMPLETED)),
-            rejected=Count("id", filter=Q(status=TaskStatus.REJECTED)),
-            cancelled=Count("id", filter=Q(status=TaskStatus.CANCELLED)),
-        )
-        .order_by("-total")
-    )
+    user_stats = task_status_counts_by_user()
 
     context = {
         "user_stats": user_stats,
@@ -2467,34 +2728,27 @@ def api_ml_data_files_upload(request):
                 'message': '文件大小不能超过50MB'
             })
         
-        # 生成唯一文件名
+        # 生成唯一文件名（逻辑名，用于派生文件命名）；物理文件按内容哈希存储，相同内容只保存一份
         import uuid
-        import os
-        from django.conf import settings
-        
+
         filename = f"{uuid.uuid4()}.csv"
-        file_path = os.path.join(settings.MEDIA_ROOT, 'ml_data', filename)
-        
-        # 确保目录存在
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        
-        # 保存文件
-        with open(file_path, 'wb') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
-        
+        blob, _ = store_data_blob(file.chunks())
+
         # 创建数据库记录
         data_file = DataFile.objects.create(
             user=request.user,
             filename=filename,
             original_filename=file.name,
-            file_path=file_path,
-            file_size=file.size,
+            file_path=blob.file_path,
+            file_size=blob.file_size,
+            blob=blob,
             status='uploading'
         )
         
-        # 异步处理文件（这里先同步处理）
-        process_uploaded_file(data_file)
+        # 异步处理文件（这里先同步处理）；同内容已有画像时直接复用
+        if not apply_cached_profile(data_file):
+            process_uploaded_file(data_file)
+            cache_blob_profile(data_file)
         
         return JsonResponse({
             'success': True,
@@ -2509,6 +2763,470 @@ def api_ml_data_files_upload(request):
         })
 
 
+# ==================== 内容寻址存储 ====================
+
+# 按内容缓存到 DataBlob.profile 的 DataFile 画像字段
+DATA_PROFILE_FIELDS = (
+    'total_rows', 'total_columns', 'column_names', 'data_types', 'missing_values',
+    'outlier_info', 'data_preview', 'row_index', 'csv_format',
+)
+
+
+def data_blob_dir():
+    """内容寻址文件存放目录"""
+    import os
+    from django.conf import settings
+    return os.path.join(settings.MEDIA_ROOT, 'ml_data', 'blobs')
+
+
+def store_data_blob(chunks):
+    """
+    边写临时文件边计算SHA256；内容已存在时丢弃临时文件，只增加引用计数
+    返回 (DataBlob, 是否新建)
+    """
+    import hashlib
+    import os
+    import tempfile
+    blob_dir = data_blob_dir()
+    os.makedirs(blob_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=blob_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in chunks:
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+        with transaction.atomic():
+            blob, created = DataBlob.objects.select_for_update().get_or_create(
+                sha256=sha256,
+                defaults={'file_path': os.path.join(blob_dir, f'{sha256}.csv'), 'file_size': size},
+            )
+            if created or not os.path.exists(blob.file_path):
+                os.replace(tmp_path, blob.file_path)
+                tmp_path = None
+            blob.ref_count += 1
+            blob.save(update_fields=['ref_count'])
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return blob, created
+
+
+def release_data_blob(blob_id):
+    """减少引用计数；无引用时删除实体记录与物理文件"""
+    import os
+    with transaction.atomic():
+        try:
+            blob = DataBlob.objects.select_for_update().get(pk=blob_id)
+        except DataBlob.DoesNotExist:
+            return
+        if blob.ref_count > 1:
+            blob.ref_count -= 1
+            blob.save(update_fields=['ref_count'])
+            return
+        file_path = blob.file_path
+        blob.delete()
+        transaction.on_commit(lambda: os.path.exists(file_path) and os.remove(file_path))
+
+
+def apply_cached_profile(data_file):
+    """若同内容文件已完成画像，直接复用，返回是否命中"""
+    blob = data_file.blob
+    if not blob or not blob.profile or data_file.file_path != blob.file_path:
+        return False
+    for field in DATA_PROFILE_FIELDS:
+        setattr(data_file, field, blob.profile.get(field))
+    data_file.status = 'ready'
+    data_file.processing_log = f"内容与已处理文件相同，复用缓存画像：{data_file.total_rows}行，{data_file.total_columns}列"
+    data_file.save()
+    return True
+
+
+def cache_blob_profile(data_file):
+    """将刚完成的画像按内容哈希缓存"""
+    blob = data_file.blob
+    if not blob or data_file.status != 'ready' or data_file.file_path != blob.file_path:
+        return
+    blob.profile = {field: getattr(data_file, field) for field in DATA_PROFILE_FIELDS}
+    blob.save(update_fields=['profile'])
+
+
+# ==================== CSV格式探测 ====================
+
+# 只采样文件头部进行探测
+CSV_SNIFF_BYTES = 64 * 1024
+CSV_CANDIDATE_ENCODINGS = ('utf-8-sig', 'utf-8', 'gbk', 'latin-1')
+CSV_CANDIDATE_DELIMITERS = ',;\t|'
+
+
+def _is_number(value):
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def _value_type(value):
+    """单元格类型：empty / integer / float / text"""
+    if not value:
+        return 'empty'
+    if not _is_number(value):
+        return 'text'
+    return 'integer' if float(value).is_integer() and '.' not in value else 'float'
+
+
+def _column_type(values):
+    """列类型：全部为整数为 integer，全部为数值为 float，否则为 text；无值为 empty"""
+    types = {_value_type(v) for v in values} - {'empty'}
+    if not types:
+        return 'empty'
+    if types == {'integer'}:
+        return 'integer'
+    return 'float' if types <= {'integer', 'float'} else 'text'
+
+
+def _looks_like_header(rows):
+    """
+    判断首行是否为表头（保守：默认有表头）
+    仅当存在数据行、首行列数与数据行一致、至少一个数值列的首行值同为数值且没有任何列的首行值与该列类型冲突时，
+    才认为首行也是数据；文本列无法区分表头与数据，不作为依据
+    """
+    first, body = rows[0], rows[1:]
+    if not body or any(len(r) != len(first) for r in body):
+        return True
+    numeric_match = False
+    for i, value in enumerate(first):
+        body_type = _column_type([r[i].strip() for r in body])
+        first_type = _value_type(value.strip())
+        if body_type in ('empty', 'text') or first_type == 'empty':
+            continue
+        if first_type == 'text' or (body_type == 'integer' and first_type == 'float'):
+            return True
+        numeric_match = True
+    return not numeric_match
+
+
+def next_csv_encoding(encoding):
+    """候选编码中的下一个；头部采样选出的编码在后续内容上解码失败时依次放宽（latin-1 兜底）"""
+    candidates = CSV_CANDIDATE_ENCODINGS
+    index = candidates.index(encoding) if encoding in candidates else len(candidates) - 1
+    return candidates[min(index + 1, len(candidates) - 1)]
+
+
+def detect_csv_format(sample, complete=False):
+    """
+    基于文件头部字节探测CSV格式：编码、分隔符、引号、是否有表头、列名及各列类型
+    complete=True 表示 sample 即完整文件，无需截断到最后一个完整行；
+    不完整时编码与列类型仅对采样有效，读取全文发现不符时由 read_csv_with_format 修正
+    """
+    import csv
+    if not complete:
+        # 截断到最后一个换行，避免半行或被截断的多字节字符影响判断
+        cut = sample.rfind(b'\n')
+        if cut > 0:
+            sample = sample[:cut + 1]
+
+    encoding, text = 'latin-1', None
+    for enc in CSV_CANDIDATE_ENCODINGS:
+        try:
+            text = sample.decode(enc)
+            encoding = enc
+            break
+        except UnicodeDecodeError:
+            continue
+    if text is None:
+        text = sample.decode('latin-1')
+
+    lines = [line for line in text.splitlines() if line.strip()]
+    try:
+        dialect = csv.Sniffer().sniff('\n'.join(lines[:50]), delimiters=CSV_CANDIDATE_DELIMITERS)
+        delimiter, quotechar = dialect.delimiter, dialect.quotechar or '"'
+    except csv.Error:
+        delimiter, quotechar = ',', '"'
+
+    rows = list(csv.reader(lines, delimiter=delimiter, quotechar=quotechar))
+    has_header = _looks_like_header(rows) if rows else True
+    first = rows[0] if rows else []
+    columns = list(first) if has_header else [f'column_{i + 1}' for i in range(len(first))]
+
+    # 按采样的数据行推断列类型；含空值的整数列与 pandas 一致按浮点读取
+    body = rows[1:] if has_header else rows
+    column_types = {}
+    for i, name in enumerate(columns):
+        values = [r[i].strip() if i < len(r) else '' for r in body]
+        column_type = _column_type(values)
+        if column_type == 'integer' and not all(values):
+            column_type = 'float'
+        column_types[name] = column_type
+
+    return {
+        'encoding': encoding,
+        'delimiter': delimiter,
+        'quotechar': quotechar,
+        'has_header': has_header,
+        'columns': columns,
+        'column_types': column_types,
+    }
+
+
+# 列类型 -> pandas dtype；empty 列不指定，由 pandas 推断
+CSV_COLUMN_DTYPES = {'integer': 'int64', 'float': 'float64', 'text': 'object'}
+
+
+def csv_read_options(csv_format):
+    """将探测结果转换为 pandas.read_csv 参数；列类型以 dtype 传入，分页读取的各页类型保持一致"""
+    options = {
+        'encoding': csv_format['encoding'],
+        'sep': csv_format['delimiter'],
+        'quotechar': csv_format['quotechar'],
+        'low_memory': False,
+    }
+    dtype = {
+        name: CSV_COLUMN_DTYPES[column_type]
+        for name, column_type in csv_format['column_types'].items()
+        if column_type in CSV_COLUMN_DTYPES
+    }
+    if dtype:
+        options['dtype'] = dtype
+    if not csv_format['has_header']:
+        options['header'] = None
+        options['names'] = csv_format['columns']
+    return options
+
+
+def _save_csv_format(data_file, csv_format):
+    data_file.csv_format = csv_format
+    if data_file.pk:
+        data_file.save(update_fields=['csv_format', 'updated_at'])
+
+
+def get_data_file_csv_format(data_file):
+    """
+    获取数据文件的CSV格式；只采样文件头部探测一次，结果缓存在 DataFile.csv_format，
+    文件被处理覆盖后自动重新探测
+    """
+    import os
+    csv_format = data_file.csv_format
+    file_size = os.path.getsize(data_file.file_path)
+    if (not csv_format or csv_format.get('file_size') != file_size
+            or csv_format.get('file_path') != data_file.file_path
+            or 'column_types' not in csv_format):
+        with open(data_file.file_path, 'rb') as fh:
+            sample = fh.read(CSV_SNIFF_BYTES)
+        csv_format = detect_csv_format(sample, complete=file_size <= CSV_SNIFF_BYTES)
+        csv_format['file_size'] = file_size
+        csv_format['file_path'] = data_file.file_path
+        _save_csv_format(data_file, csv_format)
+    return csv_format
+
+
+def read_csv_with_format(data_file, open_source, **kwargs):
+    """
+    按缓存的格式解析 open_source() 返回的文件路径或字节流；
+    头部采样得出的编码或列类型与后部内容不符时（解码失败 / 类型转换失败），
+    换下一个候选编码或去掉列类型后重试，并把修正写回缓存，之后的读取不再重复失败
+    """
+    import pandas as pd
+    csv_format = get_data_file_csv_format(data_file)
+    while True:
+        options = csv_read_options(csv_format)
+        options.update(kwargs)
+        try:
+            return pd.read_csv(open_source(), **options)
+        except UnicodeDecodeError:
+            if csv_format['encoding'] == CSV_CANDIDATE_ENCODINGS[-1]:
+                raise
+            csv_format['encoding'] = next_csv_encoding(csv_format['encoding'])
+        except ValueError:
+            if 'dtype' not in options:
+                raise
+            csv_format['column_types'] = {}
+        _save_csv_format(data_file, csv_format)
+
+
+def read_data_file_csv(data_file, **kwargs):
+    """按缓存的格式一次性读取数据文件，所有数据文件读取统一走这里"""
+    df = read_csv_with_format(data_file, lambda: data_file.file_path, **kwargs)
+    csv_format = data_file.csv_format
+    if not kwargs and not csv_format['column_types']:
+        # 采样推断的列类型被推翻后，以全文解析得到的类型回填，分页读取仍按统一类型解析
+        kinds = {'i': 'integer', 'u': 'integer', 'f': 'float', 'O': 'text'}
+        csv_format['column_types'] = {
+            str(name): kinds.get(dtype.kind, 'empty') for name, dtype in df.dtypes.items()
+        }
+        _save_csv_format(data_file, csv_format)
+    return df
+
+
+# ==================== 数据文件行偏移索引与分页读取 ====================
+
+# 每隔多少行记录一次字节偏移；索引大小约为 total_rows / ROW_INDEX_STRIDE
+ROW_INDEX_STRIDE = 1000
+# 分页预览单页最大行数
+PREVIEW_MAX_PAGE_SIZE = 1000
+# 排序/筛选结果（行号数组）缓存时间（秒）
+PREVIEW_ORDER_CACHE_SECONDS = 600
+
+
+def _iter_csv_records(fh):
+    """
+    逐条遍历二进制文件句柄中的CSV记录，返回 (起始偏移, 记录字节)
+    引号内的换行视为同一条记录；空行与 pandas 默认行为一致被跳过
+    """
+    pos = fh.tell()
+    start = pos
+    parts = []
+    in_quotes = False
+    for line in fh:
+        pos += len(line)
+        if line.count(b'"') % 2:
+            in_quotes = not in_quotes
+        if not parts and not in_quotes and not line.strip():
+            start = pos
+            continue
+        parts.append(line)
+        if in_quotes:
+            continue
+        yield start, b''.join(parts)
+        parts = []
+        start = pos
+
+
+def build_row_offset_index(file_path, stride=ROW_INDEX_STRIDE, has_header=True):
+    """
+    扫描一次文件，构建稀疏行偏移索引
+    offsets[i] 为第 i*stride 条数据行（不含表头）的起始字节偏移
+    """
+    import os
+    offsets = []
+    header = None if has_header else [0, 0]
+    total_rows = 0
+    with open(file_path, 'rb') as fh:
+        for start, record in _iter_csv_records(fh):
+            if header is None:
+                header = [start, start + len(record)]
+                continue
+            if total_rows % stride == 0:
+                offsets.append(start)
+            total_rows += 1
+    return {
+        'stride': stride,
+        'file_path': file_path,
+        'file_size': os.path.getsize(file_path),
+        'header': header or [0, 0],
+        'offsets': offsets,
+        'total_rows': total_rows,
+    }
+
+
+def ensure_row_offset_index(data_file):
+    """
+    获取数据文件的行偏移索引；文件被处理覆盖（大小变化）后自动重建并保存
+    """
+    import os
+    index = data_file.row_index
+    if (not index or index.get('file_size') != os.path.getsize(data_file.file_path)
+            or index.get('file_path', data_file.file_path) != data_file.file_path):
+        has_header = get_data_file_csv_format(data_file)['has_header']
+        index = build_row_offset_index(data_file.file_path, has_header=has_header)
+        data_file.row_index = index
+        data_file.save(update_fields=['row_index', 'updated_at'])
+    return index
+
+
+def read_data_file_rows(data_file, positions):
+    """
+    按行号（0-based，不含表头）读取指定行，返回与 positions 顺序一致的 DataFrame
+    只 seek 到所需检查点后顺序读取，不加载整个文件
+    """
+    import io
+    index = ensure_row_offset_index(data_file)
+    stride = index['stride']
+    positions = [int(p) for p in positions if 0 <= int(p) < index['total_rows']]
+    wanted = sorted(set(positions))
+    records = {}
+    with open(data_file.file_path, 'rb') as fh:
+        fh.seek(index['header'][0])
+        header_bytes = fh.read(index['header'][1] - index['header'][0])
+        i = 0
+        while i < len(wanted):
+            checkpoint = wanted[i] // stride
+            fh.seek(index['offsets'][checkpoint])
+            row_no = checkpoint * stride
+            for _, record in _iter_csv_records(fh):
+                if row_no == wanted[i]:
+                    records[row_no] = record if record.endswith(b'\n') else record + b'\n'
+                    i += 1
+                    if i >= len(wanted) or wanted[i] // stride != checkpoint:
+                        break
+                row_no += 1
+            else:
+                break
+    wanted = [p for p in wanted if p in records]
+    if header_bytes and not header_bytes.endswith(b'\n'):
+        header_bytes += b'\n'
+    content = header_bytes + b''.join(records[p] for p in wanted)
+    df = read_csv_with_format(data_file, lambda: io.BytesIO(content))
+    df.index = wanted
+    return df.loc[[p for p in positions if p in records]]
+
+
+def _preview_row_order(data_file, sort_by=None, sort_order='asc', filter_column=None, filter_op=None, filter_value=None):
+    """
+    计算排序/筛选后的行号数组；只读取参与排序/筛选的列，结果按文件版本缓存
+    """
+    import pandas as pd
+    import numpy as np
+    from django.core.cache import cache
+    index = ensure_row_offset_index(data_file)
+    cache_key = 'ml_preview_order:%s:%s:%s:%s:%s:%s:%s' % (
+        data_file.id, index['file_size'], sort_by, sort_order, filter_column, filter_op, filter_value
+    )
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    usecols = [c for c in {sort_by, filter_column} if c]
+    df = read_data_file_csv(data_file, usecols=usecols)
+    order = np.arange(len(df))
+    if filter_column:
+        col = df[filter_column]
+        if filter_op == 'contains':
+            mask = col.astype(str).str.contains(str(filter_value), regex=False, na=False)
+        else:
+            try:
+                value = float(filter_value)
+                col = pd.to_numeric(col, errors='coerce')
+            except (TypeError, ValueError):
+                value = filter_value
+                col = col.astype(str)
+            ops = {
+                'eq': col == value,
+                'ne': col != value,
+                'gt': col > value,
+                'gte': col >= value,
+                'lt': col < value,
+                'lte': col <= value,
+            }
+            if filter_op not in ops:
+                raise ValueError(f'不支持的筛选条件: {filter_op}')
+            mask = ops[filter_op]
+        order = order[mask.to_numpy()]
+    if sort_by:
+        keys = df[sort_by].iloc[order]
+        ascending = sort_order != 'desc'
+        order = keys.sort_values(ascending=ascending, kind='mergesort', na_position='last').index.to_numpy()
+
+    result = [int(x) for x in order]
+    cache.set(cache_key, result, PREVIEW_ORDER_CACHE_SECONDS)
+    return result
+
+
 def process_uploaded_file(data_file):
     """
     处理上传的文件，分析数据结构和质量
@@ -2517,20 +3235,17 @@ def process_uploaded_file(data_file):
         import pandas as pd
         import numpy as np
         
-        # 读取CSV文件（更健壮：编码回退，禁用低内存分块）
-        try:
-            df = pd.read_csv(data_file.file_path, low_memory=False)
-        except Exception:
-            try:
-                df = pd.read_csv(data_file.file_path, engine='python', low_memory=False)
-            except Exception:
-                df = pd.read_csv(data_file.file_path, encoding_errors='ignore', low_memory=False)
+        # 先采样文件头部探测编码/分隔符/表头，再按探测结果只解析一次
+        csv_format = get_data_file_csv_format(data_file)
+        df = read_data_file_csv(data_file)
         
         # 更新文件信息
         data_file.total_rows = len(df)
         data_file.total_columns = len(df.columns)
         data_file.column_names = df.columns.tolist()
         data_file.data_types = df.dtypes.astype(str).to_dict()
+        # 构建行偏移索引，供分页预览随机访问任意行
+        data_file.row_index = build_row_offset_index(data_file.file_path, has_header=csv_format['has_header'])
         
         # 分析缺失值（确保为原生int以便JSON序列化）
         missing_values = {}
@@ -2545,18 +3260,8 @@ def process_uploaded_file(data_file):
         
         data_file.missing_values = missing_values
         
-        # 分析异常值（使用IQR方法，确保计数为原生int）
-        outlier_info = {}
-        for col in df.select_dtypes(include=[np.number]).columns:
-            Q1 = df[col].quantile(0.25)
-            Q3 = df[col].quantile(0.75)
-            IQR = Q3 - Q1
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-            
-            outliers = df[(df[col] < lower_bound) | (df[col] > upper_bound)]
-            if len(outliers) > 0:
-                outlier_info[col] = int(len(outliers))
+        # 分析异常值（使用IQR方法，所有数值列一次性向量化计算）
+        outlier_info = detect_outliers(df, ['iqr'])['iqr']['column_counts']
         
         data_file.outlier_info = outlier_info
         
@@ -2688,7 +3393,7 @@ def api_ml_data_files_process(request, file_id):
         else:
             import pandas as pd
             import numpy as np
-            df = pd.read_csv(data_file.file_path)
+            df = read_data_file_csv(data_file)
             for col in df.columns:
                 col_series = df[col]
                 is_numeric_series = pd.to_numeric(col_series.dropna(), errors='coerce').notnull()
@@ -2748,21 +3453,84 @@ def api_ml_data_files_process(request, file_id):
 def api_ml_data_files_preview(request, file_id):
     """
     获取数据文件预览
+    不带分页参数时返回上传时缓存的前5行；带 offset/limit（或 page/page_size）时
+    通过行偏移索引读取任意窗口，可选 sort_by/sort_order 与 filter_column/filter_op/filter_value
     """
     try:
         data_file = DataFile.objects.get(id=file_id, user=request.user)
-        
-        if not data_file.data_preview:
+
+        paging_keys = ('offset', 'limit', 'page', 'page_size', 'sort_by', 'filter_column')
+        if not any(k in request.GET for k in paging_keys):
+            if not data_file.data_preview:
+                return JsonResponse({
+                    'success': False,
+                    'message': '文件预览数据不可用'
+                })
+
             return JsonResponse({
-                'success': False,
-                'message': '文件预览数据不可用'
+                'success': True,
+                'preview': data_file.data_preview
             })
-        
+
+        import numpy as np
+        if data_file.status != 'ready':
+            return JsonResponse({'success': False, 'message': '文件状态不允许预览'})
+
+        try:
+            if 'page' in request.GET or 'page_size' in request.GET:
+                limit = int(request.GET.get('page_size', 50))
+                offset = (max(int(request.GET.get('page', 1)), 1) - 1) * limit
+            else:
+                limit = int(request.GET.get('limit', 50))
+                offset = int(request.GET.get('offset', 0))
+        except ValueError:
+            return JsonResponse({'success': False, 'message': '分页参数必须为整数'})
+        limit = min(max(limit, 1), PREVIEW_MAX_PAGE_SIZE)
+        offset = max(offset, 0)
+
+        headers = data_file.column_names or []
+        sort_by = request.GET.get('sort_by') or None
+        sort_order = request.GET.get('sort_order', 'asc')
+        filter_column = request.GET.get('filter_column') or None
+        filter_op = request.GET.get('filter_op', 'eq')
+        filter_value = request.GET.get('filter_value', '')
+        for col in (sort_by, filter_column):
+            if col and col not in headers:
+                return JsonResponse({'success': False, 'message': f'列不存在: {col}'})
+
+        index = ensure_row_offset_index(data_file)
+        if sort_by or filter_column:
+            order = _preview_row_order(data_file, sort_by, sort_order, filter_column, filter_op, filter_value)
+            total = len(order)
+            positions = order[offset:offset + limit]
+        else:
+            total = index['total_rows']
+            positions = list(range(offset, min(offset + limit, total)))
+
+        window = read_data_file_rows(data_file, positions) if positions else None
+        rows = []
+        if window is not None:
+            window = window.replace({np.nan: None, np.inf: None, -np.inf: None})
+            rows = window.values.tolist()
+
         return JsonResponse({
             'success': True,
-            'preview': data_file.data_preview
+            'preview': {
+                'headers': headers,
+                'data': rows,
+                'row_numbers': [int(p) for p in positions],
+                'offset': offset,
+                'limit': limit,
+                'total_rows': total,
+                'column_stats': (data_file.data_preview or {}).get('column_stats', []),
+            }
+        })
+
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
         })
-        
     except DataFile.DoesNotExist:
         return JsonResponse({
             'success': False,
@@ -2784,13 +3552,17 @@ def api_ml_data_files_delete(request, file_id):
     try:
         data_file = DataFile.objects.get(id=file_id, user=request.user)
         
-        # 删除物理文件
+        # 删除物理文件（共享的内容实体按引用计数释放，仅删除本记录独有的处理后文件）
         import os
-        if os.path.exists(data_file.file_path):
+        shared_path = data_file.blob.file_path if data_file.blob_id else None
+        if data_file.file_path != shared_path and os.path.exists(data_file.file_path):
             os.remove(data_file.file_path)
         
         # 删除数据库记录
+        blob_id = data_file.blob_id
         data_file.delete()
+        if blob_id:
+            release_data_blob(blob_id)
         
         return JsonResponse({
             'success': True,
@@ -2809,6 +3581,158 @@ def api_ml_data_files_delete(request, file_id):
         })
 
 
+# ==================== 异常值检测引擎 ====================
+
+OUTLIER_DETECTORS = ('iqr', 'zscore', 'mad', 'isolation_forest')
+# 仅能给出整行判定、无法定位到单元格的检测器
+ROW_ONLY_DETECTORS = ('isolation_forest',)
+
+
+def detect_outliers(df, detectors=('iqr',), columns=None, params=None):
+    """
+    对所有数值列一次性向量化检测异常值，多个检测器并行执行
+    返回 {检测器: {'cell_mask': 行×列布尔矩阵或None, 'row_mask': 每行布尔数组, 'column_counts': {列: 异常数}}}
+    参数：iqr_k(默认1.5)、zscore_threshold(默认3)、mad_threshold(默认3.5)、contamination(默认'auto')
+    """
+    import warnings
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+
+    params = params or {}
+    unknown = [d for d in detectors if d not in OUTLIER_DETECTORS]
+    if unknown:
+        raise ValueError(f'不支持的异常检测方法: {", ".join(unknown)}')
+    if columns is None:
+        columns = list(df.select_dtypes(include=[np.number]).columns)
+    values = df[columns].to_numpy(dtype=float, na_value=np.nan) if columns else np.empty((len(df), 0))
+
+    def iqr():
+        k = float(params.get('iqr_k', 1.5))
+        q1, q3 = np.nanpercentile(values, [25, 75], axis=0)
+        spread = q3 - q1
+        return (values < q1 - k * spread) | (values > q3 + k * spread)
+
+    def zscore():
+        threshold = float(params.get('zscore_threshold', 3))
+        mean = np.nanmean(values, axis=0)
+        std = np.nanstd(values, axis=0)
+        return np.abs(values - mean) > threshold * np.where(std > 0, std, np.inf)
+
+    def mad():
+        threshold = float(params.get('mad_threshold', 3.5))
+        median = np.nanmedian(values, axis=0)
+        deviation = np.nanmedian(np.abs(values - median), axis=0)
+        # 修正Z分数：0.6745 * (x - 中位数) / MAD
+        return 0.6745 * np.abs(values - median) > threshold * np.where(deviation > 0, deviation, np.inf)
+
+    def isolation_forest():
+        from sklearn.ensemble import IsolationForest
+        if values.shape[0] < 2 or values.shape[1] == 0:
+            return np.zeros(values.shape[0], dtype=bool)
+        medians = np.nan_to_num(np.nanmedian(values, axis=0))
+        filled = np.where(np.isnan(values), medians, values)
+        model = IsolationForest(
+            contamination=params.get('contamination', 'auto'), random_state=int(params.get('random_state', 42))
+        )
+        return model.fit_predict(filled) == -1
+
+    funcs = {'iqr': iqr, 'zscore': zscore, 'mad': mad, 'isolation_forest': isolation_forest}
+    with warnings.catch_warnings():
+        # 全空列的分位数/均值会产生 RuntimeWarning，结果为 NaN，比较后自然不算异常
+        warnings.simplefilter('ignore', RuntimeWarning)
+        with ThreadPoolExecutor(max_workers=max(len(detectors), 1)) as pool:
+            futures = {name: pool.submit(funcs[name]) for name in detectors}
+            raw = {name: future.result() for name, future in futures.items()}
+
+    report = {}
+    for name, mask in raw.items():
+        if name in ROW_ONLY_DETECTORS:
+            report[name] = {'cell_mask': None, 'row_mask': mask, 'column_counts': {}}
+        else:
+            counts = mask.sum(axis=0)
+            report[name] = {
+                'cell_mask': mask,
+                'row_mask': mask.any(axis=1),
+                'column_counts': {col: int(c) for col, c in zip(columns, counts) if c > 0},
+            }
+    return report
+
+
+def combine_outlier_masks(report, columns):
+    """合并多个检测器的结果：返回 (单元格掩码DataFrame或None, 行掩码)"""
+    import numpy as np
+    import pandas as pd
+    cell = None
+    row = None
+    for result in report.values():
+        row = result['row_mask'] if row is None else (row | result['row_mask'])
+        if result['cell_mask'] is not None:
+            cell = result['cell_mask'] if cell is None else (cell | result['cell_mask'])
+    cell_df = pd.DataFrame(cell, columns=columns) if cell is not None else None
+    if row is None:
+        row = np.zeros(0, dtype=bool)
+    return cell_df, row
+
+
+def get_outlier_report(data_file, detectors, params=None, columns=None, df=None):
+    """
+    获取数据文件的异常检测摘要与逐行掩码，结果按文件版本（路径、大小、修改时间）与参数缓存在 DataFile.outlier_cache
+    columns 为空时检测全部数值列；df 为调用方已读入的文件内容，未命中缓存时省去再次读取
+    """
+    import os
+    import zlib
+    import numpy as np
+    params = params or {}
+    stat = os.stat(data_file.file_path)
+    version = [data_file.file_path, stat.st_size, stat.st_mtime_ns]
+    config_key = json.dumps({'detectors': sorted(detectors), 'params': params, 'columns': columns}, sort_keys=True)
+    cache = data_file.outlier_cache or {}
+    if cache.get('version') != version:
+        cache = {'version': version, 'reports': {}}
+    if config_key in cache['reports']:
+        return cache['reports'][config_key]
+
+    if df is None:
+        df = read_data_file_csv(data_file)
+    numeric = list(df.select_dtypes(include=[np.number]).columns)
+    columns = numeric if columns is None else [c for c in columns if c in numeric]
+    report = detect_outliers(df, detectors, columns, params)
+    cell_mask, row_mask = combine_outlier_masks(report, columns)
+    summary = {
+        'total_rows': int(len(df)),
+        'columns': columns,
+        'detectors': {
+            name: {'column_counts': r['column_counts'], 'outlier_rows': int(r['row_mask'].sum())}
+            for name, r in report.items()
+        },
+        # 各列被任一逐单元格检测器判为异常的数量；只有整行检测器时为 None
+        'cell_counts': {col: int(c) for col, c in cell_mask.sum().items()} if cell_mask is not None else None,
+        'outlier_rows': int(row_mask.sum()),
+        # 逐行掩码：packbits 后压缩，每行 1 bit
+        'row_mask': base64.b64encode(zlib.compress(np.packbits(row_mask).tobytes())).decode('ascii'),
+    }
+    cache['reports'][config_key] = summary
+    data_file.outlier_cache = cache
+    data_file.save(update_fields=['outlier_cache', 'updated_at'])
+    return summary
+
+
+def outlier_report_counts(summary, columns):
+    """从检测摘要取 (各列异常单元格数, 各检测器异常行数)"""
+    cell_counts = summary['cell_counts']
+    by_column = {} if cell_counts is None else {col: cell_counts.get(col, 0) for col in columns}
+    by_detector = {name: d['outlier_rows'] for name, d in summary['detectors'].items()}
+    return by_column, by_detector
+
+
+def decode_outlier_row_mask(summary):
+    """还原缓存中的逐行掩码"""
+    import zlib
+    import numpy as np
+    packed = np.frombuffer(zlib.decompress(base64.b64decode(summary['row_mask'])), dtype=np.uint8)
+    return np.unpackbits(packed)[:summary['total_rows']].astype(bool)
+
+
 # ==================== 数据处理API ====================
 
 @login_required
@@ -2828,7 +3752,7 @@ def api_ml_missing_values_analysis(request):
         # 实际读取并处理数据
         import pandas as pd
         import numpy as np
-        df = pd.read_csv(data_file.file_path)
+        df = read_data_file_csv(data_file)
         before_rows = int(len(df))
         strategy_applied = ''
         
@@ -2988,95 +3912,81 @@ def api_ml_outliers_analysis(request):
         
         import pandas as pd
         import numpy as np
-        df = pd.read_csv(data_file.file_path)
+        df = read_data_file_csv(data_file)
         numeric_cols_all = df.select_dtypes(include=[np.number]).columns
         processed_cols = list(numeric_cols_all)
+        requested_cols = None
         if columns and isinstance(columns, list):
             # 将传入列限制到数值列交集（仅处理这些列）
-            processed_cols = [c for c in columns if c in numeric_cols_all]
-        outlier_counts_before = {}
-        outlier_counts_after_processed = {}
-        
-        # 使用IQR检测异常值阈值
-        bounds = {}
-        for col in processed_cols:
-            Q1 = df[col].quantile(0.25)
-            Q3 = df[col].quantile(0.75)
-            IQR = Q3 - Q1
-            lower = Q1 - 1.5 * IQR
-            upper = Q3 + 1.5 * IQR
-            bounds[col] = (lower, upper)
-            outlier_counts_before[col] = int(((df[col] < lower) | (df[col] > upper)).sum())
+            processed_cols = requested_cols = [c for c in columns if c in numeric_cols_all]
+        detectors = data.get('detectors') or ['iqr']
+        if isinstance(detectors, str):
+            detectors = [detectors]
+        detector_params = data.get('detector_params') or {}
+        if any(d in ROW_ONLY_DETECTORS for d in detectors) and strategy in ('mean', 'median'):
+            return JsonResponse({'success': False, 'message': '孤立森林只能判定整行异常，不支持均值/中位数替换'})
+        
+        # 处理前的检测结果走 DataFile.outlier_cache（未指定列时与检测接口共用缓存）
+        try:
+            summary = get_outlier_report(data_file, detectors, detector_params, columns=requested_cols, df=df)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'message': str(e)})
+        outlier_counts_before, row_outliers_before = outlier_report_counts(summary, processed_cols)
         
         strategy_applied = ''
         if strategy == 'keep':
             strategy_applied = '保留异常值，不做处理'
         elif strategy == 'remove':
-            # 对所有数值列超出阈值的行进行删除
-            mask = None
-            for col in processed_cols:
-                lower, upper = bounds[col]
-                col_mask = (df[col] < lower) | (df[col] > upper)
-                mask = col_mask if mask is None else (mask | col_mask)
+            # 删除任一检测器判定为异常的行
             before_rows = len(df)
-            df = df[~mask]
+            df = df[~decode_outlier_row_mask(summary)]
             strategy_applied = f'删除含异常值的行，行数 {before_rows} -> {len(df)}'
         elif strategy == 'cap':
             # 使用分位点截断（winsorize）
-            for col in processed_cols:
-                lower_q = df[col].quantile(cap_percentile)
-                upper_q = df[col].quantile(1 - cap_percentile)
-                df[col] = df[col].clip(lower_q, upper_q)
+            if processed_cols:
+                lower_q = df[processed_cols].quantile(cap_percentile)
+                upper_q = df[processed_cols].quantile(1 - cap_percentile)
+                df[processed_cols] = df[processed_cols].clip(lower_q, upper_q, axis=1)
             strategy_applied = f'按分位点({cap_percentile:.2%},{(1-cap_percentile):.2%})截断异常值'
-        elif strategy == 'mean':
-            # 将异常值替换为列均值
-            for col in processed_cols:
-                Q1 = df[col].quantile(0.25)
-                Q3 = df[col].quantile(0.75)
-                IQR = Q3 - Q1
-                lower = Q1 - 1.5 * IQR
-                upper = Q3 + 1.5 * IQR
-                mean_val = df[col].mean()
-                mask = (df[col] < lower) | (df[col] > upper)
-                df.loc[mask, col] = mean_val
-            strategy_applied = '将异常值替换为均值'
-        elif strategy == 'median':
-            # 将异常值替换为列中位数
-            for col in processed_cols:
-                Q1 = df[col].quantile(0.25)
-                Q3 = df[col].quantile(0.75)
-                IQR = Q3 - Q1
-                lower = Q1 - 1.5 * IQR
-                upper = Q3 + 1.5 * IQR
-                median_val = df[col].median()
-                mask = (df[col] < lower) | (df[col] > upper)
-                df.loc[mask, col] = median_val
-            strategy_applied = '将异常值替换为中位数'
+        elif strategy in ('mean', 'median'):
+            # 将异常值替换为列均值/中位数
+            if processed_cols:
+                # 缓存只保存逐行掩码，替换需要逐单元格掩码，此处按处理列检测
+                report = detect_outliers(df, detectors, processed_cols, detector_params)
+                cell_mask, _ = combine_outlier_masks(report, processed_cols)
+                sub = df[processed_cols]
+                fill = sub.mean() if strategy == 'mean' else sub.median()
+                cell_mask.index = df.index
+                df[processed_cols] = sub.mask(cell_mask, fill, axis=1)
+            strategy_applied = '将异常值替换为均值' if strategy == 'mean' else '将异常值替换为中位数'
         elif strategy == 'transform':
             # 对长尾分布进行对数转换（仅对>0的列）
-            for col in processed_cols:
-                positive_mask = df[col] > 0
-                if positive_mask.any():
-                    df.loc[positive_mask, col] = np.log1p(df.loc[positive_mask, col])
+            if processed_cols:
+                sub = df[processed_cols]
+                df[processed_cols] = sub.mask(sub > 0, np.log1p(sub.where(sub > 0)))
             strategy_applied = '对正数的数值列进行log1p转换'
         else:
             return JsonResponse({'success': False, 'message': '不支持的异常值处理策略'})
         
-        # 计算处理后异常值数量（仅对处理列或在删除策略下对全部数值列）
-        recalc_cols = list(df.select_dtypes(include=[np.number]).columns) if strategy == 'remove' else processed_cols
-        for col in recalc_cols:
-            Q1 = df[col].quantile(0.25)
-            Q3 = df[col].quantile(0.75)
-            IQR = Q3 - Q1
-            lower = Q1 - 1.5 * IQR
-            upper = Q3 + 1.5 * IQR
-            outlier_counts_after_processed[col] = int(((df[col] < lower) | (df[col] > upper)).sum())
-        
         # 保存处理后的文件
         import os
         base_dir, name = os.path.split(data_file.file_path)
         processed_path = os.path.join(base_dir, f"processed_outlier_{data_file.filename}")
         df.to_csv(processed_path, index=False)
+        data_file.file_path = processed_path
+        
+        # 计算处理后异常值数量（仅对处理列或在删除策略下对全部数值列）；
+        # 保留策略不改变数据，直接沿用处理前结果，其余策略的结果按新文件版本写入缓存供后续检测复用
+        if strategy == 'keep':
+            outlier_counts_after_processed, row_outliers_after = outlier_counts_before, row_outliers_before
+        else:
+            after_summary = get_outlier_report(
+                data_file, detectors, detector_params,
+                columns=None if strategy == 'remove' else requested_cols, df=df,
+            )
+            outlier_counts_after_processed, row_outliers_after = outlier_report_counts(
+                after_summary, after_summary['columns']
+            )
         
         # 更新模型中的统计信息
         if strategy == 'remove':
@@ -3096,7 +4006,6 @@ def api_ml_outliers_analysis(request):
             data_file.outlier_info = updated
         # 覆盖数据文件路径为最新处理后的文件，并更新基础统计
         try:
-            data_file.file_path = processed_path
             data_file.file_size = os.path.getsize(processed_path)
             data_file.total_rows = int(len(df))
             data_file.total_columns = int(len(df.columns))
@@ -3152,8 +4061,10 @@ def api_ml_outliers_analysis(request):
             user=request.user,
             data_file=data_file,
             processing_type='outlier_detection',
-            parameters={'strategy': strategy, 'cap_percentile': cap_percentile},
-            result_summary={'before': outlier_counts_before, 'after': outlier_counts_after_processed},
+            parameters={'strategy': strategy, 'cap_percentile': cap_percentile,
+                        'detectors': detectors, 'detector_params': detector_params},
+            result_summary={'before': outlier_counts_before, 'after': outlier_counts_after_processed,
+                            'rows_before': row_outliers_before, 'rows_after': row_outliers_after},
             processing_log=f"应用策略：{strategy_applied}，保存为：{processed_path}"
         )
         
@@ -3161,7 +4072,9 @@ def api_ml_outliers_analysis(request):
             'success': True,
             'message': f'异常值处理完成，使用策略：{strategy}',
             'outliers_before': outlier_counts_before,
-            'outliers_after': outlier_counts_after_processed
+            'outliers_after': outlier_counts_after_processed,
+            'outlier_rows_before': row_outliers_before,
+            'outlier_rows_after': row_outliers_after
         })
         
     except DataFile.DoesNotExist:
@@ -3176,11 +4089,166 @@ def api_ml_outliers_analysis(request):
         })
 
 
+@login_required
+@require_http_methods(["GET"])
+def api_ml_outliers_detect(request, file_id):
+    """
+    多检测器异常检测（不修改文件），返回各检测器统计与异常行号，结果按文件版本缓存
+    """
+    try:
+        data_file = DataFile.objects.get(id=file_id, user=request.user)
+        detectors = [d for d in request.GET.get('detectors', 'iqr').split(',') if d]
+        params = {}
+        for key in ('iqr_k', 'zscore_threshold', 'mad_threshold'):
+            if request.GET.get(key):
+                params[key] = float(request.GET[key])
+        if request.GET.get('contamination'):
+            value = request.GET['contamination']
+            params['contamination'] = value if value == 'auto' else float(value)
+
+        summary = get_outlier_report(data_file, detectors, params)
+        result = {k: v for k, v in summary.items() if k != 'row_mask'}
+        if request.GET.get('include_rows') in ('1', 'true'):
+            import numpy as np
+            result['outlier_row_positions'] = np.flatnonzero(decode_outlier_row_mask(summary)).tolist()
+        return JsonResponse({'success': True, **result})
+    except DataFile.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'message': '文件不存在或无权限访问'
+        })
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
+        })
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': f'异常检测失败: {str(e)}'
+        })
+
+
+def compute_split_labels(data_file, method, params):
+    """
+    计算每行所属分区标签（不复制数据）
+    只在分层/分组/时间划分时读取对应的一列，随机划分直接使用行偏移索引中的行数
+    返回 (int8标签数组, 折数)
+    """
+    import numpy as np
+    import pandas as pd
+    from sklearn.model_selection import train_test_split, KFold, StratifiedKFold, GroupKFold, GroupShuffleSplit
+
+    n_rows = ensure_row_offset_index(data_file)['total_rows']
+    seed = int(params.get('random_state', 42))
+    column_param = {'stratified': 'stratify_column', 'group': 'group_column', 'time': 'time_column'}.get(method)
+    if method == 'kfold':
+        if params.get('stratify_column'):
+            column_param = 'stratify_column'
+        elif params.get('group_column'):
+            column_param = 'group_column'
+
+    column = None
+    if column_param:
+        column_name = params.get(column_param)
+        if not column_name:
+            raise ValueError(f'缺少参数: {column_param}')
+        if column_name not in (data_file.column_names or []):
+            raise ValueError(f'列不存在: {column_name}')
+        column = read_data_file_csv(data_file, usecols=[column_name])[column_name]
+        n_rows = len(column)
+
+    rows = np.arange(n_rows)
+    labels = np.full(n_rows, DataSplit.PART_TRAIN, dtype=np.int8)
+
+    if method == 'kfold':
+        n_splits = int(params.get('n_splits', 5))
+        if n_splits < 2 or n_splits > n_rows:
+            raise ValueError('折数必须不小于2且不超过数据行数')
+        if column_param == 'stratify_column':
+            folds = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed).split(rows, column)
+        elif column_param == 'group_column':
+            folds = GroupKFold(n_splits=n_splits).split(rows, groups=column)
+        else:
+            folds = KFold(n_splits=n_splits, shuffle=True, random_state=seed).split(rows)
+        for fold, (_, test_idx) in enumerate(folds):
+            labels[test_idx] = fold
+        return labels, n_splits
+
+    train_ratio = float(params.get('train_ratio', 0.8))
+    test_ratio = float(params.get('test_ratio', 0.2))
+    validation_ratio = float(params.get('validation_ratio', 0.0))
+    if test_ratio <= 0:
+        raise ValueError('测试集比例必须大于0')
+    # 与原有文件划分一致：验证集按训练+验证中的相对比例切分
+    val_relative = validation_ratio / (train_ratio + validation_ratio) if validation_ratio > 0 else 0
+
+    if method == 'time':
+        keys = pd.to_numeric(column, errors='coerce')
+        if keys.isnull().all():
+            keys = pd.to_datetime(column, errors='coerce')
+        order = keys.sort_values(kind='mergesort', na_position='first').index.to_numpy()
+        n_test = int(round(n_rows * test_ratio))
+        n_val = int(round((n_rows - n_test) * val_relative))
+        n_train = n_rows - n_test - n_val
+        labels[order[n_train:n_train + n_val]] = DataSplit.PART_VALIDATION
+        labels[order[n_train + n_val:]] = DataSplit.PART_TEST
+        return labels, 0
+
+    if method == 'group':
+        splitter = GroupShuffleSplit(n_splits=1, test_size=test_ratio, random_state=seed)
+        train_val_idx, test_idx = next(splitter.split(rows, groups=column))
+        labels[test_idx] = DataSplit.PART_TEST
+        if val_relative > 0:
+            splitter = GroupShuffleSplit(n_splits=1, test_size=val_relative, random_state=seed)
+            _, val_pos = next(splitter.split(train_val_idx, groups=column.iloc[train_val_idx]))
+            labels[train_val_idx[val_pos]] = DataSplit.PART_VALIDATION
+        return labels, 0
+
+    stratify = column if method == 'stratified' else None
+    train_val_idx, test_idx = train_test_split(rows, test_size=test_ratio, random_state=seed, stratify=stratify)
+    labels[test_idx] = DataSplit.PART_TEST
+    if val_relative > 0:
+        stratify = column.iloc[train_val_idx] if method == 'stratified' else None
+        _, val_idx = train_test_split(train_val_idx, test_size=val_relative, random_state=seed, stratify=stratify)
+        labels[val_idx] = DataSplit.PART_VALIDATION
+    return labels, 0
+
+
+def serialize_data_split(split):
+    """数据集划分的JSON表示"""
+    from zoneinfo import ZoneInfo
+    cn_tz = ZoneInfo('Asia/Shanghai')
+    if split.method == 'kfold':
+        parts = {f'fold_{k}': v for k, v in sorted(split.summary.items(), key=lambda kv: int(kv[0]))}
+    else:
+        parts = {
+            'train_rows': split.summary.get(str(DataSplit.PART_TRAIN), 0),
+            'test_rows': split.summary.get(str(DataSplit.PART_TEST), 0),
+            'validation_rows': split.summary.get(str(DataSplit.PART_VALIDATION), 0),
+        }
+    return {
+        'id': split.id,
+        'data_file_id': split.data_file_id,
+        'name': split.name,
+        'method': split.method,
+        'method_display': split.get_method_display(),
+        'parameters': split.parameters,
+        'n_folds': split.n_folds,
+        'total_rows': split.source_rows,
+        'parts': parts,
+        'is_stale': split.is_stale(),
+        'created_at': split.created_at.astimezone(cn_tz).strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
 @login_required
 @require_http_methods(["POST"])
 def api_ml_data_split(request):
     """
     数据分割
+    默认仅保存每行的分区标签（DataSplit），支持 random/stratified/group/time/kfold；
+    传入 materialize=true 时沿用原有方式写出训练/测试CSV文件
     """
     try:
         data = json.loads(request.body)
@@ -3195,12 +4263,52 @@ def api_ml_data_split(request):
             return JsonResponse({'success': False, 'message': '比例之和不能超过1'})
         
         data_file = DataFile.objects.get(id=file_id, user=request.user)
-        
+
+        if not data.get('materialize'):
+            method = data.get('method', 'random')
+            if method not in dict(DataSplit.METHOD_CHOICES):
+                return JsonResponse({'success': False, 'message': '不支持的划分方式'})
+            param_keys = ('train_ratio', 'test_ratio', 'validation_ratio', 'random_state', 'n_splits',
+                          'stratify_column', 'group_column', 'time_column')
+            params = {k: data[k] for k in param_keys if data.get(k) not in (None, '')}
+            try:
+                labels, n_folds = compute_split_labels(data_file, method, params)
+            except ValueError as e:
+                return JsonResponse({'success': False, 'message': str(e)})
+
+            split = DataSplit(
+                user=request.user,
+                data_file=data_file,
+                name=data.get('name') or f"{data_file.original_filename} - {dict(DataSplit.METHOD_CHOICES)[method]}",
+                method=method,
+                parameters=params,
+                n_folds=n_folds,
+                source_rows=len(labels),
+            )
+            split.set_source_version()
+            split.set_labels(labels)
+            split.save()
+
+            DataProcessingLog.objects.create(
+                user=request.user,
+                data_file=data_file,
+                processing_type='data_split',
+                parameters={'method': method, **params},
+                result_summary=split.summary,
+                processing_log=f"保存为行索引划分 #{split.id}（{split.get_method_display()}），未复制数据文件"
+            )
+
+            return JsonResponse({
+                'success': True,
+                'message': '数据划分完成',
+                'split': serialize_data_split(split)
+            })
+
         import pandas as pd
         from sklearn.model_selection import train_test_split
         import os
         
-        df = pd.read_csv(data_file.file_path)
+        df = read_data_file_csv(data_file)
         total_rows = len(df)
         
         # 先切分出测试集
@@ -3360,6 +4468,50 @@ def api_ml_data_split(request):
         })
 
 
+@login_required
+@require_http_methods(["GET"])
+def api_ml_data_splits_list(request, file_id):
+    """
+    获取数据文件的行索引划分列表
+    """
+    try:
+        data_file = DataFile.objects.get(id=file_id, user=request.user)
+        splits = DataSplit.objects.filter(data_file=data_file).select_related('data_file')
+        return JsonResponse({
+            'success': True,
+            'splits': [serialize_data_split(s) for s in splits]
+        })
+    except DataFile.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'message': '文件不存在或无权限访问'
+        })
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': f'获取划分列表失败: {str(e)}'
+        })
+
+
+@login_required
+@require_http_methods(["DELETE"])
+def api_ml_data_split_delete(request, split_id):
+    """
+    删除行索引划分（不涉及任何数据文件）
+    """
+    try:
+        DataSplit.objects.get(id=split_id, user=request.user).delete()
+        return JsonResponse({
+            'success': True,
+            'message': '划分已删除'
+        })
+    except DataSplit.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'message': '划分不存在或无权限访问'
+        })
+
+
 # ==================== 机器学习算法API ====================
 
 @login_required
@@ -3547,6 +4699,33 @@ def api_ml_tasks_create(request):
                 'success': False,
                 'message': '数据文件不存在或无权限访问'
             })
+
+        # 可选：直接使用行索引划分（不需要独立的训练/测试文件）
+        data_split = None
+        split_fold = None
+        if data.get('data_split'):
+            try:
+                data_split = DataSplit.objects.get(id=data['data_split'], data_file=data_file, user=request.user)
+            except DataSplit.DoesNotExist:
+                return JsonResponse({
+                    'success': False,
+                    'message': '数据集划分不存在或不属于该数据文件'
+                })
+            if data_split.is_stale():
+                return JsonResponse({
+                    'success': False,
+                    'message': '数据文件已被修改，该划分已失效，请重新划分'
+                })
+            if data_split.method == 'kfold':
+                try:
+                    split_fold = int(data.get('split_fold', 0))
+                except (TypeError, ValueError):
+                    split_fold = -1
+                if not (0 <= split_fold < data_split.n_folds):
+                    return JsonResponse({
+                        'success': False,
+                        'message': f'折编号必须在 0 到 {data_split.n_folds - 1} 之间'
+                    })
         
         # 验证算法
         try:
@@ -3569,6 +4748,8 @@ def api_ml_tasks_create(request):
             data_file=data_file,
             train_data_file=train_data_file,
             test_data_file=test_data_file,
+            data_split=data_split,
+            split_fold=split_fold,
             target_column=target_column,
             feature_columns=feature_columns,
             train_ratio=data.get('train_ratio', 0.8),
@@ -3630,6 +4811,8 @@ def api_ml_tasks_detail(request, task_id):
                 'data_file_name': task.data_file.original_filename,
                 'train_data_file_name': task.train_data_file.original_filename if task.train_data_file else '未指定',
                 'test_data_file_name': task.test_data_file.original_filename if task.test_data_file else '未指定',
+                'data_split_id': task.data_split_id,
+                'split_fold': task.split_fold,
                 'target_column': task.target_column,
                 'feature_columns': task.feature_columns,
                 'train_ratio': task.train_ratio,
@@ -3849,8 +5032,8 @@ def perform_real_ml_training(task):
                 return {'success': False, 'error': error_msg}
             
             print("开始读取CSV文件...")
-            df_train = pd.read_csv(train_file_path)
-            df_test = pd.read_csv(test_file_path)
+            df_train = read_data_file_csv(task.train_data_file)
+            df_test = read_data_file_csv(task.test_data_file)
             print(f"文件读取成功: 训练集{len(df_train)}行, 测试集{len(df_test)}行")
             
             task.training_log += f"训练集加载完成，共 {len(df_train)} 行，{len(df_train.columns)} 列\n"
@@ -3859,14 +5042,34 @@ def perform_real_ml_training(task):
             
             # 直接使用训练集和测试集，不需要分割
             use_separate_files = True
-            
+
+        elif task.data_split_id:
+            # 使用行索引划分：只读取一次源文件，按行号取出训练/测试集
+            split = task.data_split
+            data_file_path = task.data_file.file_path
+            if not os.path.exists(data_file_path):
+                return {'success': False, 'error': f'数据文件不存在: {data_file_path}'}
+            if split.is_stale():
+                return {'success': False, 'error': '数据文件已被修改，数据集划分已失效，请重新划分'}
+
+            usecols = list(dict.fromkeys(list(task.feature_columns or []) + [task.target_column]))
+            df = read_data_file_csv(task.data_file, usecols=lambda c: c in usecols)
+            train_idx, test_idx = split.get_train_test_indices(task.split_fold)
+            df_train = df.iloc[train_idx]
+            df_test = df.iloc[test_idx]
+
+            fold_desc = f"，测试折 {task.split_fold}" if split.method == 'kfold' else ''
+            task.training_log += f"使用数据集划分「{split.name}」{fold_desc}：训练集 {len(df_train)} 行，测试集 {len(df_test)} 行\n"
+            task.save()
+            use_separate_files = True
+
         else:
             # 使用原始数据文件进行分割
             data_file_path = task.data_file.file_path
             if not os.path.exists(data_file_path):
                 return {'success': False, 'error': f'数据文件不存在: {data_file_path}'}
             
-            df = pd.read_csv(data_file_path)
+            df = read_data_file_csv(task.data_file)
             task.training_log += f"数据加载完成，共 {len(df)} 行，{len(df.columns)} 列\n"
             task.save()
             use_separate_files = False
@@ -4709,6 +5912,7 @@ def fill_container(request):
 def api_preparator_filter_tasks(request):
     """
     备料员任务筛选接口
+    可选 station=gcms（启用了该工站）、reagent=试剂名（用到该试剂），均在工站需求索引上筛选
     """
     if not request.user.is_preparator():
         return JsonResponse({"ok": False, "message": "权限不足"}, status=403)
@@ -4716,6 +5920,8 @@ def api_preparator_filter_tasks(request):
     username = request.GET.get("username")
     status = request.GET.get("status")
     search = request.GET.get("search")
+    station = (request.GET.get("station") or "").strip()
+    reagent = (request.GET.get("reagent") or "").strip()
 
     # 构建查询 - 备料员可以看到所有任务
     qs = Task.objects.select_related("created_by").order_by("-created_at")
@@ -4723,6 +5929,23 @@ def api_preparator_filter_tasks(request):
     if username:
         qs = qs.filter(created_by__username=username)
 
+    if station:
+        qs = qs.filter(
+            models.Exists(
+                TaskStationRequirement.objects.filter(
+                    task=models.OuterRef("pk"),
+                    station_key=station,
+                    material_type=TaskStationRequirement.STATION,
+                )
+            )
+        )
+    if reagent:
+        qs = qs.filter(
+            models.Exists(
+                TaskStationRequirement.objects.filter(task=models.OuterRef("pk"), reagent_name=reagent)
+            )
+        )
+
     if status:
         # 兼容中文状态与英文枚举
         status_mapping_cn = {
@@ -4751,21 +5974,39 @@ def api_preparator_filter_tasks(request):
             qs = qs.filter(status=status_value)
 
     if search:
-        qs = qs.filter(name__icontains=search)
-
-    # 分页处理
-    page_num = request.GET.get("page") or "1"
-    try:
-        page_num_int = int(page_num)
-    except Exception:
-        page_num_int = 1
+        # 全文检索（名称/备注/工站/试剂）；页码分页按命中权重排序，游标分页固定按创建时间倒序
+        keyset = "cursor" in request.GET
+        qs = TaskSearchToken.search(qs, search, ranked=not keyset)
+        if not keyset:
+            qs = qs.order_by("-search_rank", "-created_at")
+
+    # 分页处理：传 cursor 参数时使用游标分页，否则沿用页码分页
+    if "cursor" in request.GET:
+        try:
+            page_tasks, page_meta = keyset_paginate_tasks(request, qs, 10)
+        except ValueError:
+            return JsonResponse({"ok": False, "message": "无效的游标"}, status=400)
+    else:
+        page_num = request.GET.get("page") or "1"
+        try:
+            page_num_int = int(page_num)
+        except Exception:
+            page_num_int = 1
 
-    paginator = Paginator(qs, 10)
-    page_obj = paginator.get_page(page_num_int)
+        paginator = Paginator(qs, 10)
+        page_obj = paginator.get_page(page_num_int)
+        page_tasks = page_obj.object_list
+        page_meta = {
+            "total_pages": paginator.num_pages,
+            "current_page": page_obj.number,
+            "has_previous": page_obj.has_previous(),
+            "has_next": page_obj.has_next(),
+            "total_count": paginator.count,
+        }
 
     # 序列化任务数据
     tasks_data = []
-    for task in page_obj.object_list:
+    for task in page_tasks:
         tasks_data.append(
             {
                 "id": task.id,
@@ -4778,17 +6019,7 @@ def api_preparator_filter_tasks(request):
             }
         )
 
-    return JsonResponse(
-        {
-            "ok": True,
-            "tasks": tasks_data,
-            "total_pages": paginator.num_pages,
-            "current_page": page_obj.number,
-            "has_previous": page_obj.has_previous(),
-            "has_next": page_obj.has_next(),
-            "total_count": paginator.count,
-        }
-    )
+    return JsonResponse({"ok": True, "tasks": tasks_data, **page_meta})
 
 
 @login_required
@@ -4858,62 +6089,8 @@ def api_reagents_stats(request: HttpRequest):
     if not request.user.is_preparator():
         return JsonResponse({"ok": False, "message": "权限不足"}, status=403)
 
-    # 筛选条件
-    q = Reagent.objects.all()
-    name_kw = (request.GET.get("name") or "").strip()
-    cas_kw = (request.GET.get("cas") or "").strip()
-    formula_kw = (request.GET.get("formula") or "").strip()
-    q_kw = (request.GET.get("q") or "").strip()
-    rtype = (request.GET.get("type") or "").strip()  # solid|liquid
-    hazard = (request.GET.get("hazard") or "").strip()  # general/...
     # 统计不应用“card”筛选，避免点击某卡后其余卡片数字受限
-    if name_kw:
-        q = q.filter(name__icontains=name_kw)
-    if cas_kw:
-        q = q.filter(cas__icontains=cas_kw)
-    if formula_kw:
-        q = q.filter(formula__icontains=formula_kw)
-    if q_kw:
-        from django.db.models import Q
-        q = q.filter(Q(name__icontains=q_kw) | Q(cas__icontains=q_kw) | Q(formula__icontains=q_kw))
-    if rtype in (ReagentType.SOLID, ReagentType.LIQUID):
-        q = q.filter(reagent_type=rtype)
-    if hazard in dict(HazardType.choices):
-        q = q.filter(hazard_type=hazard)
-    today = timezone.now().date()
-
-    total = q.count()
-    liquid = q.filter(reagent_type=ReagentType.LIQUID).count()
-    solid = q.filter(reagent_type=ReagentType.SOLID).count()
-    hazardous = q.exclude(hazard_type=HazardType.GENERAL).count()
-    # 缺料与过期：以查询遍历判断（数量通常不大；若需要可转为DB表达式）
-    low_stock = 0
-    expiring = 0
-    for r in q.only("id", "quantity", "warning_threshold", "expiry_date"):
-        try:
-            if r.quantity is not None and r.warning_threshold is not None and r.quantity <= r.warning_threshold:
-                low_stock += 1
-        except Exception:
-            pass
-        try:
-            if r.expiry_date and today > r.expiry_date:
-                expiring += 1
-        except Exception:
-            pass
-
-    return JsonResponse(
-        {
-            "ok": True,
-            "stats": {
-                "total": total,
-                "liquid": liquid,
-                "solid": solid,
-                "hazardous": hazardous,
-                "lowStock": low_stock,
-                "expiring": expiring,
-            },
-        }
-    )
+    return JsonResponse({"ok": True, "stats": reagent_stats(request.GET)})
 
 
 @login_required
@@ -5246,6 +6423,25 @@ def api_reagent_take(request: HttpRequest, reagent_id: int):
         return JsonResponse({"ok": False, "message": str(e)}, status=400)
 
 
+@login_required
+@require_http_methods(["POST"])
+def api_reagent_reservations_release(request: HttpRequest):
+    """释放本人的试剂预留，入参: {"ids": [1,2]}"""
+    if not request.user.is_preparator():
+        return JsonResponse({"ok": False, "message": "权限不足"}, status=403)
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"ok": False, "message": "无效的JSON"}, status=400)
+    ids = payload.get("ids")
+    if not isinstance(ids, list) or not ids:
+        return JsonResponse({"ok": False, "message": "请选择要释放的预留"}, status=400)
+    released = ReagentReservation.objects.filter(
+        id__in=ids, created_by=request.user, status=ReagentReservation.Status.ACTIVE
+    ).update(status=ReagentReservation.Status.RELEASED, updated_at=timezone.now())
+    return JsonResponse({"ok": True, "released": released})
+
+
 @login_required
 @ensure_csrf_cookie
 @require_http_methods(["GET"])
@@ -5300,6 +6496,35 @@ def api_reagent_detail(request: HttpRequest, reagent_id: int):
     return JsonResponse({"ok": True, "reagent": data})
 
 
+@login_required
+@require_http_methods(["GET"])
+def api_reagent_operations(request: HttpRequest, reagent_id: int):
+    """试剂操作日志（含已归档的日志）"""
+    if not request.user.is_preparator():
+        return JsonResponse({"ok": False, "message": "权限不足"}, status=403)
+    if not Reagent.objects.filter(id=reagent_id).exists():
+        return JsonResponse({"ok": False, "message": "试剂不存在"}, status=404)
+    labels = dict(ReagentOperation.Type.choices)
+    rows = load_history("reagent_operation", reagent_id)
+    users = usernames_for(rows, "operated_by_id")
+    operations = [
+        {
+            "id": row["id"],
+            "type": row["operation_type"],
+            "type_display": labels.get(row["operation_type"], row["operation_type"]),
+            "amount": row["amount"],
+            "unit": row["unit"],
+            "before_quantity": row["before_quantity"],
+            "after_quantity": row["after_quantity"],
+            "remark": row["remark"],
+            "operated_by": users.get(row["operated_by_id"], ""),
+            "operated_at": row["operated_at"],
+        }
+        for row in rows
+    ]
+    return JsonResponse({"ok": True, "operations": operations})
+
+
 @login_required
 @ensure_csrf_cookie
 @require_http_methods(["GET"])
@@ -5431,12 +6656,133 @@ def preparation_station(request):
 # region 物料与转移仓 API（备料员/管理员）
 
 
+# 物料统一索引：物料类型 -> (模型, 显示名)，按此顺序参与 UNION
+MATERIAL_INDEX_MODELS = {
+    "test_tube_15": (TestTube15, "15mL试管"),
+    "laiyu_powder": (LaiyuPowder, "铼羽粉筒"),
+    "jingtai_powder": (JingtaiPowder, "晶泰粉筒"),
+    "reagent_bottle_150": (ReagentBottle150, "150mL试剂瓶"),
+}
+MATERIAL_STATE_LABELS = dict(TestTube15.State.choices)
+
+
+def encode_material_cursor(row):
+    """将物料的 (created_at, kind, id) 编码为游标"""
+    raw = f"{row['created_at'].isoformat()}|{row['kind']}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_material_cursor(cursor):
+    """解析物料游标，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, kind, material_id = raw.rsplit("|", 2)
+        return datetime.fromisoformat(created_at), kind, int(material_id)
+    except (binascii.Error, UnicodeError) as e:
+        raise ValueError(str(e))
+
+
+def materials_index_page(request):
+    """
+    四类物料按 (created_at, kind, id) 倒序的 UNION ALL 游标分页
+    过滤与游标条件下推到各子查询，各子查询按 (created_at, id) 倒序各取 page_size + 1 行后再合并，
+    由各表 (created_at, id) / (state, created_at) / current_container 索引支撑，不扫描整表；
+    数据库不支持复合查询内排序/截取时（如 SQLite）逐表查询后在内存中合并；
+    状态显示名按字典映射，不逐行调用 get_state_display()
+    """
+    kind = (request.GET.get("kind") or "").strip()
+    state = (request.GET.get("state") or "").strip()
+    name_prefix = (request.GET.get("name_prefix") or "").strip()
+    name_kw = (request.GET.get("name") or "").strip()
+    container_id = (request.GET.get("container_id") or "").strip()
+    cursor = (request.GET.get("cursor") or "").strip()
+    try:
+        page_size = max(1, min(int(request.GET.get("page_size", 50)), 200))
+        after = decode_material_cursor(cursor) if cursor else None
+        container_id = int(container_id) if container_id else None
+    except ValueError:
+        return JsonResponse({"ok": False, "message": "分页参数无效"}, status=400)
+    if kind and kind not in MATERIAL_INDEX_MODELS:
+        return JsonResponse({"ok": False, "message": "物料类型无效"}, status=400)
+
+    parts = []
+    for code, (model, _) in MATERIAL_INDEX_MODELS.items():
+        if kind and code != kind:
+            continue
+        qs = model.objects.all()
+        if state:
+            qs = qs.filter(state=state)
+        if name_prefix:
+            qs = qs.filter(name__startswith=name_prefix)
+        if name_kw:
+            qs = qs.filter(name__icontains=name_kw)
+        if container_id is not None:
+            qs = qs.filter(current_container_id=container_id)
+        if after:
+            created_at, after_kind, after_id = after
+            # 排序键中 kind 升序，同一子查询内 kind 为常量，条件可化简
+            if code > after_kind:
+                qs = qs.filter(created_at__lte=created_at)
+            elif code == after_kind:
+                qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=after_id))
+            else:
+                qs = qs.filter(created_at__lt=created_at)
+        parts.append(
+            qs.annotate(kind=Value(code, output_field=CharField()))
+            .values("id", "name", "state", "current_container_id", "created_at", "kind")
+            .order_by("-created_at", "-id")[: page_size + 1]
+        )
+
+    rows = []
+    if len(parts) == 1:
+        rows = list(parts[0])
+    elif parts and connection.features.supports_slicing_ordering_in_compound:
+        rows = list(parts[0].union(*parts[1:], all=True).order_by("-created_at", "kind", "-id")[: page_size + 1])
+    elif parts:
+        for part in parts:
+            rows.extend(part)
+        # 依次按次要键排序（稳定排序），得到 created_at 倒序、kind 升序、id 倒序
+        rows.sort(key=lambda r: r["id"], reverse=True)
+        rows.sort(key=lambda r: r["kind"])
+        rows.sort(key=lambda r: r["created_at"], reverse=True)
+        rows = rows[: page_size + 1]
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    items = [
+        {
+            "id": row["id"],
+            "name": row["name"],
+            "kind": MATERIAL_INDEX_MODELS[row["kind"]][1],
+            "kind_code": row["kind"],
+            "state": MATERIAL_STATE_LABELS.get(row["state"], row["state"]),
+            "current_container_id": row["current_container_id"],
+            "created_at": timezone.localtime(row["created_at"]).strftime("%Y-%m-%d %H:%M"),
+        }
+        for row in rows
+    ]
+    return JsonResponse(
+        {
+            "ok": True,
+            "materials": items,
+            "page_size": page_size,
+            "has_next": has_next,
+            "next_cursor": encode_material_cursor(rows[-1]) if has_next else None,
+        }
+    )
+
+
 @login_required
 @ensure_csrf_cookie
 @require_http_methods(["GET"])
 def api_materials(request: HttpRequest):
+    """
+    物料列表：传 cursor 参数（首页传空）时走统一索引的游标分页，
+    支持 kind / state / name_prefix / container_id 过滤；否则保持原有的全量返回
+    """
     if not request.user.is_preparator() and not request.user.is_admin():
         return JsonResponse({"ok": False, "message": "权限不足"}, status=403)
+    if "cursor" in request.GET:
+        return materials_index_page(request)
     name_kw = (request.GET.get("name") or "").strip()
     kind_filter = (
         request.GET.get("kind") or ""
@@ -5493,24 +6839,7 @@ def api_materials(request: HttpRequest):
 def api_materials_stats(request: HttpRequest):
     if not request.user.is_preparator() and not request.user.is_admin():
         return JsonResponse({"ok": False, "message": "权限不足"}, status=403)
-    total = (
-        TestTube15.objects.count()
-        + LaiyuPowder.objects.count()
-        + JingtaiPowder.objects.count()
-        + ReagentBottle150.objects.count()
-    )
-    return JsonResponse(
-        {
-            "ok": True,
-            "total": total,
-            "by_kind": {
-                "test_tube_15": TestTube15.objects.count(),
-                "laiyu_powder": LaiyuPowder.objects.count(),
-                "jingtai_powder": JingtaiPowder.objects.count(),
-                "reagent_bottle_150": ReagentBottle150.objects.count(),
-            },
-        }
-    )
+    return JsonResponse({"ok": True, **material_stats()})
 
 
 @login_required
@@ -5604,23 +6933,7 @@ def api_containers_stats(request):
     if not request.user.is_preparator() and not request.user.is_admin():
         return JsonResponse({"ok": False, "message": "权限不足"}, status=403)
 
-    from django.db.models import Count as DCount
-
-    by_code_qs = (
-        Container.objects.select_related("spec")
-        .values("spec__code")
-        .annotate(cnt=DCount("id"))
-    )
-    by_code = {row["spec__code"]: row["cnt"] for row in by_code_qs}
-    total = Container.objects.count()
-
-    return JsonResponse(
-        {
-            "ok": True,
-            "total": total,
-            "by_code": by_code,
-        }
-    )
+    return JsonResponse({"ok": True, **container_stats()})
 
 
 @login_required
@@ -5971,16 +7284,8 @@ def api_material_by_name(request: HttpRequest):
     if not name:
         return JsonResponse({"ok": False, "message": "请提供物料名称"}, status=400)
 
-    kind_map = {
-        "test_tube_15": TestTube15,
-        "15mL试管": TestTube15,
-        "laiyu_powder": LaiyuPowder,
-        "铼羽粉筒": LaiyuPowder,
-        "jingtai_powder": JingtaiPowder,
-        "晶泰粉筒": JingtaiPowder,
-        "reagent_bottle_150": ReagentBottle150,
-        "150mL试剂瓶": ReagentBottle150,
-    }
+    kind_map = {code: code for code in ENTITY_MATERIAL_MODELS}
+    kind_map.update({label: code for code, label in MaterialKind.choices if code in ENTITY_MATERIAL_MODELS})
 
     def build_detail(obj, resolved_kind: str) -> dict:
         detail = {
@@ -6021,30 +7326,15 @@ def api_material_by_name(request: HttpRequest):
             detail["volume_ml"] = str(getattr(obj, "volume_ml", ""))
         return detail
 
-    if kind:
-        model = kind_map.get(kind)
-        if not model:
-            return JsonResponse(
-                {"ok": False, "message": "不支持的物料类型"}, status=400
-            )
-        obj = model.objects.filter(name=name).first()
-        if not obj:
-            return JsonResponse({"ok": False, "message": "未找到物料"}, status=404)
-        return JsonResponse({"ok": True, "material": build_detail(obj, kind)})
-
-    for resolved_kind, model in (
-        ("test_tube_15", TestTube15),
-        ("laiyu_powder", LaiyuPowder),
-        ("jingtai_powder", JingtaiPowder),
-        ("reagent_bottle_150", ReagentBottle150),
-    ):
-        obj = model.objects.filter(name=name).first()
-        if obj:
-            return JsonResponse(
-                {"ok": True, "material": build_detail(obj, resolved_kind)}
-            )
-
-    return JsonResponse({"ok": False, "message": "未找到物料"}, status=404)
+    if kind and kind not in kind_map:
+        return JsonResponse(
+            {"ok": False, "message": "不支持的物料类型"}, status=400
+        )
+    # 名称登记表一次索引查询即可定位物料类型与ID
+    resolved_kind, obj = MaterialName.lookup(name, kind_map.get(kind))
+    if not obj:
+        return JsonResponse({"ok": False, "message": "未找到物料"}, status=404)
+    return JsonResponse({"ok": True, "material": build_detail(obj, kind or resolved_kind)})
 
 
 @login_required
@@ -6171,7 +7461,10 @@ def api_material_update(request: HttpRequest, kind: str, mat_id: int):
                 )
 
     obj.updated_at = timezone.now()
-    obj.save()
+    try:
+        obj.save()
+    except ValidationError as e:
+        return JsonResponse({"ok": False, "message": "；".join(e.messages)}, status=400)
 
     return JsonResponse({"ok": True, "message": "已更新"})
 
@@ -6476,280 +7769,6 @@ def api_container_create(request):
 # endregion
 
 
-# region 物料需求分析工具函数
-def make_materials_counter():
-    """物料计数字典模板"""
-    return {
-        "test_tube_15": 0,
-        "laiyu_powder": 0,
-        "jingtai_powder": 0,
-        "reagent_bottle_150": 0,
-        "tip_1": 0,
-        "tip_5": 0,
-        "tip_10": 0,
-        "sample_filter": 0,
-        "filtration_filter": 0,
-        "mixture_tube": 0,
-        "sample_tube": 0,
-        "sample_cylinder": 0,
-        "chromatographic_cylinder": 0,
-    }
-
-
-def process_solid_liquid_station(station_data):
-    """处理固液配料工站"""
-    reagents = station_data.get("reagents") or []
-
-    # 初始化物料需求
-    station_materials = {
-        "test_tube_15": [],
-        "laiyu_powder": [],
-        "jingtai_powder": [],
-        "reagent_bottle_150": [],
-        "tip_1": 0,
-        "tip_5": 0,
-        "tip_10": 0,
-        "sample_tube": 0,
-        "mixture_tube": 0,
-        "sample_filter": 0,
-        "sample_cylinder": 0,
-        "filtration_filter": 0,
-        "chromatographic_cylinder": 0,
-    }
-
-    # 添加1个空试管（1任务 = 1试管）
-    station_materials["test_tube_15"].append(
-        {"reagent_name": "", "unit": "", "amount": 0}
-    )
-
-    # 处理试剂
-    for reagent in reagents:
-        reagent_type = reagent.get("type", "")
-        reagent_name = reagent.get("name", "")
-        reagent_amount = reagent.get("amount", "")
-        reagent_unit = reagent.get("unit", "")
-
-        if reagent_type == "solid":
-            # 固体试剂使用铼羽粉筒
-            station_materials["laiyu_powder"].append(
-                {
-                    "reagent_name": reagent_name,
-                    "unit": reagent_unit,
-                    "amount": float(reagent_amount) if reagent_amount else 0,
-                }
-            )
-        elif reagent_type == "liquid":
-            # 液体试剂使用150mL试剂瓶
-            station_materials["reagent_bottle_150"].append(
-                {
-                    "reagent_name": reagent_name,
-                    "unit": reagent_unit,
-                    "amount": float(reagent_amount) if reagent_amount else 0,
-                }
-            )
-            # 液体试剂需要1mL枪头
-            station_materials["tip_1"] += 1
-
-    return station_materials
-
-
-def process_reaction_station(station_data):
-    """处理反应工站"""
-    # 反应监测物料需求
-    monitoring_count = station_data.get("monitoringCount", 0)
-    if monitoring_count == 0:
-        params = station_data.get("params") or {}
-        duration_min = int(params.get("duration", 0))
-        interval_min = int(params.get("samplingInterval", 0))
-        if duration_min > 0 and interval_min > 0:
-            monitoring_count = duration_min // interval_min
-
-    # 初始化物料需求
-    station_materials = {
-        "test_tube_15": [],
-        "laiyu_powder": [],
-        "jingtai_powder": [],
-        "reagent_bottle_150": [],
-        "tip_1": monitoring_count * 2,  # 1次反应监测需要2根1mL枪头
-        "tip_5": 0,
-        "tip_10": 0,
-        "sample_tube": monitoring_count,  # 1次反应监测需要1个采样瓶
-        "mixture_tube": monitoring_count,  # 1次反应监测需要1个混合瓶
-        "sample_filter": monitoring_count,  # 1次反应监测需要1个小滤头
-        "sample_cylinder": 0,
-        "filtration_filter": 0,
-        "chromatographic_cylinder": 0,
-    }
-
-    return station_materials
-
-
-def process_glovebox_station(station_data):
-    """处理手套箱工站"""
-    # 配料规则同固液配料
-    result = process_solid_liquid_station(station_data)
-
-    # 反应监测规则同反应工站
-    reaction = station_data.get("reaction", {})
-    if reaction.get("enabled"):
-        reaction_result = process_reaction_station(reaction)
-        # 累加耗材数量
-        for key, value in reaction_result.items():
-            if isinstance(value, int):
-                result[key] += value
-
-    return result
-
-
-def process_evaporation_station(station_data):
-    """处理旋蒸工站"""
-    return {
-        "test_tube_15": [],
-        "laiyu_powder": [],
-        "jingtai_powder": [],
-        "reagent_bottle_150": [],
-        "tip_1": 0,
-        "tip_5": 1,  # 1次旋蒸 = 1根5mL枪头
-        "tip_10": 0,
-        "sample_tube": 0,
-        "mixture_tube": 0,
-        "sample_filter": 0,
-        "sample_cylinder": 0,
-        "filtration_filter": 0,
-        "chromatographic_cylinder": 0,
-    }
-
-
-def process_filtration_station(station_data):
-    """处理过滤分液工站"""
-    return {
-        "test_tube_15": [],
-        "laiyu_powder": [],
-        "jingtai_powder": [],
-        "reagent_bottle_150": [],
-        "tip_1": 0,
-        "tip_5": 0,
-        "tip_10": 0,
-        "sample_tube": 0,
-        "mixture_tube": 0,
-        "sample_filter": 0,
-        "sample_cylinder": 0,
-        "filtration_filter": 0,
-        "chromatographic_cylinder": 0,
-    }
-
-
-def process_column_station(station_data):
-    """处理过柱工站"""
-    return {
-        "test_tube_15": [],
-        "laiyu_powder": [],
-        "jingtai_powder": [],
-        "reagent_bottle_150": [],
-        "tip_1": 0,
-        "tip_5": 0,
-        "tip_10": 0,
-        "sample_tube": 0,
-        "mixture_tube": 0,
-        "sample_filter": 0,
-        "sample_cylinder": 0,
-        "filtration_filter": 0,
-        "chromatographic_cylinder": 0,
-    }
-
-
-def process_tlc_station(station_data):
-    """处理点板工站"""
-    return {
-        "test_tube_15": [],
-        "laiyu_powder": [],
-        "jingtai_powder": [],
-        "reagent_bottle_150": [],
-        "tip_1": 0,
-        "tip_5": 0,
-        "tip_10": 0,
-        "sample_tube": 0,
-        "mixture_tube": 0,
-        "sample_filter": 0,
-        "sample_cylinder": 0,
-        "filtration_filter": 0,
-        "chromatographic_cylinder": 0,
-    }
-
-
-def process_gcms_station(station_data):
-    """处理GCMS工站"""
-    return {
-        "test_tube_15": [],
-        "laiyu_powder": [],
-        "jingtai_powder": [],
-        "reagent_bottle_150": [],
-        "tip_1": 0,
-        "tip_5": 0,
-        "tip_10": 0,
-        "sample_tube": 0,
-        "mixture_tube": 0,
-        "sample_filter": 0,
-        "sample_cylinder": 0,
-        "filtration_filter": 0,
-        "chromatographic_cylinder": 0,
-    }
-
-
-def process_hplc_station(station_data):
-    """处理HPLC工站"""
-    return {
-        "test_tube_15": [],
-        "laiyu_powder": [],
-        "jingtai_powder": [],
-        "reagent_bottle_150": [],
-        "tip_1": 0,
-        "tip_5": 0,
-        "tip_10": 0,
-        "sample_tube": 0,
-        "mixture_tube": 0,
-        "sample_filter": 0,
-        "sample_cylinder": 0,
-        "filtration_filter": 0,
-        "chromatographic_cylinder": 0,
-    }
-
-
-def analyze_material_requirements_for_task(task):
-    """
-    分析实验任务的物料需求（按工站维度统计）
-    返回按工站分组的物料需求，按照物料统计.md文档的数据模型
-    """
-    stations = task.stations or {}
-    station_materials = {}
-
-    # 工站处理映射
-    station_processors = {
-        "solidLiquid": process_solid_liquid_station,
-        "reaction": process_reaction_station,
-        "glovebox": process_glovebox_station,
-        "evaporation": process_evaporation_station,
-        "filtration": process_filtration_station,
-        "column": process_column_station,
-        "tlc": process_tlc_station,
-        "gcms": process_gcms_station,
-        "hplc": process_hplc_station,
-    }
-
-    # 处理各个工站
-    for station_key, station_data in stations.items():
-        if not station_data.get("enabled"):
-            continue
-        processor = station_processors.get(station_key)
-        if processor:
-            station_materials[station_key] = processor(station_data)
-
-    return station_materials
-
-
-# endregion
-
-
 # region 备料计算与备料清单 API
 @login_required
 @require_http_methods(["POST"])
@@ -6778,99 +7797,18 @@ def api_preparator_batch_prepare(request):
                 {"success": False, "message": "没有找到已通过的任务"}, status=400
             )
 
-        # 计算物料需求（按工站聚合）
-        station_materials_agg = {}
-
-        for task in tasks:
-            analysis = analyze_material_requirements_for_task(task)
-
-            # 合并各工站的物料需求
-            for station_key, station_materials in analysis.items():
-                if station_key not in station_materials_agg:
-                    station_materials_agg[station_key] = {
-                        "test_tube_15": [],
-                        "laiyu_powder": [],
-                        "jingtai_powder": [],
-                        "reagent_bottle_150": [],
-                        "tip_1": 0,
-                        "tip_5": 0,
-                        "tip_10": 0,
-                        "sample_tube": 0,
-                        "mixture_tube": 0,
-                        "sample_filter": 0,
-                        "sample_cylinder": 0,
-                        "filtration_filter": 0,
-                        "chromatographic_cylinder": 0,
-                    }
-
-                # 处理test_tube_15：累加数量，每个任务1个试管
-                if "test_tube_15" in station_materials:
-                    current_tubes = station_materials["test_tube_15"]
-                    # 每个任务固定1个试管，累加数量
-                    for _ in range(len(current_tubes)):  # 每个任务1个试管
-                        station_materials_agg[station_key]["test_tube_15"].append(
-                            {"reagent_name": "", "unit": "", "amount": 0}
-                        )
+        # 按审核/编辑时预先展开的工站需求索引在数据库中汇总
+        station_materials_agg, _ = TaskStationRequirement.aggregate(tasks)
 
-                # 处理试剂类物料：合并相同试剂的用量
-                for material_type in [
-                    "laiyu_powder",
-                    "jingtai_powder",
-                    "reagent_bottle_150",
-                ]:
-                    if material_type in station_materials:
-                        for reagent_item in station_materials[material_type]:
-                            reagent_name = reagent_item.get("reagent_name", "")
-                            if reagent_name:  # 只处理有试剂名称的项目
-                                # 查找是否已存在相同试剂
-                                existing_item = None
-                                for existing in station_materials_agg[station_key][
-                                    material_type
-                                ]:
-                                    if existing.get(
-                                        "reagent_name"
-                                    ) == reagent_name and existing.get(
-                                        "unit"
-                                    ) == reagent_item.get("unit"):
-                                        existing_item = existing
-                                        break
-
-                                if existing_item:
-                                    # 累加用量
-                                    try:
-                                        existing_amount = float(
-                                            existing_item.get("amount", 0)
-                                        )
-                                        new_amount = float(
-                                            reagent_item.get("amount", 0)
-                                        )
-                                        existing_item["amount"] = (
-                                            existing_amount + new_amount
-                                        )
-                                    except (ValueError, TypeError):
-                                        pass
-                                else:
-                                    # 添加新试剂
-                                    station_materials_agg[station_key][
-                                        material_type
-                                    ].append(reagent_item)
-
-                # 累加数字类型的物料（耗材）
-                for material_type in [
-                    "tip_1",
-                    "tip_5",
-                    "tip_10",
-                    "sample_tube",
-                    "mixture_tube",
-                    "sample_filter",
-                    "sample_cylinder",
-                    "filtration_filter",
-                    "chromatographic_cylinder",
-                ]:
-                    if material_type in station_materials:
-                        station_materials_agg[station_key][material_type] += (
-                            station_materials[material_type]
-                        )
+        # check_inventory 为 true 时库存不足直接失败，避免装填到一半才发现缺料
+        if body.get("check_inventory"):
+            inventory = public_report(check_inventory(station_materials_agg))
+            short = [row for row in inventory if row["status"] == "short"]
+            if short:
+                return JsonResponse(
+                    {"success": False, "message": "试剂库存不足", "inventory": inventory},
+                    status=409,
+                )
 
         # 创建备料清单记录
         preparation_id = f"prep_{int(time.time())}"
@@ -6881,6 +7819,8 @@ def api_preparator_batch_prepare(request):
             station_materials=station_materials_agg,
             status="pending",
         )
+        # 本人此前在备料计算中为同一批任务创建的预留改由清单持有，随清单完成、取消或删除释放
+        attach_reservations(preparation_list, request.user, task_ids)
 
         # 返回给前端的数据
         response_data = {
@@ -6918,124 +7858,41 @@ def api_preparator_calc_materials(request):
                 {"success": False, "message": "请选择至少一个任务"}, status=400
             )
 
-        # 计算物料需求（按工站聚合）
-        station_materials_agg = {}
-        totals = {
-            "test_tube_15": 0,
-            "laiyu_powder": 0,
-            "jingtai_powder": 0,
-            "reagent_bottle_150": 0,
-            "tip_1": 0,
-            "tip_5": 0,
-            "tip_10": 0,
-            "sample_tube": 0,
-            "mixture_tube": 0,
-            "sample_filter": 0,
-            "sample_cylinder": 0,
-            "filtration_filter": 0,
-            "chromatographic_cylinder": 0,
-        }
-
-        tasks = Task.objects.filter(id__in=task_ids)
-        for task in tasks:
-            analysis = analyze_material_requirements_for_task(task)
-
-            # 合并各工站的物料需求
-            for station_key, station_materials in analysis.items():
-                if station_key not in station_materials_agg:
-                    station_materials_agg[station_key] = {
-                        "test_tube_15": [],
-                        "laiyu_powder": [],
-                        "jingtai_powder": [],
-                        "reagent_bottle_150": [],
-                        "tip_1": 0,
-                        "tip_5": 0,
-                        "tip_10": 0,
-                        "sample_tube": 0,
-                        "mixture_tube": 0,
-                        "sample_filter": 0,
-                        "sample_cylinder": 0,
-                        "filtration_filter": 0,
-                        "chromatographic_cylinder": 0,
-                    }
+        # 按审核/编辑时预先展开的工站需求索引在数据库中汇总
+        station_materials_agg, totals = TaskStationRequirement.aggregate(
+            Task.objects.filter(id__in=task_ids)
+        )
 
-                # 处理test_tube_15：累加数量，每个任务1个试管
-                if "test_tube_15" in station_materials:
-                    current_tubes = station_materials["test_tube_15"]
-                    # 每个任务固定1个试管，累加数量
-                    for _ in range(len(current_tubes)):  # 每个任务1个试管
-                        station_materials_agg[station_key]["test_tube_15"].append(
-                            {"reagent_name": "", "unit": "", "amount": 0}
-                        )
-                        totals["test_tube_15"] += 1
-
-                # 处理试剂类物料：合并相同试剂的用量
-                for material_type in [
-                    "laiyu_powder",
-                    "jingtai_powder",
-                    "reagent_bottle_150",
-                ]:
-                    if material_type in station_materials:
-                        for reagent_item in station_materials[material_type]:
-                            reagent_name = reagent_item.get("reagent_name", "")
-                            if reagent_name:  # 只处理有试剂名称的项目
-                                # 查找是否已存在相同试剂
-                                existing_item = None
-                                for existing in station_materials_agg[station_key][
-                                    material_type
-                                ]:
-                                    if existing.get(
-                                        "reagent_name"
-                                    ) == reagent_name and existing.get(
-                                        "unit"
-                                    ) == reagent_item.get("unit"):
-                                        existing_item = existing
-                                        break
-
-                                if existing_item:
-                                    # 累加用量
-                                    try:
-                                        existing_amount = float(
-                                            existing_item.get("amount", 0)
-                                        )
-                                        new_amount = float(
-                                            reagent_item.get("amount", 0)
-                                        )
-                                        existing_item["amount"] = (
-                                            existing_amount + new_amount
-                                        )
-                                    except (ValueError, TypeError):
-                                        pass
-                                else:
-                                    # 添加新试剂
-                                    station_materials_agg[station_key][
-                                        material_type
-                                    ].append(reagent_item)
-                                    totals[material_type] += 1
-
-                # 累加数字类型的物料（耗材）
-                for material_type in [
-                    "tip_1",
-                    "tip_5",
-                    "tip_10",
-                    "sample_tube",
-                    "mixture_tube",
-                    "sample_filter",
-                    "sample_cylinder",
-                    "filtration_filter",
-                    "chromatographic_cylinder",
-                ]:
-                    if material_type in station_materials:
-                        station_materials_agg[station_key][material_type] += (
-                            station_materials[material_type]
-                        )
-                        totals[material_type] += station_materials[material_type]
+        # 对照试剂库存；reserve 为 true 时在库存充足的前提下为所需试剂创建预留
+        reservations = []
+        if body.get("reserve"):
+            try:
+                inventory, reservations = reserve_reagents(
+                    station_materials_agg, request.user, task_ids
+                )
+            except ValidationError as e:
+                return JsonResponse(
+                    {
+                        "success": False,
+                        "message": "试剂库存不足，未创建预留",
+                        "errors": e.messages,
+                        "inventory": public_report(check_inventory(station_materials_agg)),
+                    },
+                    status=409,
+                )
+        else:
+            inventory = check_inventory(station_materials_agg)
 
         return JsonResponse(
             {
                 "success": True,
                 "station_materials": station_materials_agg,
                 "totals": totals,
+                "inventory": public_report(inventory),
+                "reservations": [
+                    {"id": r.id, "reagent_id": r.reagent_id, "amount": float(r.amount)}
+                    for r in reservations
+                ],
             }
         )
 
@@ -7172,30 +8029,13 @@ def api_container_fill_slot(request, container_id):
                 and material_type
                 and material_index is not None
             ):
-                try:
-                    preparation_list = PreparationList.objects.get(id=preparation_id)
-                    bindings = preparation_list.material_fill_bindings or {}
-
-                    # 清空对应的绑定关系
-                    if (
-                        station_key in bindings
-                        and material_type in bindings[station_key]
-                    ):
-                        if str(material_index) in bindings[station_key][material_type]:
-                            del bindings[station_key][material_type][
-                                str(material_index)
-                            ]
-                            # 如果该物料类型下没有绑定关系了，删除整个物料类型
-                            if not bindings[station_key][material_type]:
-                                del bindings[station_key][material_type]
-                            # 如果该工站下没有物料类型了，删除整个工站
-                            if not bindings[station_key]:
-                                del bindings[station_key]
-
-                            preparation_list.material_fill_bindings = bindings
-                            preparation_list.save()
-                except PreparationList.DoesNotExist:
-                    pass  # 如果没有找到备料清单，继续执行
+                # 按唯一键删除对应的绑定关系
+                MaterialFillBinding.objects.filter(
+                    preparation_list_id=preparation_id,
+                    station_key=station_key,
+                    material_type=material_type,
+                    material_index=material_index,
+                ).delete()
 
             # 检查转移仓是否还有其他占用的槽位
             remaining_slots = ContainerSlot.objects.filter(
@@ -7376,35 +8216,24 @@ def api_container_fill_slot(request, container_id):
                     operated_by=request.user,
                 )
 
-                # 记录绑定关系（如果有绑定参数）
+                # 记录绑定关系（如果有绑定参数），按唯一键覆盖
                 if station_key and material_type and material_index is not None:
-                    bindings = preparation_list.material_fill_bindings or {}
-                    print(
-                        f"Debug: 记录绑定关系 - station_key={station_key}, material_type={material_type}, material_index={material_index}"
-                    )
-
-                    # 确保嵌套结构存在
-                    if station_key not in bindings:
-                        bindings[station_key] = {}
-                    if material_type not in bindings[station_key]:
-                        bindings[station_key][material_type] = {}
-
-                    # 记录绑定信息
-                    binding_info = {
-                        "material_name": material_name,
-                        "material_type": material_kind,
-                        "container_name": container.name,
-                        "slot_position": str(slot_index),
-                        "filled_at": timezone.now().isoformat(),
-                        "filled_by": request.user.id,
-                    }
-                    bindings[station_key][material_type][str(material_index)] = (
-                        binding_info
+                    MaterialFillBinding.objects.update_or_create(
+                        preparation_list=preparation_list,
+                        station_key=station_key,
+                        material_type=material_type,
+                        material_index=material_index,
+                        defaults={
+                            "material_name": material_name,
+                            "material_kind": material_kind,
+                            "container": container,
+                            "container_name": container.name,
+                            "slot_index": slot_index,
+                            "slots": None,
+                            "filled_at": timezone.now(),
+                            "filled_by": request.user,
+                        },
                     )
-                    print(f"Debug: 绑定信息 - {binding_info}")
-
-                    preparation_list.material_fill_bindings = bindings
-                    preparation_list.save()
 
             except PreparationList.DoesNotExist:
                 pass  # 如果没有找到备料清单，继续执行
@@ -7417,6 +8246,67 @@ def api_container_fill_slot(request, container_id):
         )
 
 
+@login_required
+@require_http_methods(["POST"])
+def api_container_bulk_slots(request, container_id):
+    """
+    批量装填或清空同一转移仓的多个槽位（单个事务，全部成功或全部不生效）
+    入参: {"operations": [{"slot_index", "material_id", "material_kind", "material_name",
+           "station_key", "material_type", "material_index"}], "preparation_id", "target_station_key"}
+    每项操作的含义与 fill-slot 接口相同
+    """
+    if not request.user.is_preparator():
+        return JsonResponse({"success": False, "message": "权限不足"}, status=403)
+
+    try:
+        body = json.loads(request.body.decode("utf-8")) if request.body else {}
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({"success": False, "message": "请求数据格式错误"}, status=400)
+    operations = body.get("operations")
+    if not isinstance(operations, list) or not operations or not all(isinstance(op, dict) for op in operations):
+        return JsonResponse({"success": False, "message": "operations 必须为非空对象列表"}, status=400)
+
+    try:
+        result = apply_slot_operations(
+            container_id,
+            operations,
+            request.user,
+            preparation_id=body.get("preparation_id"),
+            target_station_key=body.get("target_station_key"),
+        )
+    except ValidationError as e:
+        return JsonResponse(
+            {"success": False, "message": "批量操作校验失败", "errors": e.messages}, status=400
+        )
+    return JsonResponse({"success": True, **result})
+
+
+@login_required
+@require_http_methods(["POST"])
+def api_scan_batch(request):
+    """
+    扫码批量处理（单个事务，全部成功或全部不生效）
+    入参: {"action": "place"|"move"|"consume", "codes": [条码...],
+           place: "container_id" 或 "container_code"，可选 "slot_indexes"、"start_slot"、"preparation_id"、"target_station_key"；
+           move: "station_id"}
+    """
+    if not request.user.is_preparator():
+        return JsonResponse({"success": False, "message": "权限不足"}, status=403)
+
+    try:
+        body = json.loads(request.body.decode("utf-8")) if request.body else {}
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({"success": False, "message": "请求数据格式错误"}, status=400)
+    if not isinstance(body, dict):
+        return JsonResponse({"success": False, "message": "请求数据格式错误"}, status=400)
+
+    try:
+        result = apply_scan_batch(body.get("action"), body.get("codes"), request.user, options=body)
+    except ValidationError as e:
+        return JsonResponse({"success": False, "message": "扫码处理失败", "errors": e.messages}, status=400)
+    return JsonResponse({"success": True, **result})
+
+
 @login_required
 @require_http_methods(["GET"])
 def api_preparation_lists(request):
@@ -7485,8 +8375,7 @@ def api_preparation_list_detail(request, preparation_id):
                 "preparation_list": {
                     "id": preparation_list.id,
                     "station_materials": station_materials,
-                    "material_fill_bindings": preparation_list.material_fill_bindings
-                    or {},
+                    "material_fill_bindings": preparation_list.get_fill_bindings(),
                     "task_count": task_count,
                     "created_at": preparation_list.created_at.strftime(
                         "%Y-%m-%d %H:%M:%S"
@@ -7504,6 +8393,46 @@ def api_preparation_list_detail(request, preparation_id):
         )
 
 
+@login_required
+@require_http_methods(["POST"])
+def api_preparation_list_plan_slots(request, preparation_id):
+    """
+    自动规划备料清单的转移仓装填
+    入参: {"container_ids": [1,2]（可选，限定候选转移仓）, "commit": false, "allow_partial": false}
+    commit 为 true 时在一个事务中落实规划；存在缺料或槽位不足时需 allow_partial 才会部分落实
+    """
+    if not request.user.is_preparator():
+        return JsonResponse({"success": False, "message": "权限不足"}, status=403)
+
+    try:
+        body = json.loads(request.body.decode("utf-8")) if request.body else {}
+    except (ValueError, UnicodeDecodeError):
+        return JsonResponse({"success": False, "message": "请求数据格式错误"}, status=400)
+    container_ids = body.get("container_ids")
+    if container_ids is not None and not isinstance(container_ids, list):
+        return JsonResponse({"success": False, "message": "container_ids 必须为列表"}, status=400)
+
+    try:
+        preparation_list = PreparationList.objects.get(id=preparation_id)
+    except PreparationList.DoesNotExist:
+        return JsonResponse({"success": False, "message": "备料清单不存在"}, status=404)
+
+    plan = plan_slot_allocation(preparation_list, container_ids)
+    committed = False
+    if body.get("commit"):
+        if plan["shortages"] and not body.get("allow_partial"):
+            return JsonResponse(
+                {"success": False, "message": "物料或转移仓槽位不足", "plan": plan}, status=409
+            )
+        try:
+            commit_slot_plan(preparation_list, plan, request.user)
+        except ValidationError as e:
+            return JsonResponse({"success": False, "message": "；".join(e.messages)}, status=409)
+        committed = True
+
+    return JsonResponse({"success": True, "plan": plan, "committed": committed})
+
+
 @login_required
 @require_http_methods(["DELETE"])
 def api_preparation_list_delete(request, preparation_id):
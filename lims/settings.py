@@ -81,12 +81,23 @@ WSGI_APPLICATION = 'lims.wsgi.application'
 ASGI_APPLICATION = 'lims.asgi.application'
 
 # Channels
+# 内存通道层只在单个进程内有效：WSGI 进程发出的任务变更通知到不了 ASGI 进程，
+# 任务推送（TaskFeedConsumer）因此按 id 游标轮询事件表，不依赖跨进程通知
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels.layers.InMemoryChannelLayer',
     },
 }
 
+# Cache
+# uwsgi 以多进程运行，统计卡片等缓存的失效需对所有进程可见，使用数据库缓存表（由迁移 0045 创建）
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    },
+}
+
 
 
 # Database
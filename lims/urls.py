@@ -33,6 +33,7 @@ urlpatterns = [
     # ==================== 用户任务 API（用户端） ====================
     path('api/user/task/create/', views.api_user_task_create, name='api_user_task_create'),
     path('api/user/tasks/', views.api_user_tasks, name='api_user_tasks'),
+    path('api/user/tasks/delta/', views.api_user_tasks_delta, name='api_user_tasks_delta'),
     path('api/user/task/<int:task_id>/', views.api_user_task_detail, name='api_user_task_detail'),
     path('api/user/task/<int:task_id>/update/', views.api_user_task_update, name='api_user_task_update'),
     path('api/user/task/<int:task_id>/delete/', views.api_delete_task, name='api_delete_task'),
@@ -44,6 +45,8 @@ urlpatterns = [
 
     # ==================== 任务管理 API（管理员）与公共接口 ====================
     path('api/tasks/submit/', views.api_submit_tasks, name='api_submit_tasks'),
+    path('api/tasks/status-summary/', views.api_task_status_summary, name='api_task_status_summary'),
+    path('api/tasks/<int:task_id>/status-history/', views.api_task_status_history, name='api_task_status_history'),
     path('api/filter-tasks/', views.api_filter_tasks, name='api_filter_tasks'),
     path('api/task/<int:task_id>/', views.api_task_detail, name='api_task_detail'),
     path('api/batch-update-tasks/', views.api_batch_update_tasks, name='api_batch_update_tasks'),
@@ -93,7 +96,10 @@ urlpatterns = [
     # 数据处理API
     path('api/ml/data-processing/missing-values/', views.api_ml_missing_values_analysis, name='api_ml_missing_values_analysis'),
     path('api/ml/data-processing/outliers/', views.api_ml_outliers_analysis, name='api_ml_outliers_analysis'),
+    path('api/ml/data-files/<int:file_id>/outliers/', views.api_ml_outliers_detect, name='api_ml_outliers_detect'),
     path('api/ml/data-processing/split/', views.api_ml_data_split, name='api_ml_data_split'),
+    path('api/ml/data-files/<int:file_id>/splits/', views.api_ml_data_splits_list, name='api_ml_data_splits_list'),
+    path('api/ml/data-splits/<int:split_id>/delete/', views.api_ml_data_split_delete, name='api_ml_data_split_delete'),
     
     # 机器学习算法API
     path('api/ml/algorithms/', views.api_ml_algorithms_list, name='api_ml_algorithms_list'),
@@ -139,6 +145,8 @@ urlpatterns = [
     path('api/reagent/<int:reagent_id>/update/', views.api_reagent_update, name='api_reagent_update'),
     path('api/reagent/<int:reagent_id>/delete/', views.api_reagent_delete, name='api_reagent_delete'),
     path('api/reagent/<int:reagent_id>/take/', views.api_reagent_take, name='api_reagent_take'),
+    path('api/reagent/reservations/release/', views.api_reagent_reservations_release, name='api_reagent_reservations_release'),
+    path('api/reagent/<int:reagent_id>/operations/', views.api_reagent_operations, name='api_reagent_operations'),
     # 图谱
     path('api/reagent/<int:reagent_id>/spectra/', views.api_reagent_spectra, name='api_reagent_spectra'),
     path('api/reagent/<int:reagent_id>/spectra/upload/', views.api_reagent_spectrum_upload, name='api_reagent_spectrum_upload'),
@@ -150,6 +158,7 @@ urlpatterns = [
     path('api/preparator/filter-tasks/', views.api_preparator_filter_tasks, name='api_preparator_filter_tasks'),
     path('api/preparator/task/<int:task_id>/', views.api_preparator_task_detail, name='api_preparator_task_detail'),
     path('api/preparator/batch-prepare/', views.api_preparator_batch_prepare, name='api_preparator_batch_prepare'),
+    path('api/preparator/calc-materials/', views.api_preparator_calc_materials, name='api_preparator_calc_materials'),
 
     # ==================== 备料工站 API ====================
     path('api/preparation-station/place-container/', views.place_container, name='place_container'),
@@ -168,6 +177,8 @@ urlpatterns = [
     path('api/containers/create/', views.api_container_create, name='api_container_create'),
     path('api/containers/<int:container_id>/', views.api_container_detail, name='api_container_detail'),
     path('api/containers/<int:container_id>/fill-slot/', views.api_container_fill_slot, name='api_container_fill_slot'),
+    path('api/containers/<int:container_id>/slots/bulk/', views.api_container_bulk_slots, name='api_container_bulk_slots'),
+    path('api/scan/batch/', views.api_scan_batch, name='api_scan_batch'),
     path('api/containers/<int:container_id>/complete/', views.api_container_complete, name='api_container_complete'),
     path('api/containers/<int:container_id>/clear/', views.api_container_clear, name='api_container_clear'),
     path('api/containers/<int:container_id>/delete/', views.api_container_delete, name='api_container_delete'),
@@ -178,6 +189,7 @@ urlpatterns = [
     path('api/preparation-lists/', views.api_preparation_lists, name='api_preparation_lists'),
     path('api/preparation-list/<str:preparation_id>/', views.api_preparation_list_detail, name='api_preparation_list_detail'),
     path('api/preparation-list/<str:preparation_id>/delete/', views.api_preparation_list_delete, name='api_preparation_list_delete'),
+    path('api/preparation-list/<str:preparation_id>/plan-slots/', views.api_preparation_list_plan_slots, name='api_preparation_list_plan_slots'),
 
     # ==================== 物料 API ====================
     # 列表/统计/查询